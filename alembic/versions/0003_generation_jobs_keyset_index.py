@@ -0,0 +1,25 @@
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_generation_jobs_user_id_created_at_id",
+            "generation_jobs",
+            ["user_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_generation_jobs_user_id_created_at_id",
+            table_name="generation_jobs",
+            postgresql_concurrently=True,
+        )
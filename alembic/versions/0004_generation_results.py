@@ -0,0 +1,43 @@
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "generation_results",
+        sa.Column("key", sa.String(length=64), primary_key=True),
+        sa.Column("model_id", sa.String(length=255), nullable=False),
+        sa.Column("result_json", sa.JSON(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        sa.Column(
+            "last_used_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+    )
+    op.create_index(
+        "ix_generation_results_last_used_at",
+        "generation_results",
+        ["last_used_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_generation_results_last_used_at",
+        table_name="generation_results",
+    )
+    op.drop_table("generation_results")
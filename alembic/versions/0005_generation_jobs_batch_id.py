@@ -0,0 +1,33 @@
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "generation_jobs",
+        sa.Column("batch_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_generation_jobs_batch_id",
+            "generation_jobs",
+            ["batch_id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_generation_jobs_batch_id",
+            table_name="generation_jobs",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("generation_jobs", "batch_id")
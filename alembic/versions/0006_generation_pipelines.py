@@ -0,0 +1,38 @@
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "generation_jobs",
+        sa.Column("pipeline_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.add_column(
+        "generation_jobs",
+        sa.Column("pipeline_stage", sa.Integer(), nullable=True),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_generation_jobs_pipeline_id",
+            "generation_jobs",
+            ["pipeline_id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_generation_jobs_pipeline_id",
+            table_name="generation_jobs",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("generation_jobs", "pipeline_stage")
+    op.drop_column("generation_jobs", "pipeline_id")
@@ -0,0 +1,143 @@
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from base64 import b64encode
+from typing import Any, AsyncIterator, Callable, Mapping
+
+BLOB_REF_PREFIX = "blob:"
+DATA_URI_PREFIX = "data:"
+# blob:<MIME-тип>;sha256,<hex> — по аналогии с data:<MIME-тип>;base64,...
+BLOB_REF_RE = re.compile(
+    r"^blob:(?P<media_type>[\w.+-]+/[\w.+-]+);sha256,(?P<digest>[0-9a-f]{64})$"
+)
+
+
+def blob_refs(payload: Mapping[str, Any]) -> list[str]:
+    """Ссылки blob: верхнего уровня и в списках, как у externalize."""
+    refs = []
+    for value in payload.values():
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, str) and item.startswith(BLOB_REF_PREFIX):
+                refs.append(item)
+    return refs
+
+
+class InvalidDataUri(ValueError):
+    """Некорректный data: URI."""
+
+
+class BlobNotFound(LookupError):
+    """Содержимое по ссылке не найдено."""
+
+
+class BlobTooLarge(ValueError):
+    """Содержимое больше допустимого размера."""
+
+
+class BlobStore(ABC):
+    """Хранилище содержимого, адресуемого хэшем."""
+
+    @abstractmethod
+    async def hash_data_uri(self, uri: str) -> tuple[str, bytes]:
+        """Ссылка blob: и содержимое data: URI без записи."""
+        ...
+
+    @abstractmethod
+    async def put_bytes(self, ref: str, data: bytes) -> None:
+        """Записать содержимое по ссылке из hash_data_uri."""
+        ...
+
+    async def put_data_uri(self, uri: str) -> str:
+        """Сохранить содержимое data: URI и вернуть ссылку blob:."""
+        ref, data = await self.hash_data_uri(uri)
+        await self.put_bytes(ref, data)
+        return ref
+
+    @abstractmethod
+    async def put_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        media_type: str,
+        max_bytes: int,
+        verify: Callable[[int], None] | None = None,
+    ) -> tuple[str, int]:
+        """Сохранить поток и вернуть (ссылку blob:, размер в байтах).
+
+        verify получает размер прочитанного потока до записи в хранилище;
+        исключение из него отменяет запись.
+        """
+        ...
+
+    @abstractmethod
+    async def get(self, ref: str) -> tuple[bytes, str]:
+        """Содержимое и MIME-тип по ссылке blob:."""
+        ...
+
+    @abstractmethod
+    async def exists(self, ref: str) -> bool:
+        """Есть ли содержимое по ссылке."""
+        ...
+
+    async def externalize(
+        self,
+        payload: Mapping[str, Any],
+        pending: dict[str, bytes],
+    ) -> dict[str, Any]:
+        """Заменить data: URI верхнего уровня (и в списках) ссылками.
+
+        Содержимое не пишется, а копится в pending (ссылка → байты):
+        запись — put_pending после проверки баланса, чтобы отклонённый
+        запрос не оставлял файлов. Уже переданные ссылки (ID загруженных
+        ассетов) проверяются на существование: BlobNotFound до списания,
+        а не при отправке.
+        """
+        await self._map_strings(payload, BLOB_REF_PREFIX, self._require)
+
+        async def stage(uri: str) -> str:
+            ref, data = await self.hash_data_uri(uri)
+            pending[ref] = data
+            return ref
+
+        return await self._map_strings(payload, DATA_URI_PREFIX, stage)
+
+    async def put_pending(self, pending: Mapping[str, bytes]) -> None:
+        """Записать содержимое, накопленное externalize."""
+        for ref, data in pending.items():
+            await self.put_bytes(ref, data)
+
+    async def inline(self, payload: Mapping[str, Any]) -> dict[str, Any]:
+        """Вернуть содержимое ссылок обратно в виде data: URI."""
+        return await self._map_strings(
+            payload, BLOB_REF_PREFIX, self._data_uri
+        )
+
+    async def _require(self, ref: str) -> str:
+        if not await self.exists(ref):
+            raise BlobNotFound(ref)
+        return ref
+
+    async def _data_uri(self, ref: str) -> str:
+        data, media_type = await self.get(ref)
+        encoded = await asyncio.to_thread(b64encode, data)
+        return f"data:{media_type};base64,{encoded.decode('ascii')}"
+
+    async def _map_strings(
+        self,
+        payload: Mapping[str, Any],
+        prefix: str,
+        convert: Any,
+    ) -> dict[str, Any]:
+        result = dict(payload)
+        for key, value in payload.items():
+            if isinstance(value, str) and value.startswith(prefix):
+                result[key] = await convert(value)
+            elif isinstance(value, list):
+                result[key] = [
+                    (
+                        await convert(item)
+                        if isinstance(item, str) and item.startswith(prefix)
+                        else item
+                    )
+                    for item in value
+                ]
+        return result
@@ -0,0 +1,14 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+# (пространство, идентификатор)
+FlightKey = tuple[str, Hashable]
+
+
+class ReadCoalescer(ABC):
+    @abstractmethod
+    async def do(self, key: FlightKey, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить fn или дождаться уже идущего вызова с тем же ключом."""
+        ...
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Iterable
+from datetime import datetime
+from typing import Any, Iterable, Mapping, Sequence
 from uuid import UUID
 
 from app.domain.entities import (
@@ -43,6 +44,18 @@ class UserRepository(ABC):
         """Создать пользователя."""
         ...
 
+    @abstractmethod
+    async def upsert_by_external_id(self, external_user_id: UUID) -> User:
+        """Получить или создать по внешнему ID одним запросом."""
+        ...
+
+    @abstractmethod
+    async def upsert_many_by_external_ids(
+        self, external_user_ids: Iterable[UUID]
+    ) -> dict[UUID, UUID]:
+        """Получить или создать пачку пользователей: внешний ID → ID."""
+        ...
+
     @abstractmethod
     async def update_api_key(
         self,
@@ -54,8 +67,25 @@ class UserRepository(ABC):
         ...
 
     @abstractmethod
-    async def adjust_balance(self, user_id: UUID, delta: int) -> None:
-        """Изменить баланс."""
+    async def adjust_balance(self, user_id: UUID, delta: int) -> int:
+        """Изменить баланс и вернуть новое значение."""
+        ...
+
+    @abstractmethod
+    async def adjust_balances(self, deltas: Mapping[UUID, int]) -> None:
+        """Изменить балансы нескольких пользователей одним запросом."""
+        ...
+
+
+class AssetRepository(ABC):
+    @abstractmethod
+    async def add(self, user_id: UUID, ref: str) -> None:
+        """Записать пользователя владельцем ассета."""
+        ...
+
+    @abstractmethod
+    async def owned(self, user_id: UUID, refs: Iterable[str]) -> set[str]:
+        """Ссылки из refs, загруженные пользователем."""
         ...
 
 
@@ -65,6 +95,25 @@ class BalanceTransactionRepository(ABC):
         """Добавить транзакцию."""
         ...
 
+    @abstractmethod
+    async def add_many(
+        self, transactions: Sequence[BalanceTransaction]
+    ) -> None:
+        """Добавить пачку транзакций."""
+        ...
+
+    @abstractmethod
+    async def add_if_absent(self, transaction: BalanceTransaction) -> bool:
+        """Добавить транзакцию, если её внешняя ссылка ещё не учтена."""
+        ...
+
+    @abstractmethod
+    async def add_many_if_absent(
+        self, transactions: Sequence[BalanceTransaction]
+    ) -> set[str]:
+        """Добавить пачку транзакций, вернуть вставленные внешние ссылки."""
+        ...
+
     @abstractmethod
     async def find_by_external_ref(
         self,
@@ -81,6 +130,11 @@ class GenerationJobRepository(ABC):
         """Создать задачу."""
         ...
 
+    @abstractmethod
+    async def create_many(self, jobs: Sequence[GenerationJob]) -> None:
+        """Создать пачку задач."""
+        ...
+
     @abstractmethod
     async def get(self, job_id: UUID) -> GenerationJob | None:
         """Получить задачу."""
@@ -92,8 +146,60 @@ class GenerationJobRepository(ABC):
         user_id: UUID,
         limit: int,
         offset: int,
+        after: tuple[datetime, UUID] | None = None,
+        with_payloads: bool = True,
     ) -> Iterable[GenerationJob]:
-        """Список задач пользователя."""
+        """Список задач пользователя после курсора (created_at, id).
+
+        Без ``with_payloads`` input_json и result_json не читаются из БД.
+        """
+        ...
+
+    @abstractmethod
+    async def get_version(
+        self,
+        job_id: UUID,
+        user_id: UUID,
+    ) -> datetime | None:
+        """updated_at задачи пользователя без чтения остальных колонок."""
+        ...
+
+    @abstractmethod
+    async def list_versions_for_user(
+        self,
+        user_id: UUID,
+        limit: int,
+        offset: int,
+        after: tuple[datetime, UUID] | None = None,
+    ) -> list[tuple[UUID, datetime]]:
+        """(id, updated_at) задач страницы — для ETag списка."""
+        ...
+
+    @abstractmethod
+    async def statuses_for_user(
+        self,
+        user_id: UUID,
+        job_ids: Sequence[UUID],
+    ) -> dict[UUID, GenerationStatus]:
+        """Статусы задач пользователя одним запросом."""
+        ...
+
+    @abstractmethod
+    async def list_pipeline(
+        self,
+        pipeline_id: UUID,
+        user_id: UUID,
+    ) -> list[GenerationJob]:
+        """Этапы конвейера пользователя по порядку."""
+        ...
+
+    @abstractmethod
+    async def set_input(
+        self,
+        job_id: UUID,
+        input_json: dict[str, Any],
+    ) -> None:
+        """Заменить вход ещё не отправленной задачи."""
         ...
 
     @abstractmethod
@@ -107,6 +213,28 @@ class GenerationJobRepository(ABC):
         status_url: str | None = None,
         response_url: str | None = None,
         cancel_url: str | None = None,
+        children_json: list[dict[str, Any]] | None = None,
     ) -> None:
         """Обновить статус."""
         ...
+
+
+class GenerationResultRepository(ABC):
+    @abstractmethod
+    async def get(
+        self,
+        model_id: str,
+        input_json: Mapping[str, Any],
+    ) -> dict[str, Any] | None:
+        """Сохранённый результат для той же модели и тех же входных данных."""
+        ...
+
+    @abstractmethod
+    async def put(
+        self,
+        model_id: str,
+        input_json: Mapping[str, Any],
+        result_json: dict[str, Any],
+    ) -> None:
+        """Сохранить результат и вытеснить устаревшие записи."""
+        ...
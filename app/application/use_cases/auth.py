@@ -1,6 +1,9 @@
+import hashlib
 import secrets
+from dataclasses import replace
 from uuid import UUID
 
+from app.application.interfaces.read_coalescer import ReadCoalescer
 from app.application.interfaces.repositories import UserRepository
 from app.domain.entities import User
 from app.infrastructure.security.hashing import (
@@ -13,8 +16,13 @@ from app.infrastructure.security.hashing import (
 class AuthService:
     """Сервис аутентификации."""
 
-    def __init__(self, users: UserRepository):
+    def __init__(
+        self,
+        users: UserRepository,
+        flights: ReadCoalescer | None = None,
+    ):
         self.users = users
+        self.flights = flights
 
     async def register_or_rotate(
         self,
@@ -51,6 +59,17 @@ class AuthService:
 
     async def authenticate(self, api_key: str) -> User | None:
         """Проверить ключ API."""
+        if self.flights is None:
+            return await self._authenticate(api_key)
+        # Ключ — полный хэш: отпечаток слишком короток, чтобы делить
+        # по нему результат проверки.
+        key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        user = await self.flights.do(
+            ("auth", key_hash), lambda: self._authenticate(api_key)
+        )
+        return replace(user) if user else None
+
+    async def _authenticate(self, api_key: str) -> User | None:
         fingerprint = api_key_fingerprint(api_key)
         user = await self.users.get_by_api_key_fingerprint(fingerprint)
 
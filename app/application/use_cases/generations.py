@@ -1,10 +1,19 @@
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
-from typing import Any, Iterable
+from typing import Any, Iterable, Sequence
 from uuid import UUID, uuid4
 
+from app.application.interfaces.blob_store import (
+    BlobNotFound,
+    BlobStore,
+    blob_refs,
+)
+from app.application.interfaces.read_coalescer import ReadCoalescer
 from app.application.interfaces.repositories import (
+    AssetRepository,
     BalanceTransactionRepository,
     GenerationJobRepository,
+    GenerationResultRepository,
     UserRepository,
 )
 from app.domain.entities import (
@@ -22,6 +31,43 @@ class InsufficientBalance(Exception):
     """Недостаточно средств."""
 
 
+@dataclass(frozen=True, slots=True)
+class GenerationRequest:
+    """Параметры одной генерации."""
+
+    kind: GenerationKind
+    model_id: str
+    input_payload: dict[str, Any]
+    duration: int | None = None
+
+
+IMAGE_PRODUCING_KINDS = frozenset(
+    {GenerationKind.TEXT_TO_IMAGE, GenerationKind.IMAGE_TO_IMAGE}
+)
+# Поле входа этапа, в которое подставляется изображение предыдущего.
+PIPELINE_INPUT_KEYS = {
+    GenerationKind.IMAGE_TO_IMAGE: "image_urls",
+    GenerationKind.IMAGE_TO_VIDEO: "image_url",
+}
+
+
+def first_image_url(result_json: dict[str, Any]) -> str | None:
+    """URL первого изображения в результате fal."""
+    images = result_json.get("images")
+    if isinstance(images, list) and images:
+        item = images[0]
+    else:
+        item = result_json.get("image")
+    if isinstance(item, dict) and isinstance(item.get("url"), str):
+        return item["url"]
+    return None
+
+
+def is_deterministic(input_payload: dict[str, Any]) -> bool:
+    """Результат воспроизводим: seed задан явно."""
+    return input_payload.get("seed") is not None
+
+
 class GenerationService:
     """Сервис генераций."""
 
@@ -31,11 +77,21 @@ class GenerationService:
         jobs: GenerationJobRepository,
         transactions: BalanceTransactionRepository,
         token_prices: dict[str, int],
+        flights: ReadCoalescer | None = None,
+        results: GenerationResultRepository | None = None,
+        result_cache_price: int = 0,
+        blobs: BlobStore | None = None,
+        assets: AssetRepository | None = None,
     ):
         self.users = users
         self.jobs = jobs
         self.transactions = transactions
         self.token_prices = token_prices
+        self.flights = flights
+        self.results = results
+        self.result_cache_price = result_cache_price
+        self.blobs = blobs
+        self.assets = assets
 
     def calculate_cost(
         self,
@@ -65,42 +121,230 @@ class GenerationService:
         input_payload: dict[str, Any],
         duration: int | None = None,
     ) -> GenerationJob:
-        """Создать задачу."""
-        cost = self.calculate_cost(kind, duration)
+        """Создать задачу.
+
+        При включённом кэше результатов повтор детерминированного запроса
+        сразу завершается сохранённым результатом по цене кэша.
+        """
+        pending: dict[str, bytes] = {}
+        job, txn = await self._prepare_job(
+            user,
+            GenerationRequest(kind, model_id, input_payload, duration),
+            pending,
+        )
         locked_user = await self.users.get_by_id_for_update(user.id)
-        if not locked_user or locked_user.balance_tokens < cost:
+        if not locked_user or locked_user.balance_tokens < job.cost_tokens:
             raise InsufficientBalance()
 
+        await self._store_inputs(pending)
+        if job.cost_tokens:
+            await self.transactions.add(txn)
+            await self.users.adjust_balance(locked_user.id, -job.cost_tokens)
+        await self.jobs.create(job)
+        return job
+
+    async def create_jobs(
+        self,
+        user: User,
+        requests: Sequence[GenerationRequest],
+    ) -> tuple[UUID, list[GenerationJob]]:
+        """Создать пачку задач одним списанием.
+
+        Строка пользователя блокируется один раз; задачи и проводки
+        вставляются пачкой. Не хватает на всю пачку — не создаётся ничего.
+        """
+        batch_id = uuid4()
+        pending: dict[str, bytes] = {}
+        prepared = [
+            await self._prepare_job(user, request, pending)
+            for request in requests
+        ]
+        for job, _ in prepared:
+            job.batch_id = batch_id
+        return batch_id, await self._debit_and_create(user, prepared, pending)
+
+    async def create_pipeline(
+        self,
+        user: User,
+        stages: Sequence[GenerationRequest],
+    ) -> tuple[UUID, list[GenerationJob]]:
+        """Создать конвейер: стоимость всех этапов резервируется сразу.
+
+        Этапы после первого ждут в QUEUED, пока воркер не подставит в
+        них изображение из результата предыдущего этапа.
+        """
+        for previous, stage in zip(stages, stages[1:]):
+            if (
+                previous.kind not in IMAGE_PRODUCING_KINDS
+                or stage.kind not in PIPELINE_INPUT_KEYS
+            ):
+                raise ValueError("stage cannot consume previous output")
+        pipeline_id = uuid4()
+        pending: dict[str, bytes] = {}
+        prepared = [
+            # Вход этапа ещё не полон: кэш результатов не применим.
+            await self._prepare_job(user, stage, pending, use_cache=False)
+            for stage in stages
+        ]
+        for index, (job, _) in enumerate(prepared):
+            job.pipeline_id = pipeline_id
+            job.pipeline_stage = index
+        return pipeline_id, await self._debit_and_create(
+            user, prepared, pending
+        )
+
+    async def get_pipeline(
+        self,
+        pipeline_id: UUID,
+        user: User,
+    ) -> list[GenerationJob]:
+        """Этапы конвейера пользователя по порядку."""
+        return await self.jobs.list_pipeline(pipeline_id, user.id)
+
+    async def advance_pipeline(
+        self,
+        job: GenerationJob,
+        result_json: dict[str, Any],
+    ) -> GenerationJob | None:
+        """Передать результат этапа следующему и вернуть его."""
+        if job.pipeline_id is None or job.pipeline_stage is None:
+            return None
+        stages = await self.jobs.list_pipeline(job.pipeline_id, job.user_id)
+        following = [
+            stage
+            for stage in stages
+            if stage.pipeline_stage == job.pipeline_stage + 1
+            and stage.status == GenerationStatus.QUEUED
+        ]
+        if not following:
+            return None
+        stage = following[0]
+        image_url = first_image_url(result_json)
+        if image_url is None:
+            await self.refund_job(
+                stage,
+                error_message="previous stage returned no image",
+                status=GenerationStatus.CANCELED,
+            )
+            return None
+        key = PIPELINE_INPUT_KEYS[stage.kind]
+        stage.input_json = {
+            **stage.input_json,
+            key: [image_url] if key == "image_urls" else image_url,
+        }
+        await self.jobs.set_input(stage.id, stage.input_json)
+        return stage
+
+    async def _debit_and_create(
+        self,
+        user: User,
+        prepared: Sequence[tuple[GenerationJob, BalanceTransaction]],
+        pending: dict[str, bytes],
+    ) -> list[GenerationJob]:
+        """Списать сумму пачки под одной блокировкой и вставить задачи."""
+        total = sum(job.cost_tokens for job, _ in prepared)
+        locked_user = await self.users.get_by_id_for_update(user.id)
+        if not locked_user or locked_user.balance_tokens < total:
+            raise InsufficientBalance()
+
+        await self._store_inputs(pending)
+        if total:
+            await self.transactions.add_many(
+                [txn for job, txn in prepared if job.cost_tokens]
+            )
+            await self.users.adjust_balance(locked_user.id, -total)
+        jobs = [job for job, _ in prepared]
+        await self.jobs.create_many(jobs)
+        return jobs
+
+    async def _store_inputs(self, pending: dict[str, bytes]) -> None:
+        """Записать содержимое входов принятого запроса."""
+        if self.blobs is not None and pending:
+            await self.blobs.put_pending(pending)
+
+    async def _require_owned(
+        self, user: User, input_payload: dict[str, Any]
+    ) -> None:
+        """Чужой ID ассета неотличим от несуществующего: BlobNotFound."""
+        refs = blob_refs(input_payload)
+        if self.assets is None or not refs:
+            return
+        owned = await self.assets.owned(user.id, refs)
+        for ref in refs:
+            if ref not in owned:
+                raise BlobNotFound(ref)
+
+    async def _prepare_job(
+        self,
+        user: User,
+        request: GenerationRequest,
+        pending: dict[str, bytes],
+        use_cache: bool = True,
+    ) -> tuple[GenerationJob, BalanceTransaction]:
+        """Задача и проводка списания без обращения к балансу."""
+        input_payload = request.input_payload
+        await self._require_owned(user, input_payload)
+        if self.blobs is not None:
+            # В input_json остаются только ссылки; содержимое data: URI
+            # копится в pending и пишется после проверки баланса.
+            input_payload = await self.blobs.externalize(
+                input_payload, pending
+            )
+        cached_result = None
+        if (
+            use_cache
+            and self.results is not None
+            and is_deterministic(input_payload)
+        ):
+            cached_result = await self.results.get(
+                request.model_id, input_payload
+            )
+        if cached_result is None:
+            cost = self.calculate_cost(request.kind, request.duration)
+        else:
+            cost = self.result_cache_price
+
+        now = datetime.now(timezone.utc)
         txn = BalanceTransaction(
             id=uuid4(),
-            user_id=locked_user.id,
+            user_id=user.id,
             type=TransactionType.DEBIT,
             reason=BalanceReason.GENERATION,
             amount=cost,
             external_ref=None,
-            created_at=datetime.now(timezone.utc),
+            created_at=now,
         )
         job = GenerationJob(
             id=uuid4(),
-            user_id=locked_user.id,
-            kind=kind,
-            model_id=model_id,
+            user_id=user.id,
+            kind=request.kind,
+            model_id=request.model_id,
             fal_request_id=None,
-            status=GenerationStatus.QUEUED,
+            status=(
+                GenerationStatus.QUEUED
+                if cached_result is None
+                else GenerationStatus.COMPLETED
+            ),
             cost_tokens=cost,
             input_json=input_payload,
-            result_json=None,
+            result_json=cached_result,
             error_message=None,
             status_url=None,
             response_url=None,
             cancel_url=None,
-            created_at=datetime.now(timezone.utc),
-            updated_at=datetime.now(timezone.utc),
+            created_at=now,
+            updated_at=now,
         )
-        await self.transactions.add(txn)
-        await self.users.adjust_balance(locked_user.id, -cost)
-        await self.jobs.create(job)
-        return job
+        return job, txn
+
+    async def remember_result(
+        self,
+        job: GenerationJob,
+        result_json: dict[str, Any],
+    ) -> None:
+        """Сохранить результат детерминированной задачи в кэш."""
+        if self.results is not None and is_deterministic(job.input_json):
+            await self.results.put(job.model_id, job.input_json, result_json)
 
     async def refund_job(
         self,
@@ -108,7 +352,53 @@ class GenerationService:
         error_message: str | None = None,
         status: GenerationStatus = GenerationStatus.FAILED,
     ) -> None:
-        """Вернуть средства."""
+        """Вернуть средства.
+
+        Для этапа конвейера возвращается и стоимость следующих этапов,
+        которые ещё не отправлены: они отменяются.
+        """
+        await self._refund(job, error_message, status)
+        if job.pipeline_id is None or job.pipeline_stage is None:
+            return
+        stages = await self.jobs.list_pipeline(job.pipeline_id, job.user_id)
+        for stage in stages:
+            if (
+                stage.pipeline_stage is not None
+                and stage.pipeline_stage > job.pipeline_stage
+                and stage.status == GenerationStatus.QUEUED
+            ):
+                await self._refund(
+                    stage,
+                    f"pipeline stage {job.pipeline_stage} did not complete",
+                    GenerationStatus.CANCELED,
+                )
+
+    async def refund_partial(
+        self,
+        job: GenerationJob,
+        amount: int,
+    ) -> None:
+        """Вернуть часть стоимости задачи, не меняя её статус."""
+        if amount <= 0:
+            return
+        txn = BalanceTransaction(
+            id=uuid4(),
+            user_id=job.user_id,
+            type=TransactionType.CREDIT,
+            reason=BalanceReason.REFUND,
+            amount=amount,
+            external_ref=str(job.id),
+            created_at=datetime.now(timezone.utc),
+        )
+        await self.transactions.add(txn)
+        await self.users.adjust_balance(job.user_id, amount)
+
+    async def _refund(
+        self,
+        job: GenerationJob,
+        error_message: str | None,
+        status: GenerationStatus,
+    ) -> None:
         txn = BalanceTransaction(
             id=uuid4(),
             user_id=job.user_id,
@@ -131,9 +421,41 @@ class GenerationService:
         user: User,
         limit: int,
         offset: int,
+        after: tuple[datetime, UUID] | None = None,
+        with_payloads: bool = True,
     ) -> Iterable[GenerationJob]:
         """Список задач."""
-        return await self.jobs.list_for_user(user.id, limit, offset)
+        return await self.jobs.list_for_user(
+            user.id, limit, offset, after, with_payloads
+        )
+
+    async def get_job_version(
+        self,
+        job_id: UUID,
+        user: User,
+    ) -> datetime | None:
+        """Версия (updated_at) задачи пользователя."""
+        return await self.jobs.get_version(job_id, user.id)
+
+    async def list_job_versions(
+        self,
+        user: User,
+        limit: int,
+        offset: int,
+        after: tuple[datetime, UUID] | None = None,
+    ) -> list[tuple[UUID, datetime]]:
+        """Версии задач страницы."""
+        return await self.jobs.list_versions_for_user(
+            user.id, limit, offset, after
+        )
+
+    async def get_statuses(
+        self,
+        job_ids: Sequence[UUID],
+        user: User,
+    ) -> dict[UUID, GenerationStatus]:
+        """Статусы нескольких задач пользователя."""
+        return await self.jobs.statuses_for_user(user.id, job_ids)
 
     async def get_job(
         self,
@@ -141,7 +463,14 @@ class GenerationService:
         user: User,
     ) -> GenerationJob | None:
         """Получить задачу."""
-        job = await self.jobs.get(job_id)
+        if self.flights is None:
+            job = await self.jobs.get(job_id)
+        else:
+            shared = await self.flights.do(
+                ("job", job_id), lambda: self.jobs.get(job_id)
+            )
+            # Копия: общий результат видят и другие запросы.
+            job = replace(shared) if shared else None
         if job and job.user_id == user.id:
             return job
         return None
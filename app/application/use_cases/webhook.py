@@ -1,4 +1,7 @@
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from typing import Sequence
 from uuid import UUID, uuid4
 
 from app.application.interfaces.repositories import (
@@ -13,6 +16,15 @@ from app.domain.entities import (
 )
 
 
+@dataclass(slots=True)
+class TopupEvent:
+    """Событие пополнения из пачки."""
+
+    external_user_id: UUID
+    amount: int
+    event_id: str
+
+
 class WebhookTopupService:
     """Сервис пополнений."""
 
@@ -31,37 +43,57 @@ class WebhookTopupService:
         external_ref: str | None,
     ) -> User:
         """Обработать пополнение."""
-        user = await self.users.get_by_external_id(external_user_id)
-        if user is None:
-            user = await self.users.create(
-                external_user_id,
-                api_key_hash=None,
-                api_key_fingerprint=None,
-            )
-
-        locked_user = await self.users.get_by_id_for_update(user.id)
-        if locked_user is None:
-            raise RuntimeError("Failed to lock user for topup")
-
-        if external_ref:
-            existing = await self.transactions.find_by_external_ref(
-                external_ref,
-                BalanceReason.TOPUP,
-            )
-            if existing:
-                return locked_user
+        user = await self.users.upsert_by_external_id(external_user_id)
 
         txn = BalanceTransaction(
             id=uuid4(),
-            user_id=locked_user.id,
+            user_id=user.id,
             type=TransactionType.CREDIT,
             reason=BalanceReason.TOPUP,
             amount=amount,
             external_ref=external_ref,
             created_at=datetime.now(timezone.utc),
         )
-        await self.transactions.add(txn)
-        await self.users.adjust_balance(locked_user.id, amount)
+        if not await self.transactions.add_if_absent(txn):
+            return user
+
+        user.balance_tokens = await self.users.adjust_balance(user.id, amount)
+        return user
+
+    async def handle_topup_batch(
+        self,
+        events: Sequence[TopupEvent],
+    ) -> list[bool]:
+        """Обработать пачку пополнений, вернуть признак зачисления."""
+        user_ids = await self.users.upsert_many_by_external_ids(
+            event.external_user_id for event in events
+        )
+
+        now = datetime.now(timezone.utc)
+        txns: dict[str, BalanceTransaction] = {}
+        for event in events:
+            if event.event_id in txns:
+                continue
+            txns[event.event_id] = BalanceTransaction(
+                id=uuid4(),
+                user_id=user_ids[event.external_user_id],
+                type=TransactionType.CREDIT,
+                reason=BalanceReason.TOPUP,
+                amount=event.amount,
+                external_ref=event.event_id,
+                created_at=now,
+            )
+        inserted = await self.transactions.add_many_if_absent(
+            list(txns.values())
+        )
+
+        deltas: defaultdict[UUID, int] = defaultdict(int)
+        for ref in inserted:
+            deltas[txns[ref].user_id] += txns[ref].amount
+        await self.users.adjust_balances(deltas)
 
-        refreshed = await self.users.get_by_external_id(external_user_id)
-        return refreshed or locked_user
+        credited: list[bool] = []
+        for event in events:
+            credited.append(event.event_id in inserted)
+            inserted.discard(event.event_id)
+        return credited
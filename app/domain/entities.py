@@ -41,6 +41,15 @@ class GenerationStatus(str, Enum):
     CANCELED = "CANCELED"
 
 
+TERMINAL_STATUSES = frozenset(
+    {
+        GenerationStatus.COMPLETED,
+        GenerationStatus.FAILED,
+        GenerationStatus.CANCELED,
+    }
+)
+
+
 @dataclass(slots=True)
 class User:
     """Пользователь."""
@@ -85,3 +94,7 @@ class GenerationJob:
     cancel_url: str | None
     created_at: datetime
     updated_at: datetime
+    batch_id: UUID | None = None
+    pipeline_id: UUID | None = None
+    pipeline_stage: int | None = None
+    children_json: list[dict[str, Any]] | None = None
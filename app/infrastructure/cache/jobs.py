@@ -0,0 +1,81 @@
+import json
+from collections import OrderedDict
+from dataclasses import replace
+from uuid import UUID
+
+from app.domain.entities import TERMINAL_STATUSES, GenerationJob
+from app.infrastructure.settings import get_settings
+
+# Примерный вес полей задачи помимо JSON: UUID, строки, даты.
+JOB_OVERHEAD_BYTES = 1024
+
+
+def estimate_job_bytes(job: GenerationJob) -> int:
+    """Оценка памяти задачи по размеру её JSON-полей."""
+    payload = json.dumps(
+        [job.input_json, job.result_json, job.error_message],
+        default=str,
+        ensure_ascii=False,
+    )
+    return JOB_OVERHEAD_BYTES + len(payload.encode("utf-8"))
+
+
+class TerminalJobCache:
+    """LRU завершённых задач с лимитом по байтам.
+
+    Завершённая задача больше не меняется, поэтому запись не требует
+    инвалидации ни в этом, ни в других процессах.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[UUID, tuple[GenerationJob, int]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, job_id: UUID) -> GenerationJob | None:
+        """Задача из кэша (копия) или None."""
+        entry = self._entries.get(job_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(job_id)
+        self.hits += 1
+        return replace(entry[0])
+
+    def put(self, job: GenerationJob) -> None:
+        """Сохранить задачу, если она завершена и помещается в лимит."""
+        if job.status not in TERMINAL_STATUSES or job.id in self._entries:
+            return
+        size = estimate_job_bytes(job)
+        if size > self.max_bytes:
+            return
+        self._entries[job.id] = (replace(job), size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def clear(self) -> None:
+        """Очистить кэш."""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики кэша."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+terminal_jobs = TerminalJobCache(get_settings().terminal_job_cache_bytes)
@@ -0,0 +1,43 @@
+import hashlib
+import json
+from typing import Any, Mapping
+
+
+def result_cache_key(model_id: str, input_json: Mapping[str, Any]) -> str:
+    """Хэш канонического JSON (модель, входные данные)."""
+    canonical = json.dumps(
+        [model_id, input_json],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCacheStats:
+    """Счётчики кэша результатов в процессе."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Доля попаданий среди обращений."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def snapshot(self) -> dict[str, float]:
+        """Текущие значения счётчиков."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+
+result_cache_stats = ResultCacheStats()
@@ -0,0 +1,80 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, TypeVar
+
+from app.application.interfaces.read_coalescer import FlightKey, ReadCoalescer
+
+T = TypeVar("T")
+
+
+class SingleFlight(ReadCoalescer):
+    """Объединение одинаковых одновременных чтений в одно обращение к БД.
+
+    Ключ — пара (пространство, идентификатор); счётчики ведутся по
+    пространству, чтобы не расти вместе с числом идентификаторов.
+    Результат общий для всех ожидающих, поэтому вызывающие не должны
+    его изменять.
+    """
+
+    def __init__(self) -> None:
+        self.leaders: Counter[str] = Counter()
+        self.coalesced: Counter[str] = Counter()
+        self._inflight: dict[FlightKey, asyncio.Future[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: FlightKey, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить fn или дождаться уже идущего вызова с тем же ключом."""
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            try:
+                # shield: отмена ожидающего не отменяет общий вызов.
+                result: T = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменён ведущий, а не мы: повторяем сами.
+                task = asyncio.current_task()
+                if future.cancelled() and not (task and task.cancelling()):
+                    continue
+                raise
+            self.coalesced[key[0]] += 1
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку без ожидающих не считаем «неполученной».
+        future.add_done_callback(_consume_exception)
+        self._inflight[key] = future
+        self.leaders[key[0]] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Счётчики по пространствам ключей."""
+        return {
+            namespace: {
+                "leaders": self.leaders[namespace],
+                "coalesced": self.coalesced[namespace],
+            }
+            for namespace in sorted(set(self.leaders) | set(self.coalesced))
+        }
+
+
+def _consume_exception(future: asyncio.Future[Any]) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+read_flights = SingleFlight()
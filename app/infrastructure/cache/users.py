@@ -0,0 +1,109 @@
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Iterable
+from uuid import UUID
+
+from app.domain.entities import User
+from app.infrastructure.settings import get_settings
+
+
+class UserCache:
+    """Кэш пользователей (ключ и баланс) с ограниченным временем жизни.
+
+    Свои изменения баланса попадают в кэш сразу после commit, чужие —
+    через уведомления `balance_events`; TTL ограничивает устаревание,
+    если уведомление потерялось или его нет (не PostgreSQL).
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[UUID, tuple[User, float]] = OrderedDict()
+        self._by_fingerprint: dict[str, UUID] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        """Кэш включён."""
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, user_id: UUID) -> User | None:
+        """Пользователь из кэша (копия) или None."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._remove(user_id)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return replace(entry[0])
+
+    def get_by_fingerprint(self, fingerprint: str) -> User | None:
+        """Пользователь по отпечатку ключа API."""
+        user_id = self._by_fingerprint.get(fingerprint)
+        if user_id is None:
+            self.misses += 1
+            return None
+        return self.get(user_id)
+
+    def put(self, user: User) -> None:
+        """Сохранить пользователя, прочитанного из БД."""
+        if not self.enabled:
+            return
+        self._remove(user.id)
+        self._entries[user.id] = (
+            replace(user),
+            time.monotonic() + self.ttl_seconds,
+        )
+        if user.api_key_fingerprint:
+            self._by_fingerprint[user.api_key_fingerprint] = user.id
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def set_balance(self, user_id: UUID, balance_tokens: int) -> None:
+        """Записать зафиксированный баланс, если пользователь в кэше."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        user = replace(entry[0], balance_tokens=balance_tokens)
+        self._entries[user_id] = (user, time.monotonic() + self.ttl_seconds)
+
+    def invalidate(self, user_ids: Iterable[UUID]) -> None:
+        """Удалить записи пользователей."""
+        for user_id in user_ids:
+            self._remove(user_id)
+
+    def clear(self) -> None:
+        """Очистить кэш."""
+        self._entries.clear()
+        self._by_fingerprint.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Счётчики кэша."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _remove(self, user_id: UUID) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        fingerprint = entry[0].api_key_fingerprint
+        if fingerprint and self._by_fingerprint.get(fingerprint) == user_id:
+            del self._by_fingerprint[fingerprint]
+
+
+_settings = get_settings()
+
+users_cache = UserCache(
+    _settings.user_cache_ttl_seconds,
+    _settings.user_cache_max_entries,
+)
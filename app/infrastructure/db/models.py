@@ -7,9 +7,11 @@ from sqlalchemy import (
     DateTime,
     Enum as PgEnum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -22,6 +24,10 @@ from app.domain.entities import (
 )
 from app.infrastructure.db.base import Base
 
+TOPUP_EXTERNAL_REF_WHERE = text(
+    "reason = 'TOPUP' AND external_ref IS NOT NULL"
+)
+
 
 class UserModel(Base):
     """Модель пользователя."""
@@ -69,6 +75,15 @@ class BalanceTransactionModel(Base):
     """Модель транзакции баланса."""
 
     __tablename__ = "balance_transactions"
+    __table_args__ = (
+        Index(
+            "ix_balance_transactions_external_ref_topup_unique",
+            "external_ref",
+            unique=True,
+            postgresql_where=TOPUP_EXTERNAL_REF_WHERE,
+            sqlite_where=TOPUP_EXTERNAL_REF_WHERE,
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(
         PG_UUID(as_uuid=True),
@@ -110,6 +125,14 @@ class GenerationJobModel(Base):
     """Модель задачи генерации."""
 
     __tablename__ = "generation_jobs"
+    __table_args__ = (
+        Index(
+            "ix_generation_jobs_user_id_created_at_id",
+            "user_id",
+            "created_at",
+            "id",
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(
         PG_UUID(as_uuid=True),
@@ -173,7 +196,78 @@ class GenerationJobModel(Base):
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
     )
+    batch_id: Mapped[UUID | None] = mapped_column(
+        PG_UUID(as_uuid=True),
+        nullable=True,
+        index=True,
+    )
+    pipeline_id: Mapped[UUID | None] = mapped_column(
+        PG_UUID(as_uuid=True),
+        nullable=True,
+        index=True,
+    )
+    pipeline_stage: Mapped[int | None] = mapped_column(
+        Integer,
+        nullable=True,
+    )
+    children_json: Mapped[list[dict[str, Any]] | None] = mapped_column(
+        JSON,
+        nullable=True,
+    )
 
     user: Mapped[UserModel] = relationship(
         back_populates="jobs"
     )
+
+
+class GenerationResultModel(Base):
+    """Сохранённый результат детерминированной генерации."""
+
+    __tablename__ = "generation_results"
+
+    key: Mapped[str] = mapped_column(
+        String(64),
+        primary_key=True,
+    )
+    model_id: Mapped[str] = mapped_column(
+        String(255),
+        nullable=False,
+    )
+    result_json: Mapped[dict[str, Any]] = mapped_column(
+        JSON,
+        nullable=False,
+    )
+    hits: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+    )
+    last_used_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        index=True,
+    )
+
+
+class AssetModel(Base):
+    """Владелец загруженного ассета."""
+
+    __tablename__ = "assets"
+
+    user_id: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("users.id"),
+        primary_key=True,
+    )
+    ref: Mapped[str] = mapped_column(
+        String(512),
+        primary_key=True,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+    )
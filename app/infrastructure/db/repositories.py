@@ -1,13 +1,17 @@
-from datetime import datetime, timezone
-from typing import Iterable
-from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Mapping, Sequence
+from uuid import UUID, uuid4
 
-from sqlalchemy import select, update
+from sqlalchemy import case, delete, event, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer
 
 from app.application.interfaces.repositories import (
+    AssetRepository,
     BalanceTransactionRepository,
     GenerationJobRepository,
+    GenerationResultRepository,
     UserRepository,
 )
 from app.domain.entities import (
@@ -17,18 +21,89 @@ from app.domain.entities import (
     GenerationStatus,
     User,
 )
+from app.infrastructure.cache.jobs import TerminalJobCache, terminal_jobs
+from app.infrastructure.cache.results import (
+    ResultCacheStats,
+    result_cache_key,
+    result_cache_stats,
+)
+from app.infrastructure.cache.users import UserCache, users_cache
 from app.infrastructure.db.models import (
+    TOPUP_EXTERNAL_REF_WHERE,
+    AssetModel,
     BalanceTransactionModel,
     GenerationJobModel,
+    GenerationResultModel,
     UserModel,
 )
+from app.infrastructure.events.bus import JobEvent, job_events
+from app.infrastructure.events.notify import (
+    JOB_EVENTS_CHANNEL,
+    job_event_payload,
+    notify,
+    notify_balance_changed,
+)
+
+PENDING_JOB_EVENTS_KEY = "pending_job_events"
+PENDING_USER_CACHE_KEY = "pending_user_cache"
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_job_events(session: Session) -> None:
+    """Разослать события задач после фиксации транзакции."""
+    for job_event in session.info.pop(PENDING_JOB_EVENTS_KEY, []):
+        job_events.publish(job_event)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_job_events(session: Session) -> None:
+    """Отбросить события откатанной транзакции."""
+    session.info.pop(PENDING_JOB_EVENTS_KEY, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_user_cache_updates(session: Session) -> None:
+    """Перенести зафиксированные балансы в кэш пользователей."""
+    for cache, user_id, balance in session.info.pop(
+        PENDING_USER_CACHE_KEY, []
+    ):
+        if balance is None:
+            cache.invalidate([user_id])
+        else:
+            cache.set_balance(user_id, balance)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_cache_updates(session: Session) -> None:
+    """Отбросить обновления кэша откатанной транзакции."""
+    session.info.pop(PENDING_USER_CACHE_KEY, None)
+
+
+def upsert_insert(session: AsyncSession, model: Any) -> Any:
+    """INSERT с поддержкой ON CONFLICT для диалекта сессии."""
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
 
 
 class SQLAlchemyUserRepository(UserRepository):
     """Репозиторий пользователей."""
 
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        cache: UserCache | None = users_cache,
+    ):
         self.session = session
+        self.cache = cache
+
+    def _after_commit(self, user_id: UUID, balance: int | None) -> None:
+        """Обновить (или сбросить при None) запись кэша после commit."""
+        if self.cache is None:
+            return
+        self.session.info.setdefault(PENDING_USER_CACHE_KEY, []).append(
+            (self.cache, user_id, balance)
+        )
 
     def _to_domain(self, model: UserModel) -> User:
         """Преобразовать в доменную модель."""
@@ -58,14 +133,23 @@ class SQLAlchemyUserRepository(UserRepository):
         self,
         fingerprint: str,
     ) -> User | None:
-        """Получить по отпечатку ключа."""
+        """Получить по отпечатку ключа; сначала из кэша процесса."""
+        if self.cache is not None:
+            cached = self.cache.get_by_fingerprint(fingerprint)
+            if cached is not None:
+                return cached
         result = await self.session.execute(
             select(UserModel).where(
                 UserModel.api_key_fingerprint == fingerprint
             )
         )
         model = result.scalar_one_or_none()
-        return self._to_domain(model) if model else None
+        if model is None:
+            return None
+        user = self._to_domain(model)
+        if self.cache is not None:
+            self.cache.put(user)
+        return user
 
     async def get_by_id_for_update(
         self,
@@ -96,6 +180,61 @@ class SQLAlchemyUserRepository(UserRepository):
         await self.session.flush()
         return self._to_domain(model)
 
+    async def upsert_by_external_id(
+        self,
+        external_user_id: UUID,
+    ) -> User:
+        """Получить или создать по внешнему ID одним запросом."""
+        stmt = upsert_insert(self.session, UserModel).values(
+            id=uuid4(),
+            external_user_id=external_user_id,
+            balance_tokens=0,
+            created_at=datetime.now(timezone.utc),
+        )
+        # DO UPDATE вместо DO NOTHING: RETURNING отдаёт и существующую
+        # строку, а в PostgreSQL она заодно блокируется до commit.
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserModel.external_user_id],
+            set_={"external_user_id": stmt.excluded.external_user_id},
+        ).returning(UserModel)
+        result = await self.session.scalars(
+            stmt,
+            execution_options={"populate_existing": True},
+        )
+        return self._to_domain(result.one())
+
+    async def upsert_many_by_external_ids(
+        self,
+        external_user_ids: Iterable[UUID],
+    ) -> dict[UUID, UUID]:
+        """Получить или создать пачку пользователей: внешний ID → ID."""
+        # Сортировка задаёт единый порядок блокировок строк между
+        # параллельными пачками и убирает дубли внутри одного INSERT.
+        unique_ids = sorted(set(external_user_ids))
+        if not unique_ids:
+            return {}
+        now = datetime.now(timezone.utc)
+        stmt = upsert_insert(self.session, UserModel).values(
+            [
+                {
+                    "id": uuid4(),
+                    "external_user_id": external_user_id,
+                    "balance_tokens": 0,
+                    "created_at": now,
+                }
+                for external_user_id in unique_ids
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserModel.external_user_id],
+            set_={"external_user_id": stmt.excluded.external_user_id},
+        ).returning(UserModel.external_user_id, UserModel.id)
+        result = await self.session.execute(stmt)
+        return {
+            external_user_id: user_id
+            for external_user_id, user_id in result.all()
+        }
+
     async def update_api_key(
         self,
         user_id: UUID,
@@ -111,18 +250,75 @@ class SQLAlchemyUserRepository(UserRepository):
                 api_key_fingerprint=api_key_fingerprint,
             )
         )
+        self._after_commit(user_id, None)
+        await notify_balance_changed(self.session, [user_id])
 
     async def adjust_balance(
         self,
         user_id: UUID,
         delta: int,
-    ) -> None:
-        """Изменить баланс."""
-        await self.session.execute(
+    ) -> int:
+        """Изменить баланс и вернуть новое значение."""
+        result = await self.session.execute(
             update(UserModel)
             .where(UserModel.id == user_id)
             .values(balance_tokens=UserModel.balance_tokens + delta)
+            .returning(UserModel.balance_tokens)
+        )
+        balance = int(result.scalar_one())
+        self._after_commit(user_id, balance)
+        await notify_balance_changed(self.session, [user_id])
+        return balance
+
+    async def adjust_balances(
+        self,
+        deltas: Mapping[UUID, int],
+    ) -> None:
+        """Изменить балансы нескольких пользователей одним запросом."""
+        if not deltas:
+            return
+        await self.session.execute(
+            update(UserModel)
+            .where(UserModel.id.in_(sorted(deltas)))
+            .values(
+                balance_tokens=UserModel.balance_tokens
+                + case(dict(deltas), value=UserModel.id, else_=0)
+            )
+            .execution_options(synchronize_session=False)
         )
+        for user_id in deltas:
+            self._after_commit(user_id, None)
+        await notify_balance_changed(self.session, sorted(deltas))
+
+
+class SQLAlchemyAssetRepository(AssetRepository):
+    """Владельцы загруженных ассетов."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add(self, user_id: UUID, ref: str) -> None:
+        """Записать владельца; повторная загрузка ничего не меняет."""
+        await self.session.execute(
+            upsert_insert(self.session, AssetModel)
+            .values(user_id=user_id, ref=ref)
+            .on_conflict_do_nothing(
+                index_elements=[AssetModel.user_id, AssetModel.ref]
+            )
+        )
+
+    async def owned(self, user_id: UUID, refs: Iterable[str]) -> set[str]:
+        """Ссылки из refs, загруженные пользователем."""
+        refs = set(refs)
+        if not refs:
+            return set()
+        result = await self.session.scalars(
+            select(AssetModel.ref).where(
+                AssetModel.user_id == user_id,
+                AssetModel.ref.in_(refs),
+            )
+        )
+        return set(result)
 
 
 class SQLAlchemyBalanceTransactionRepository(
@@ -165,6 +361,86 @@ class SQLAlchemyBalanceTransactionRepository(
         self.session.add(model)
         await self.session.flush()
 
+    async def add_many(
+        self,
+        transactions: Sequence[BalanceTransaction],
+    ) -> None:
+        """Добавить пачку транзакций одним INSERT."""
+        if not transactions:
+            return
+        await self.session.execute(
+            insert(BalanceTransactionModel),
+            [
+                {
+                    "id": txn.id,
+                    "user_id": txn.user_id,
+                    "type": txn.type,
+                    "reason": txn.reason,
+                    "amount": txn.amount,
+                    "external_ref": txn.external_ref,
+                    "created_at": txn.created_at,
+                }
+                for txn in transactions
+            ],
+        )
+
+    async def add_if_absent(
+        self,
+        transaction: BalanceTransaction,
+    ) -> bool:
+        """Добавить транзакцию, если её внешняя ссылка ещё не учтена."""
+        stmt = (
+            upsert_insert(self.session, BalanceTransactionModel)
+            .values(
+                id=transaction.id,
+                user_id=transaction.user_id,
+                type=transaction.type,
+                reason=transaction.reason,
+                amount=transaction.amount,
+                external_ref=transaction.external_ref,
+                created_at=transaction.created_at,
+            )
+            .on_conflict_do_nothing(
+                index_elements=[BalanceTransactionModel.external_ref],
+                index_where=TOPUP_EXTERNAL_REF_WHERE,
+            )
+            .returning(BalanceTransactionModel.id)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    async def add_many_if_absent(
+        self,
+        transactions: Sequence[BalanceTransaction],
+    ) -> set[str]:
+        """Добавить пачку транзакций, вернуть вставленные внешние ссылки."""
+        if not transactions:
+            return set()
+        stmt = (
+            upsert_insert(self.session, BalanceTransactionModel)
+            .values(
+                [
+                    {
+                        "id": txn.id,
+                        "user_id": txn.user_id,
+                        "type": txn.type,
+                        "reason": txn.reason,
+                        "amount": txn.amount,
+                        "external_ref": txn.external_ref,
+                        "created_at": txn.created_at,
+                    }
+                    for txn in transactions
+                ]
+            )
+            .on_conflict_do_nothing(
+                index_elements=[BalanceTransactionModel.external_ref],
+                index_where=TOPUP_EXTERNAL_REF_WHERE,
+            )
+            .returning(BalanceTransactionModel.external_ref)
+        )
+        result = await self.session.execute(stmt)
+        return {ref for ref in result.scalars().all() if ref is not None}
+
     async def find_by_external_ref(
         self,
         external_ref: str,
@@ -188,12 +464,18 @@ class SQLAlchemyGenerationJobRepository(
 ):
     """Репозиторий задач генерации."""
 
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        terminal_cache: TerminalJobCache | None = terminal_jobs,
+    ):
         self.session = session
+        self.terminal_cache = terminal_cache
 
     def _to_domain(
         self,
         model: GenerationJobModel,
+        with_payloads: bool = True,
     ) -> GenerationJob:
         """Преобразовать в доменную модель."""
         return GenerationJob(
@@ -204,14 +486,18 @@ class SQLAlchemyGenerationJobRepository(
             fal_request_id=model.fal_request_id,
             status=model.status,
             cost_tokens=model.cost_tokens,
-            input_json=model.input_json,
-            result_json=model.result_json,
+            input_json=model.input_json if with_payloads else {},
+            result_json=model.result_json if with_payloads else None,
             error_message=model.error_message,
             status_url=model.status_url,
             response_url=model.response_url,
             cancel_url=model.cancel_url,
             created_at=model.created_at,
             updated_at=model.updated_at,
+            batch_id=model.batch_id,
+            pipeline_id=model.pipeline_id,
+            pipeline_stage=model.pipeline_stage,
+            children_json=model.children_json if with_payloads else None,
         )
 
     async def create(
@@ -235,43 +521,202 @@ class SQLAlchemyGenerationJobRepository(
             cancel_url=job.cancel_url,
             created_at=job.created_at,
             updated_at=job.updated_at,
+            batch_id=job.batch_id,
+            pipeline_id=job.pipeline_id,
+            pipeline_stage=job.pipeline_stage,
         )
         self.session.add(model)
         await self.session.flush()
         return self._to_domain(model)
 
+    async def create_many(self, jobs: Sequence[GenerationJob]) -> None:
+        """Создать пачку задач одним INSERT."""
+        if not jobs:
+            return
+        await self.session.execute(
+            insert(GenerationJobModel),
+            [
+                {
+                    "id": job.id,
+                    "user_id": job.user_id,
+                    "kind": job.kind,
+                    "model_id": job.model_id,
+                    "fal_request_id": job.fal_request_id,
+                    "status": job.status,
+                    "cost_tokens": job.cost_tokens,
+                    "input_json": job.input_json,
+                    "result_json": job.result_json,
+                    "error_message": job.error_message,
+                    "status_url": job.status_url,
+                    "response_url": job.response_url,
+                    "cancel_url": job.cancel_url,
+                    "created_at": job.created_at,
+                    "updated_at": job.updated_at,
+                    "batch_id": job.batch_id,
+                    "pipeline_id": job.pipeline_id,
+                    "pipeline_stage": job.pipeline_stage,
+                }
+                for job in jobs
+            ],
+        )
+
     async def get(
         self,
         job_id: UUID,
     ) -> GenerationJob | None:
-        """Получить задачу."""
+        """Получить задачу; завершённые — из кэша процесса."""
+        if self.terminal_cache is not None:
+            cached = self.terminal_cache.get(job_id)
+            if cached is not None:
+                return cached
         result = await self.session.execute(
             select(GenerationJobModel).where(
                 GenerationJobModel.id == job_id
             )
         )
         model = result.scalar_one_or_none()
-        return self._to_domain(model) if model else None
+        if model is None:
+            return None
+        job = self._to_domain(model)
+        if self.terminal_cache is not None:
+            self.terminal_cache.put(job)
+        return job
+
+    def _page(
+        self,
+        query: Any,
+        user_id: UUID,
+        limit: int,
+        offset: int,
+        after: tuple[datetime, UUID] | None,
+    ) -> Any:
+        """Страница задач пользователя: фильтр, курсор, порядок, лимит."""
+        query = query.where(GenerationJobModel.user_id == user_id)
+        if after is not None:
+            query = query.where(
+                tuple_(GenerationJobModel.created_at, GenerationJobModel.id)
+                < tuple_(*after)
+            )
+        if offset:
+            query = query.offset(offset)
+        return query.order_by(
+            GenerationJobModel.created_at.desc(),
+            GenerationJobModel.id.desc(),
+        ).limit(limit)
 
     async def list_for_user(
         self,
         user_id: UUID,
         limit: int,
         offset: int,
+        after: tuple[datetime, UUID] | None = None,
+        with_payloads: bool = True,
     ) -> Iterable[GenerationJob]:
-        """Список задач пользователя."""
+        """Список задач пользователя после курсора (created_at, id)."""
+        query = select(GenerationJobModel)
+        if not with_payloads:
+            # JSON-поля не выбираются; обращение к ним — ошибка, а не
+            # скрытая ленивая загрузка.
+            query = query.options(
+                defer(GenerationJobModel.input_json, raiseload=True),
+                defer(GenerationJobModel.result_json, raiseload=True),
+                defer(GenerationJobModel.children_json, raiseload=True),
+            )
         result = await self.session.execute(
-            select(GenerationJobModel)
-            .where(GenerationJobModel.user_id == user_id)
-            .order_by(GenerationJobModel.created_at.desc())
-            .limit(limit)
-            .offset(offset)
+            self._page(query, user_id, limit, offset, after)
         )
         return [
-            self._to_domain(model)
+            self._to_domain(model, with_payloads)
             for model in result.scalars().all()
         ]
 
+    async def get_version(
+        self,
+        job_id: UUID,
+        user_id: UUID,
+    ) -> datetime | None:
+        """updated_at задачи пользователя без чтения остальных колонок."""
+        if self.terminal_cache is not None:
+            cached = self.terminal_cache.get(job_id)
+            if cached is not None:
+                return cached.updated_at if cached.user_id == user_id else None
+        result = await self.session.execute(
+            select(GenerationJobModel.updated_at).where(
+                GenerationJobModel.id == job_id,
+                GenerationJobModel.user_id == user_id,
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def list_versions_for_user(
+        self,
+        user_id: UUID,
+        limit: int,
+        offset: int,
+        after: tuple[datetime, UUID] | None = None,
+    ) -> list[tuple[UUID, datetime]]:
+        """(id, updated_at) задач страницы — для ETag списка."""
+        result = await self.session.execute(
+            self._page(
+                select(GenerationJobModel.id, GenerationJobModel.updated_at),
+                user_id,
+                limit,
+                offset,
+                after,
+            )
+        )
+        return [(job_id, updated_at) for job_id, updated_at in result.all()]
+
+    async def statuses_for_user(
+        self,
+        user_id: UUID,
+        job_ids: Sequence[UUID],
+    ) -> dict[UUID, GenerationStatus]:
+        """Статусы задач пользователя одним запросом."""
+        if not job_ids:
+            return {}
+        result = await self.session.execute(
+            select(GenerationJobModel.id, GenerationJobModel.status).where(
+                GenerationJobModel.id.in_(job_ids),
+                GenerationJobModel.user_id == user_id,
+            )
+        )
+        return {job_id: job_status for job_id, job_status in result.all()}
+
+    async def list_pipeline(
+        self,
+        pipeline_id: UUID,
+        user_id: UUID,
+    ) -> list[GenerationJob]:
+        """Этапы конвейера пользователя по порядку."""
+        result = await self.session.execute(
+            select(GenerationJobModel)
+            .where(
+                GenerationJobModel.pipeline_id == pipeline_id,
+                GenerationJobModel.user_id == user_id,
+            )
+            .order_by(GenerationJobModel.pipeline_stage)
+        )
+        return [self._to_domain(model) for model in result.scalars()]
+
+    async def set_input(
+        self,
+        job_id: UUID,
+        input_json: dict[str, Any],
+    ) -> None:
+        """Заменить вход ещё не отправленной задачи."""
+        await self.session.execute(
+            update(GenerationJobModel)
+            .where(
+                GenerationJobModel.id == job_id,
+                GenerationJobModel.status == GenerationStatus.QUEUED,
+            )
+            .values(
+                input_json=input_json,
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+
     async def update_status(
         self,
         job_id: UUID,
@@ -282,13 +727,15 @@ class SQLAlchemyGenerationJobRepository(
         status_url: str | None = None,
         response_url: str | None = None,
         cancel_url: str | None = None,
+        children_json: list[dict[str, Any]] | None = None,
     ) -> None:
         """Обновить статус."""
+        updated_at = datetime.now(timezone.utc)
         values = {
             "status": status,
             "result_json": result_json,
             "error_message": error_message,
-            "updated_at": datetime.now(timezone.utc),
+            "updated_at": updated_at,
         }
 
         if fal_request_id is not None:
@@ -299,9 +746,140 @@ class SQLAlchemyGenerationJobRepository(
             values["response_url"] = response_url
         if cancel_url is not None:
             values["cancel_url"] = cancel_url
+        if children_json is not None:
+            values["children_json"] = children_json
 
-        await self.session.execute(
+        # Обычный тик опроса не меняет статус: пробуем условный UPDATE и
+        # без нового результата не будим подписчиков. Старый статус через
+        # RETURNING переносимо не получить, поэтому при промахе нужен
+        # второй, безусловный UPDATE.
+        statement = (
             update(GenerationJobModel)
-            .where(GenerationJobModel.id == job_id)
             .values(**values)
+            .returning(GenerationJobModel.user_id)
+        )
+        result = await self.session.execute(
+            statement.where(
+                GenerationJobModel.id == job_id,
+                GenerationJobModel.status == status,
+            )
+        )
+        user_id = result.scalar_one_or_none()
+        if user_id is not None and result_json is None:
+            return
+        if user_id is None:
+            result = await self.session.execute(
+                statement.where(GenerationJobModel.id == job_id)
+            )
+            user_id = result.scalar_one_or_none()
+        if user_id is None:
+            return
+        job_event = JobEvent(
+            job_id=job_id,
+            user_id=user_id,
+            status=status,
+            updated_at=updated_at,
+            result_json=result_json,
+            error_message=error_message,
+        )
+        # Подписчики узнают о статусе только после commit: локальные —
+        # из хука after_commit, другие процессы — через NOTIFY.
+        self.session.info.setdefault(PENDING_JOB_EVENTS_KEY, []).append(
+            job_event
+        )
+        await notify(
+            self.session, JOB_EVENTS_CHANNEL, job_event_payload(job_event)
+        )
+
+
+class SQLAlchemyGenerationResultRepository(GenerationResultRepository):
+    """Кэш результатов детерминированных генераций."""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        ttl_seconds: int,
+        max_entries: int,
+        stats: ResultCacheStats = result_cache_stats,
+    ):
+        self.session = session
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.max_entries = max_entries
+        self.stats = stats
+        # Вытеснение пачкой: раз в ~1% лимита сохранений, а не на каждое.
+        self.sweep_every = max(1, max_entries // 100)
+
+    async def get(
+        self,
+        model_id: str,
+        input_json: Mapping[str, Any],
+    ) -> dict[str, Any] | None:
+        """Сохранённый результат; попадание продлевает запись в LRU."""
+        now = datetime.now(timezone.utc)
+        result = await self.session.execute(
+            update(GenerationResultModel)
+            .where(
+                GenerationResultModel.key
+                == result_cache_key(model_id, input_json),
+                GenerationResultModel.created_at >= now - self.ttl,
+            )
+            .values(
+                hits=GenerationResultModel.hits + 1,
+                last_used_at=now,
+            )
+            .returning(GenerationResultModel.result_json)
+        )
+        result_json = result.scalar_one_or_none()
+        if result_json is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return result_json
+
+    async def put(
+        self,
+        model_id: str,
+        input_json: Mapping[str, Any],
+        result_json: dict[str, Any],
+    ) -> None:
+        """Сохранить результат; периодически вытеснять устаревшие записи."""
+        now = datetime.now(timezone.utc)
+        stmt = upsert_insert(self.session, GenerationResultModel).values(
+            key=result_cache_key(model_id, input_json),
+            model_id=model_id,
+            result_json=result_json,
+            hits=0,
+            created_at=now,
+            last_used_at=now,
+        )
+        await self.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[GenerationResultModel.key],
+                set_={
+                    "result_json": stmt.excluded.result_json,
+                    "created_at": stmt.excluded.created_at,
+                    "last_used_at": stmt.excluded.last_used_at,
+                },
+            )
+        )
+        self.stats.stores += 1
+        if self.stats.stores % self.sweep_every:
+            return
+
+        expired = await self.session.execute(
+            delete(GenerationResultModel).where(
+                GenerationResultModel.created_at < now - self.ttl
+            )
+        )
+        # Сверх лимита вытесняются давно не использованные записи.
+        overflow = (
+            select(GenerationResultModel.key)
+            .order_by(GenerationResultModel.last_used_at.desc())
+            .offset(self.max_entries)
+        )
+        evicted = await self.session.execute(
+            delete(GenerationResultModel).where(
+                GenerationResultModel.key.in_(overflow)
+            )
         )
+        self.stats.evictions += expired.rowcount + evicted.rowcount
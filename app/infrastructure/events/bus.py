@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+from uuid import UUID
+
+from app.domain.entities import TERMINAL_STATUSES, GenerationStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
+class JobEvent:
+    """Изменение статуса задачи."""
+
+    job_id: UUID
+    user_id: UUID
+    status: GenerationStatus
+    updated_at: datetime
+    result_json: dict[str, Any] | None = None
+    error_message: str | None = None
+    # Событие из другого процесса: без result_json и error_message.
+    partial: bool = False
+
+    @property
+    def event_id(self) -> int:
+        """Монотонный ID события: updated_at в микросекундах."""
+        updated_at = self.updated_at
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        return int(updated_at.timestamp() * 1_000_000)
+
+    @property
+    def is_terminal(self) -> bool:
+        """Задача завершена."""
+        return self.status in TERMINAL_STATUSES
+
+
+class UserSubscription:
+    """Подписка одного соединения на задачи пользователя."""
+
+    def __init__(self, user_id: UUID, queue_size: int):
+        self.user_id = user_id
+        self.job_ids: set[UUID] = set()
+        self.all_jobs = False
+        self.dropped = False
+        # None в очереди — сигнал, что подписчик отключён за медлительность.
+        self.queue: asyncio.Queue[JobEvent | None] = asyncio.Queue(queue_size)
+
+    def matches(self, job_id: UUID) -> bool:
+        """Подписано ли соединение на задачу."""
+        return self.all_jobs or job_id in self.job_ids
+
+
+class JobEventBus:
+    """Внутрипроцессная рассылка событий задач подписчикам."""
+
+    def __init__(self, queue_size: int = 64):
+        self._queue_size = queue_size
+        self._by_job: defaultdict[UUID, set[asyncio.Queue[JobEvent]]] = (
+            defaultdict(set)
+        )
+        self._by_user: defaultdict[UUID, set[UserSubscription]] = defaultdict(
+            set
+        )
+
+    def subscribe(self, job_id: UUID) -> asyncio.Queue[JobEvent]:
+        """Подписаться на события задачи."""
+        queue: asyncio.Queue[JobEvent] = asyncio.Queue(self._queue_size)
+        self._by_job[job_id].add(queue)
+        return queue
+
+    def unsubscribe(
+        self,
+        job_id: UUID,
+        queue: asyncio.Queue[JobEvent],
+    ) -> None:
+        """Отписаться от событий задачи."""
+        queues = self._by_job.get(job_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._by_job[job_id]
+
+    def subscribe_user(
+        self,
+        user_id: UUID,
+        queue_size: int | None = None,
+    ) -> UserSubscription:
+        """Зарегистрировать соединение пользователя."""
+        subscription = UserSubscription(
+            user_id, queue_size or self._queue_size
+        )
+        self._by_user[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe_user(self, subscription: UserSubscription) -> None:
+        """Удалить соединение пользователя из реестра."""
+        subscriptions = self._by_user.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._by_user[subscription.user_id]
+
+    def publish(self, event: JobEvent) -> None:
+        """Разослать событие; не блокирует."""
+        for queue in self._by_job.get(event.job_id, ()):
+            if queue.full():
+                # Важно последнее состояние: вытесняем самое старое.
+                queue.get_nowait()
+                logger.warning(
+                    "job_event_dropped", extra={"job_id": str(event.job_id)}
+                )
+            queue.put_nowait(event)
+
+        for subscription in list(self._by_user.get(event.user_id, ())):
+            if not subscription.matches(event.job_id):
+                continue
+            if subscription.queue.full():
+                self._drop(subscription)
+                continue
+            subscription.queue.put_nowait(event)
+
+    def _drop(self, subscription: UserSubscription) -> None:
+        """Отключить медленного подписчика, не блокируя рассылку."""
+        self.unsubscribe_user(subscription)
+        subscription.dropped = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+        logger.warning(
+            "job_subscriber_dropped",
+            extra={"user_id": str(subscription.user_id)},
+        )
+
+
+job_events = JobEventBus()
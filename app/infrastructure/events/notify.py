@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+from uuid import UUID, uuid4
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.domain.entities import GenerationStatus
+from app.infrastructure.cache.users import UserCache, users_cache
+from app.infrastructure.events.bus import JobEvent, JobEventBus, job_events
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS_CHANNEL = "job_events"
+BALANCE_EVENTS_CHANNEL = "balance_events"
+
+# Идентификатор процесса: свои уведомления уже разосланы локально.
+PROCESS_ID = uuid4().hex[:12]
+
+# Лимит NOTIFY в PostgreSQL — 8000 байт; UUID в JSON занимает ~40.
+MAX_USER_IDS_PER_NOTIFY = 150
+
+NotificationHandler = Callable[[dict[str, Any]], None]
+
+
+async def notify(
+    session: AsyncSession,
+    channel: str,
+    payload: dict[str, Any],
+) -> None:
+    """NOTIFY в транзакции сессии; доставляется подписчикам при commit."""
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    message = json.dumps(
+        {**payload, "o": PROCESS_ID},
+        separators=(",", ":"),
+    )
+    await session.execute(select(func.pg_notify(channel, message)))
+
+
+def job_event_payload(event: JobEvent) -> dict[str, Any]:
+    """Компактное представление события задачи."""
+    return {
+        "j": str(event.job_id),
+        "u": str(event.user_id),
+        "s": event.status.value,
+        "t": event.event_id,
+    }
+
+
+def job_event_from_payload(data: dict[str, Any]) -> JobEvent:
+    """Событие задачи из уведомления другого процесса."""
+    return JobEvent(
+        job_id=UUID(data["j"]),
+        user_id=UUID(data["u"]),
+        status=GenerationStatus(data["s"]),
+        updated_at=datetime.fromtimestamp(
+            data["t"] / 1_000_000, tz=timezone.utc
+        ),
+        partial=True,
+    )
+
+
+async def notify_balance_changed(
+    session: AsyncSession,
+    user_ids: list[UUID],
+) -> None:
+    """Сообщить другим процессам об изменении балансов (или ключей)."""
+    for start in range(0, len(user_ids), MAX_USER_IDS_PER_NOTIFY):
+        chunk = user_ids[start : start + MAX_USER_IDS_PER_NOTIFY]
+        await notify(
+            session,
+            BALANCE_EVENTS_CHANNEL,
+            {"u": [str(user_id) for user_id in chunk]},
+        )
+
+
+def make_job_event_handler(
+    bus: JobEventBus = job_events,
+) -> NotificationHandler:
+    """Обработчик уведомлений о задачах: в локальную шину."""
+
+    def handle(data: dict[str, Any]) -> None:
+        bus.publish(job_event_from_payload(data))
+
+    return handle
+
+
+def make_balance_event_handler(
+    cache: UserCache = users_cache,
+) -> NotificationHandler:
+    """Обработчик уведомлений о балансах: сбросить записи кэша."""
+
+    def handle(data: dict[str, Any]) -> None:
+        cache.invalidate(UUID(user_id) for user_id in data["u"])
+
+    return handle
+
+
+class PgNotificationListener:
+    """Одно выделенное LISTEN-соединение на процесс."""
+
+    def __init__(
+        self,
+        database_url: str,
+        reconnect_delay_seconds: float = 1.0,
+        max_reconnect_delay_seconds: float = 30.0,
+    ):
+        self._dsn = database_url.replace(
+            "postgresql+asyncpg://", "postgresql://"
+        )
+        self._reconnect_delay = reconnect_delay_seconds
+        self._max_reconnect_delay = max_reconnect_delay_seconds
+        self._handlers: dict[str, list[NotificationHandler]] = {}
+        self._reset_handlers: list[Callable[[], None]] = []
+        self._task: asyncio.Task[None] | None = None
+
+    def add_handler(self, channel: str, handler: NotificationHandler) -> None:
+        """Подписать обработчик на канал."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def add_reset_handler(self, handler: Callable[[], None]) -> None:
+        """Вызвать при переподключении: уведомления могли потеряться."""
+        self._reset_handlers.append(handler)
+
+    async def start(self) -> None:
+        """Запустить фоновое прослушивание."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить прослушивание."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def dispatch(self, channel: str, raw: str) -> None:
+        """Разобрать уведомление и передать локальным обработчикам."""
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            logger.warning("notification_invalid", extra={"channel": channel})
+            return
+        if data.get("o") == PROCESS_ID:
+            return
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(data)
+            except Exception:
+                logger.exception(
+                    "notification_handler_failed", extra={"channel": channel}
+                )
+
+    def _on_notification(
+        self,
+        connection: Any,
+        pid: int,
+        channel: str,
+        payload: str,
+    ) -> None:
+        self.dispatch(channel, payload)
+
+    async def _run(self) -> None:
+        delay = self._reconnect_delay
+        connected_before = False
+        while True:
+            lost = asyncio.Event()
+            connection = None
+            try:
+                connection = await asyncpg.connect(self._dsn)
+                connection.add_termination_listener(lambda _: lost.set())
+                for channel in self._handlers:
+                    await connection.add_listener(
+                        channel, self._on_notification
+                    )
+                if connected_before:
+                    self._reset()
+                connected_before = True
+                delay = self._reconnect_delay
+                logger.info(
+                    "notification_listener_connected",
+                    extra={"channels": list(self._handlers)},
+                )
+                await lost.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(
+                    "notification_listener_failed", extra={"error": str(exc)}
+                )
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await _close_quietly(connection.close())
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_reconnect_delay)
+
+    def _reset(self) -> None:
+        for handler in self._reset_handlers:
+            handler()
+
+
+async def _close_quietly(closing: Awaitable[None]) -> None:
+    try:
+        await closing
+    except Exception:
+        logger.debug("notification_listener_close_failed", exc_info=True)
@@ -0,0 +1,193 @@
+import json
+import random
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Mapping
+
+from app.domain.entities import GenerationKind
+from app.infrastructure.settings import get_settings
+
+DEFAULT_MODEL_REGISTRY: dict[GenerationKind, list[tuple[str, float]]] = {
+    GenerationKind.TEXT_TO_IMAGE: [
+        ("fal-ai/wan-25-preview/text-to-image", 1.0)
+    ],
+    GenerationKind.IMAGE_TO_IMAGE: [
+        ("fal-ai/wan-25-preview/image-to-image", 1.0)
+    ],
+    GenerationKind.TEXT_TO_VIDEO: [
+        ("fal-ai/wan-25-preview/text-to-video", 1.0)
+    ],
+    GenerationKind.IMAGE_TO_VIDEO: [
+        ("fal-ai/wan-25-preview/image-to-video", 1.0)
+    ],
+}
+# Доля выборов, отдаваемая деградировавшим моделям: без редких проб их
+# статистика не обновится и модель не вернётся в ротацию.
+PROBE_RATE = 0.02
+
+
+@dataclass(frozen=True, slots=True)
+class ModelChoice:
+    """Модель fal, взаимозаменяемая с другими для своего типа задачи."""
+
+    model_id: str
+    weight: float
+
+
+@dataclass(slots=True)
+class ModelHealth:
+    """EWMA задержки и доли ошибок модели по последним завершениям."""
+
+    latency_seconds: float | None = None
+    error_rate: float = 0.0
+    samples: int = 0
+
+
+def parse_model_registry(
+    raw: str | None,
+) -> dict[GenerationKind, list[ModelChoice]]:
+    """Реестр из JSON вида {"TEXT_TO_IMAGE": [{"model_id", "weight"}]}.
+
+    Не указанные типы берутся из DEFAULT_MODEL_REGISTRY.
+    """
+    registry = {
+        kind: [ModelChoice(model_id, weight) for model_id, weight in models]
+        for kind, models in DEFAULT_MODEL_REGISTRY.items()
+    }
+    if not raw or not raw.strip():
+        return registry
+    try:
+        data: dict[str, Any] = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise RuntimeError("MODEL_REGISTRY_JSON must be valid JSON") from exc
+    if not isinstance(data, dict):
+        raise RuntimeError("MODEL_REGISTRY_JSON must be a JSON object")
+    for kind_name, models in data.items():
+        try:
+            kind = GenerationKind(kind_name)
+        except ValueError as exc:
+            raise RuntimeError(
+                f"MODEL_REGISTRY_JSON: unknown kind {kind_name}"
+            ) from exc
+        choices = [
+            ModelChoice(str(item["model_id"]), float(item.get("weight", 1)))
+            for item in models
+        ]
+        if not choices or any(choice.weight <= 0 for choice in choices):
+            raise RuntimeError(
+                f"MODEL_REGISTRY_JSON: {kind_name} needs positive weights"
+            )
+        registry[kind] = choices
+    return registry
+
+
+class ModelRouter:
+    """Выбор модели для задачи по весам и живой статистике.
+
+    Вес модели делится на её EWMA-задержку относительно лучшей, так что
+    медленная модель получает меньше задач. Модель с долей ошибок выше
+    max_error_rate исключается из ротации (кроме редких проб); если
+    деградировали все, берётся модель с наименьшей долей ошибок.
+    """
+
+    def __init__(
+        self,
+        registry: Mapping[GenerationKind, list[ModelChoice]],
+        alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        min_samples: int = 5,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.registry = dict(registry)
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.rng = rng or random.Random()
+        self._health: dict[str, ModelHealth] = {}
+
+    def health(self, model_id: str) -> ModelHealth:
+        """Статистика модели."""
+        health = self._health.get(model_id)
+        if health is None:
+            health = self._health[model_id] = ModelHealth()
+        return health
+
+    def is_healthy(self, model_id: str) -> bool:
+        """Модель в ротации: мало данных или доля ошибок в норме."""
+        health = self.health(model_id)
+        return (
+            health.samples < self.min_samples
+            or health.error_rate <= self.max_error_rate
+        )
+
+    def choose(self, kind: GenerationKind) -> str:
+        """ID модели для новой задачи типа kind."""
+        choices = self.registry[kind]
+        if len(choices) == 1:
+            return choices[0].model_id
+        healthy = [c for c in choices if self.is_healthy(c.model_id)]
+        degraded = [c for c in choices if c not in healthy]
+        if not healthy:
+            return min(
+                choices, key=lambda c: self.health(c.model_id).error_rate
+            ).model_id
+        if degraded and self.rng.random() < PROBE_RATE:
+            return self.rng.choice(degraded).model_id
+
+        latencies = [self.health(c.model_id).latency_seconds for c in healthy]
+        known = [latency for latency in latencies if latency is not None]
+        # Модель без измерений считается не хуже лучшей: так она получит
+        # задачи и статистику.
+        best = min(known) if known else 1.0
+        weights = [
+            choice.weight * best / max(latency or best, 1e-6)
+            for choice, latency in zip(healthy, latencies)
+        ]
+        return self.rng.choices(healthy, weights)[0].model_id
+
+    def record_completion(
+        self,
+        model_id: str,
+        latency_seconds: float | None,
+        ok: bool,
+    ) -> None:
+        """Учесть завершение задачи модели (успех или ошибку)."""
+        health = self.health(model_id)
+        health.samples += 1
+        alpha = self.alpha if health.samples > 1 else 1.0
+        health.error_rate += alpha * ((0.0 if ok else 1.0) - health.error_rate)
+        if ok and latency_seconds is not None:
+            if health.latency_seconds is None:
+                health.latency_seconds = latency_seconds
+            else:
+                health.latency_seconds += self.alpha * (
+                    latency_seconds - health.latency_seconds
+                )
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Статистика и доступность моделей реестра."""
+        snapshot = {}
+        for kind, choices in self.registry.items():
+            for choice in choices:
+                health = self.health(choice.model_id)
+                snapshot[choice.model_id] = {
+                    "kind": kind.value,
+                    "weight": choice.weight,
+                    "latency_seconds": health.latency_seconds,
+                    "error_rate": health.error_rate,
+                    "samples": health.samples,
+                    "healthy": self.is_healthy(choice.model_id),
+                }
+        return snapshot
+
+
+@lru_cache()
+def get_model_router() -> ModelRouter:
+    """Маршрутизатор моделей процесса."""
+    settings = get_settings()
+    return ModelRouter(
+        parse_model_registry(settings.model_registry_json),
+        alpha=settings.model_routing_ewma_alpha,
+        max_error_rate=settings.model_routing_max_error_rate,
+        min_samples=settings.model_routing_min_samples,
+    )
@@ -0,0 +1,57 @@
+from collections import deque
+
+
+class ModelLatencyStats:
+    """Наблюдаемое время ожидания в очереди fal по моделям.
+
+    Для каждой модели хранится окно последних измерений; квантили
+    считаются по нему, поэтому порог следует за текущей нагрузкой fal.
+    """
+
+    def __init__(self, window: int = 500) -> None:
+        self.window = window
+        self._queue_seconds: dict[str, deque[float]] = {}
+
+    def record_queue_time(self, model_id: str, seconds: float) -> None:
+        """Учесть время от отправки до начала выполнения."""
+        samples = self._queue_seconds.get(model_id)
+        if samples is None:
+            samples = self._queue_seconds[model_id] = deque(maxlen=self.window)
+        samples.append(max(0.0, seconds))
+
+    def samples(self, model_id: str) -> int:
+        """Число измерений в окне модели."""
+        return len(self._queue_seconds.get(model_id, ()))
+
+    def queue_quantile(self, model_id: str, quantile: float) -> float | None:
+        """Квантиль времени в очереди; None без измерений."""
+        samples = sorted(self._queue_seconds.get(model_id, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(quantile * len(samples)))
+        return samples[index]
+
+    def expected_remaining(
+        self,
+        model_id: str,
+        elapsed: float,
+    ) -> float | None:
+        """Среднее оставшееся ожидание для запроса, ждущего elapsed секунд.
+
+        Считается по измерениям длиннее elapsed; None, если таких нет.
+        """
+        longer = [
+            seconds
+            for seconds in self._queue_seconds.get(model_id, ())
+            if seconds > elapsed
+        ]
+        if not longer:
+            return None
+        return sum(longer) / len(longer) - elapsed
+
+    def clear(self) -> None:
+        """Забыть все измерения."""
+        self._queue_seconds.clear()
+
+
+model_stats = ModelLatencyStats()
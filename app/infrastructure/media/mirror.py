@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import logging
+import resource
+import sys
+import time
+from base64 import b64decode
+from functools import lru_cache
+from typing import Any, AsyncIterator
+from uuid import UUID
+
+import httpx
+
+from app.application.interfaces.blob_store import BlobStore
+from app.infrastructure.settings import get_settings
+from app.infrastructure.storage.blobs import get_blob_store
+
+logger = logging.getLogger(__name__)
+
+# ru_maxrss: КиБ в Linux, байты в macOS.
+RSS_UNIT_BYTES = 1 if sys.platform == "darwin" else 1024
+
+
+class MirrorError(Exception):
+    """Файл не удалось скачать или проверить."""
+
+
+def iter_media_items(result: Any) -> list[dict[str, Any]]:
+    """Объекты с полем url в порядке обхода result_json."""
+    items: list[dict[str, Any]] = []
+
+    def walk(node: Any) -> None:
+        if isinstance(node, dict):
+            if isinstance(node.get("url"), str):
+                items.append(node)
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(result)
+    return items
+
+
+class MirrorStats:
+    """Счётчики зеркалирования: объём, пропускная способность, память."""
+
+    def __init__(self) -> None:
+        self.files = 0
+        self.bytes = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @property
+    def throughput_bytes_per_second(self) -> float:
+        """Средняя скорость скачивания одного файла."""
+        return self.bytes / self.busy_seconds if self.busy_seconds else 0.0
+
+    @staticmethod
+    def peak_rss_bytes() -> int:
+        """Пиковый RSS процесса."""
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_maxrss * RSS_UNIT_BYTES
+
+    def snapshot(self) -> dict[str, float]:
+        """Текущие значения счётчиков."""
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "failures": self.failures,
+            "throughput_bytes_per_second": self.throughput_bytes_per_second,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_rss_bytes": self.peak_rss_bytes(),
+        }
+
+
+class MediaMirror:
+    """Копирование медиа результата в своё хранилище потоком."""
+
+    def __init__(
+        self,
+        store: BlobStore,
+        max_concurrency: int,
+        per_job_concurrency: int,
+        max_file_bytes: int,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.store = store
+        self.per_job_concurrency = per_job_concurrency
+        self.max_file_bytes = max_file_bytes
+        self.stats = MirrorStats()
+        self._global = asyncio.Semaphore(max_concurrency)
+        # Отдельный клиент: ключ fal не должен уходить на CDN.
+        self._client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=5.0, read=30.0, write=5.0, pool=60.0
+            ),
+            follow_redirects=True,
+        )
+
+    async def mirror_result(
+        self,
+        job_id: UUID,
+        result: dict[str, Any],
+    ) -> dict[str, Any]:
+        """Скопировать медиа; у скопированных объектов появляется blob.
+
+        Исходный url сохраняется: наружу отдаётся ссылка на нашу копию,
+        а файл, который не удалось скопировать, остаётся со ссылкой fal.
+        """
+        per_job = asyncio.Semaphore(self.per_job_concurrency)
+        mirrored = _deep_copy(result)
+        items = iter_media_items(mirrored)
+
+        async def mirror_item(item: dict[str, Any]) -> None:
+            source_url = item["url"]
+            if not source_url.startswith(("http://", "https://")):
+                return
+            async with per_job, self._global:
+                try:
+                    ref, digest = await self._download(
+                        source_url, item.get("content_type")
+                    )
+                except Exception as exc:
+                    self.stats.failures += 1
+                    logger.warning(
+                        "media_mirror_failed",
+                        extra={"job_id": str(job_id), "error": str(exc)},
+                    )
+                    return
+            item["blob"] = ref
+            item["sha256"] = digest
+
+        await asyncio.gather(*(mirror_item(item) for item in items))
+        return mirrored
+
+    async def aclose(self) -> None:
+        """Закрыть HTTP-клиент."""
+        await self._client.aclose()
+
+    async def _download(
+        self,
+        url: str,
+        content_type: str | None,
+    ) -> tuple[str, str]:
+        started = time.perf_counter()
+        self.stats.in_flight += 1
+        self.stats.peak_in_flight = max(
+            self.stats.peak_in_flight, self.stats.in_flight
+        )
+        try:
+            async with self._client.stream("GET", url) as response:
+                response.raise_for_status()
+                expected_size = response.headers.get("content-length")
+                if response.headers.get("content-encoding"):
+                    # Длина сжатого тела не равна длине содержимого.
+                    expected_size = None
+                if (
+                    expected_size
+                    and expected_size.isdigit()
+                    and int(expected_size) > self.max_file_bytes
+                ):
+                    raise MirrorError("media file too large")
+                md5 = hashlib.md5(usedforsecurity=False)
+                # Проверка до переноса в хранилище: неверный файл не
+                # остаётся в нём и не подменяет будущие копии.
+                ref, size = await self.store.put_stream(
+                    _hashed(response.aiter_bytes(), md5),
+                    content_type or response.headers.get("content-type", ""),
+                    self.max_file_bytes,
+                    verify=lambda size: _verify(
+                        response.headers, expected_size, size, md5
+                    ),
+                )
+        finally:
+            self.stats.in_flight -= 1
+            self.stats.busy_seconds += time.perf_counter() - started
+        self.stats.files += 1
+        self.stats.bytes += size
+        return ref, ref.rsplit(",", 1)[1]
+
+
+async def _hashed(
+    chunks: AsyncIterator[bytes],
+    md5: Any,
+) -> AsyncIterator[bytes]:
+    async for chunk in chunks:
+        md5.update(chunk)
+        yield chunk
+
+
+def _verify(
+    headers: httpx.Headers,
+    expected_size: str | None,
+    size: int,
+    md5: Any,
+) -> None:
+    """Сверить размер и Content-MD5 (если источник их сообщил)."""
+    if expected_size and expected_size.isdigit():
+        if int(expected_size) != size:
+            raise MirrorError("size mismatch")
+    content_md5 = headers.get("content-md5")
+    if content_md5 and b64decode(content_md5) != md5.digest():
+        raise MirrorError("checksum mismatch")
+
+
+def _deep_copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _deep_copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_deep_copy(item) for item in value]
+    return value
+
+
+@lru_cache()
+def get_media_mirror() -> MediaMirror | None:
+    """Зеркалирование процесса; None, если выключено."""
+    settings = get_settings()
+    if not settings.media_mirror_enabled:
+        return None
+    return MediaMirror(
+        get_blob_store(),
+        settings.media_mirror_concurrency,
+        settings.media_mirror_per_job_concurrency,
+        settings.media_mirror_max_file_bytes,
+    )
@@ -0,0 +1,191 @@
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable
+from uuid import UUID
+
+from app.domain.entities import GenerationKind
+from app.infrastructure.media.mirror import iter_media_items
+from app.infrastructure.settings import get_settings
+from app.infrastructure.storage.blobs import (
+    LocalBlobStore,
+    get_blob_store,
+    parse_blob_ref,
+)
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_KINDS = frozenset(
+    {GenerationKind.TEXT_TO_IMAGE, GenerationKind.IMAGE_TO_IMAGE}
+)
+THUMBNAIL_MEDIA_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+Rendered = tuple[bytes, int, int, float]
+
+
+def render_thumbnail(
+    source: str,
+    max_side: int,
+    image_format: str,
+    quality: int,
+) -> Rendered:
+    """Уменьшенная копия изображения (выполняется в дочернем процессе)."""
+    from PIL import Image
+
+    started = time.perf_counter()
+    with Image.open(source) as image:
+        # draft: JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft("RGB", (max_side, max_side))
+        image.thumbnail((max_side, max_side))
+        if image.mode not in ("RGB", "RGBA") or image_format == "JPEG":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality)
+        width, height = image.size
+    return buffer.getvalue(), width, height, time.perf_counter() - started
+
+
+class ThumbnailStats:
+    """Время построения миниатюр."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.failures = 0
+        self.render_seconds = 0.0
+        self.max_render_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def record(self, render_seconds: float, total_seconds: float) -> None:
+        """Учесть одну миниатюру."""
+        self.count += 1
+        self.render_seconds += render_seconds
+        self.max_render_seconds = max(self.max_render_seconds, render_seconds)
+        # Остаток — ожидание свободного процесса и передача данных.
+        self.wait_seconds += max(0.0, total_seconds - render_seconds)
+
+    def snapshot(self) -> dict[str, float]:
+        """Текущие значения счётчиков."""
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "avg_render_seconds": (
+                self.render_seconds / self.count if self.count else 0.0
+            ),
+            "max_render_seconds": self.max_render_seconds,
+            "avg_wait_seconds": (
+                self.wait_seconds / self.count if self.count else 0.0
+            ),
+        }
+
+
+class ThumbnailGenerator:
+    """Миниатюры изображений результата в пуле процессов."""
+
+    def __init__(
+        self,
+        store: LocalBlobStore,
+        executor: Executor,
+        max_side: int,
+        image_format: str,
+        quality: int,
+        render: Callable[..., Rendered] = render_thumbnail,
+    ):
+        self.store = store
+        self.executor = executor
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+        self.render = render
+        self.stats = ThumbnailStats()
+
+    async def add_thumbnails(
+        self,
+        job_id: UUID,
+        kind: GenerationKind,
+        result: dict[str, Any],
+    ) -> dict[str, Any]:
+        """Добавить thumbnail к скопированным изображениям результата."""
+        if kind not in THUMBNAIL_KINDS:
+            return result
+        items = [
+            item
+            for item in iter_media_items(result)
+            if "blob" in item
+            and parse_blob_ref(item["blob"])[1].startswith("image/")
+        ]
+        await asyncio.gather(*(self._add(job_id, item) for item in items))
+        return result
+
+    def shutdown(self) -> None:
+        """Остановить пул."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _add(self, job_id: UUID, item: dict[str, Any]) -> None:
+        digest, _ = parse_blob_ref(item["blob"])
+        started = time.perf_counter()
+        try:
+            (
+                data,
+                width,
+                height,
+                render_seconds,
+            ) = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                self.render,
+                str(self.store.path_for(digest)),
+                self.max_side,
+                self.image_format,
+                self.quality,
+            )
+            ref, _ = await self.store.put_stream(
+                _single_chunk(data),
+                THUMBNAIL_MEDIA_TYPES[self.image_format],
+                len(data),
+            )
+        except Exception as exc:
+            self.stats.failures += 1
+            logger.warning(
+                "thumbnail_failed",
+                extra={"job_id": str(job_id), "error": str(exc)},
+            )
+            return
+        self.stats.record(render_seconds, time.perf_counter() - started)
+        item["thumbnail"] = {"blob": ref, "width": width, "height": height}
+
+
+async def _single_chunk(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+def pillow_available() -> bool:
+    """Установлен ли Pillow (необязательная зависимость)."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@lru_cache()
+def get_thumbnail_generator() -> ThumbnailGenerator | None:
+    """Генератор миниатюр процесса; None, если выключен."""
+    settings = get_settings()
+    if not settings.thumbnails_enabled:
+        return None
+    if not settings.media_mirror_enabled:
+        # Источник — локальная копия изображения.
+        logger.warning("thumbnails_disabled_mirror_off")
+        return None
+    if not pillow_available():
+        logger.warning("thumbnails_disabled_pillow_missing")
+        return None
+    return ThumbnailGenerator(
+        get_blob_store(),
+        ProcessPoolExecutor(max_workers=settings.thumbnail_pool_size),
+        settings.thumbnail_max_side,
+        settings.thumbnail_format,
+        settings.thumbnail_quality,
+    )
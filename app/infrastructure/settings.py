@@ -1,7 +1,7 @@
 import json
 import os
 from functools import lru_cache
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import (
     BaseModel,
@@ -28,6 +28,92 @@ class Settings(BaseModel):
     fal_key: str = Field(alias="FAL_KEY")
     payment_webhook_secret: str = Field(alias="PAYMENT_WEBHOOK_SECRET")
     token_prices_json: str = Field(alias="TOKEN_PRICES_JSON")
+    terminal_job_cache_bytes: int = Field(
+        64 * 1024 * 1024, alias="TERMINAL_JOB_CACHE_BYTES", ge=0
+    )
+    user_cache_ttl_seconds: float = Field(
+        5.0, alias="USER_CACHE_TTL_SECONDS", ge=0
+    )
+    user_cache_max_entries: int = Field(
+        10_000, alias="USER_CACHE_MAX_ENTRIES", ge=0
+    )
+    result_cache_enabled: bool = Field(False, alias="RESULT_CACHE_ENABLED")
+    result_cache_price: int = Field(0, alias="RESULT_CACHE_PRICE", ge=0)
+    result_cache_ttl_seconds: int = Field(
+        24 * 60 * 60, alias="RESULT_CACHE_TTL_SECONDS", gt=0
+    )
+    result_cache_max_entries: int = Field(
+        100_000, alias="RESULT_CACHE_MAX_ENTRIES", gt=0
+    )
+    blob_store_dir: str = Field("var/blobs", alias="BLOB_STORE_DIR")
+    asset_max_bytes: int = Field(
+        20 * 1024 * 1024, alias="ASSET_MAX_BYTES", gt=0
+    )
+    media_mirror_enabled: bool = Field(False, alias="MEDIA_MIRROR_ENABLED")
+    media_mirror_concurrency: int = Field(
+        8, alias="MEDIA_MIRROR_CONCURRENCY", gt=0
+    )
+    media_mirror_per_job_concurrency: int = Field(
+        2, alias="MEDIA_MIRROR_PER_JOB_CONCURRENCY", gt=0
+    )
+    media_mirror_max_file_bytes: int = Field(
+        512 * 1024 * 1024, alias="MEDIA_MIRROR_MAX_FILE_BYTES", gt=0
+    )
+    thumbnails_enabled: bool = Field(False, alias="THUMBNAILS_ENABLED")
+    thumbnail_pool_size: int = Field(2, alias="THUMBNAIL_POOL_SIZE", gt=0)
+    thumbnail_max_side: int = Field(320, alias="THUMBNAIL_MAX_SIDE", gt=0)
+    thumbnail_format: Literal["WEBP", "JPEG"] = Field(
+        "WEBP", alias="THUMBNAIL_FORMAT"
+    )
+    thumbnail_quality: int = Field(80, alias="THUMBNAIL_QUALITY", ge=1, le=100)
+    fanout_enabled: bool = Field(False, alias="FANOUT_ENABLED")
+    hedging_enabled: bool = Field(False, alias="HEDGING_ENABLED")
+    hedge_quantile: float = Field(0.95, alias="HEDGE_QUANTILE", gt=0, lt=1)
+    hedge_min_samples: int = Field(20, alias="HEDGE_MIN_SAMPLES", ge=1)
+    hedge_min_queue_seconds: float = Field(
+        10.0, alias="HEDGE_MIN_QUEUE_SECONDS", ge=0
+    )
+    hedge_budget_tokens: int = Field(500, alias="HEDGE_BUDGET_TOKENS", ge=0)
+    hedge_budget_window_seconds: float = Field(
+        3600.0, alias="HEDGE_BUDGET_WINDOW_SECONDS", gt=0
+    )
+    hedge_alternate_models_json: str = Field(
+        "{}", alias="HEDGE_ALTERNATE_MODELS_JSON"
+    )
+    model_registry_json: str | None = Field(None, alias="MODEL_REGISTRY_JSON")
+    model_routing_ewma_alpha: float = Field(
+        0.2, alias="MODEL_ROUTING_EWMA_ALPHA", gt=0, le=1
+    )
+    model_routing_max_error_rate: float = Field(
+        0.5, alias="MODEL_ROUTING_MAX_ERROR_RATE", ge=0, le=1
+    )
+    model_routing_min_samples: int = Field(
+        5, alias="MODEL_ROUTING_MIN_SAMPLES", ge=1
+    )
+    model_concurrency_limits_json: str = Field(
+        "{}", alias="MODEL_CONCURRENCY_LIMITS_JSON"
+    )
+    model_concurrency_default: int = Field(
+        0, alias="MODEL_CONCURRENCY_DEFAULT", ge=0
+    )
+    submission_concurrency: int = Field(
+        0, alias="SUBMISSION_CONCURRENCY", ge=0
+    )
+    scheduler_quantum_tokens: int = Field(
+        10, alias="SCHEDULER_QUANTUM_TOKENS", ge=1
+    )
+    scheduler_image_lane_weight: int = Field(
+        3, alias="SCHEDULER_IMAGE_LANE_WEIGHT", ge=1
+    )
+    scheduler_video_lane_weight: int = Field(
+        1, alias="SCHEDULER_VIDEO_LANE_WEIGHT", ge=1
+    )
+    scheduler_tier_weights_json: str = Field(
+        '{"default": 1}', alias="SCHEDULER_TIER_WEIGHTS_JSON"
+    )
+    scheduler_user_tiers_json: str = Field(
+        "{}", alias="SCHEDULER_USER_TIERS_JSON"
+    )
 
     @field_validator(
         "database_url",
@@ -51,6 +137,68 @@ class Settings(BaseModel):
             "FAL_KEY": os.getenv("FAL_KEY"),
             "PAYMENT_WEBHOOK_SECRET": os.getenv("PAYMENT_WEBHOOK_SECRET"),
             "TOKEN_PRICES_JSON": os.getenv("TOKEN_PRICES_JSON"),
+            "TERMINAL_JOB_CACHE_BYTES": os.getenv("TERMINAL_JOB_CACHE_BYTES"),
+            "USER_CACHE_TTL_SECONDS": os.getenv("USER_CACHE_TTL_SECONDS"),
+            "USER_CACHE_MAX_ENTRIES": os.getenv("USER_CACHE_MAX_ENTRIES"),
+            "RESULT_CACHE_ENABLED": os.getenv("RESULT_CACHE_ENABLED"),
+            "RESULT_CACHE_PRICE": os.getenv("RESULT_CACHE_PRICE"),
+            "RESULT_CACHE_TTL_SECONDS": os.getenv("RESULT_CACHE_TTL_SECONDS"),
+            "RESULT_CACHE_MAX_ENTRIES": os.getenv("RESULT_CACHE_MAX_ENTRIES"),
+            "BLOB_STORE_DIR": os.getenv("BLOB_STORE_DIR"),
+            "ASSET_MAX_BYTES": os.getenv("ASSET_MAX_BYTES"),
+            "MEDIA_MIRROR_ENABLED": os.getenv("MEDIA_MIRROR_ENABLED"),
+            "MEDIA_MIRROR_CONCURRENCY": os.getenv("MEDIA_MIRROR_CONCURRENCY"),
+            "MEDIA_MIRROR_PER_JOB_CONCURRENCY": os.getenv(
+                "MEDIA_MIRROR_PER_JOB_CONCURRENCY"
+            ),
+            "MEDIA_MIRROR_MAX_FILE_BYTES": os.getenv(
+                "MEDIA_MIRROR_MAX_FILE_BYTES"
+            ),
+            "THUMBNAILS_ENABLED": os.getenv("THUMBNAILS_ENABLED"),
+            "THUMBNAIL_POOL_SIZE": os.getenv("THUMBNAIL_POOL_SIZE"),
+            "THUMBNAIL_MAX_SIDE": os.getenv("THUMBNAIL_MAX_SIDE"),
+            "THUMBNAIL_FORMAT": os.getenv("THUMBNAIL_FORMAT"),
+            "THUMBNAIL_QUALITY": os.getenv("THUMBNAIL_QUALITY"),
+            "FANOUT_ENABLED": os.getenv("FANOUT_ENABLED"),
+            "HEDGING_ENABLED": os.getenv("HEDGING_ENABLED"),
+            "HEDGE_QUANTILE": os.getenv("HEDGE_QUANTILE"),
+            "HEDGE_MIN_SAMPLES": os.getenv("HEDGE_MIN_SAMPLES"),
+            "HEDGE_MIN_QUEUE_SECONDS": os.getenv("HEDGE_MIN_QUEUE_SECONDS"),
+            "HEDGE_BUDGET_TOKENS": os.getenv("HEDGE_BUDGET_TOKENS"),
+            "HEDGE_BUDGET_WINDOW_SECONDS": os.getenv(
+                "HEDGE_BUDGET_WINDOW_SECONDS"
+            ),
+            "HEDGE_ALTERNATE_MODELS_JSON": os.getenv(
+                "HEDGE_ALTERNATE_MODELS_JSON"
+            ),
+            "MODEL_REGISTRY_JSON": os.getenv("MODEL_REGISTRY_JSON"),
+            "MODEL_ROUTING_EWMA_ALPHA": os.getenv("MODEL_ROUTING_EWMA_ALPHA"),
+            "MODEL_ROUTING_MAX_ERROR_RATE": os.getenv(
+                "MODEL_ROUTING_MAX_ERROR_RATE"
+            ),
+            "MODEL_ROUTING_MIN_SAMPLES": os.getenv(
+                "MODEL_ROUTING_MIN_SAMPLES"
+            ),
+            "MODEL_CONCURRENCY_LIMITS_JSON": os.getenv(
+                "MODEL_CONCURRENCY_LIMITS_JSON"
+            ),
+            "MODEL_CONCURRENCY_DEFAULT": os.getenv(
+                "MODEL_CONCURRENCY_DEFAULT"
+            ),
+            "SUBMISSION_CONCURRENCY": os.getenv("SUBMISSION_CONCURRENCY"),
+            "SCHEDULER_QUANTUM_TOKENS": os.getenv("SCHEDULER_QUANTUM_TOKENS"),
+            "SCHEDULER_IMAGE_LANE_WEIGHT": os.getenv(
+                "SCHEDULER_IMAGE_LANE_WEIGHT"
+            ),
+            "SCHEDULER_VIDEO_LANE_WEIGHT": os.getenv(
+                "SCHEDULER_VIDEO_LANE_WEIGHT"
+            ),
+            "SCHEDULER_TIER_WEIGHTS_JSON": os.getenv(
+                "SCHEDULER_TIER_WEIGHTS_JSON"
+            ),
+            "SCHEDULER_USER_TIERS_JSON": os.getenv(
+                "SCHEDULER_USER_TIERS_JSON"
+            ),
         }
         cleaned = {k: v for k, v in raw.items() if v is not None}
         return cls.model_validate(cleaned)
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from base64 import b64decode
+from binascii import Error as BinasciiError
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Callable
+from urllib.parse import unquote_to_bytes
+
+from app.application.interfaces.blob_store import (
+    BLOB_REF_PREFIX,
+    BLOB_REF_RE,
+    BlobNotFound,
+    BlobStore,
+    BlobTooLarge,
+    InvalidDataUri,
+)
+from app.infrastructure.settings import get_settings
+
+DEFAULT_MEDIA_TYPE = "application/octet-stream"
+# Куски запроса мелкие (~64 КиБ): пишем на диск пачками.
+WRITE_BUFFER_BYTES = 1024 * 1024
+MEDIA_TYPE_RE = re.compile(r"^[\w.+-]+/[\w.+-]+$")
+
+
+def blob_ref(digest: str, media_type: str) -> str:
+    """Ссылка на содержимое."""
+    return f"{BLOB_REF_PREFIX}{media_type};sha256,{digest}"
+
+
+def parse_blob_ref(ref: str) -> tuple[str, str]:
+    """(sha256, MIME-тип) из ссылки; BlobNotFound при неверном формате."""
+    match = BLOB_REF_RE.match(ref)
+    if match is None:
+        raise BlobNotFound(ref)
+    return match["digest"], match["media_type"]
+
+
+def normalize_media_type(value: str | None) -> str:
+    """MIME-тип без параметров или application/octet-stream."""
+    media_type = (value or "").split(";")[0].strip().lower()
+    if MEDIA_TYPE_RE.match(media_type):
+        return media_type
+    return DEFAULT_MEDIA_TYPE
+
+
+def decode_data_uri(uri: str) -> tuple[bytes, str]:
+    """Содержимое и нормализованный MIME-тип data: URI."""
+    header, comma, data = uri.partition(",")
+    if not header.startswith("data:") or not comma:
+        raise InvalidDataUri("malformed data uri")
+    params = header[len("data:") :].split(";")
+    # Как и у put_stream: без параметров и в нижнем регистре, иначе
+    # ссылка blob: не разберётся.
+    media_type = params[0].strip().lower() or DEFAULT_MEDIA_TYPE
+    if not MEDIA_TYPE_RE.match(media_type):
+        raise InvalidDataUri(f"invalid media type {params[0]!r}")
+    try:
+        if params[-1] == "base64":
+            return b64decode(data, validate=True), media_type
+        return unquote_to_bytes(data), media_type
+    except (BinasciiError, ValueError) as exc:
+        raise InvalidDataUri("invalid base64 payload") from exc
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalBlobStore(BlobStore):
+    """Содержимое в файлах <root>/ab/cd/<sha256>; одинаковое хранится раз."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.stored = 0
+        self.deduplicated = 0
+
+    def path_for(self, digest: str) -> Path:
+        """Путь к файлу содержимого."""
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def hash_data_uri(self, uri: str) -> tuple[str, bytes]:
+        """Ссылка blob: и содержимое data: URI без записи."""
+        data, media_type = await asyncio.to_thread(decode_data_uri, uri)
+        digest = await asyncio.to_thread(_sha256, data)
+        return blob_ref(digest, media_type), data
+
+    async def put_bytes(self, ref: str, data: bytes) -> None:
+        """Записать содержимое по ссылке из hash_data_uri."""
+        digest, _ = parse_blob_ref(ref)
+        await asyncio.to_thread(self._write, digest, data)
+
+    async def put_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        media_type: str,
+        max_bytes: int,
+        verify: Callable[[int], None] | None = None,
+    ) -> tuple[str, int]:
+        """Записать поток во временный файл, считая хэш по ходу чтения.
+
+        В хранилище файл переносится только после проверки verify.
+        """
+        tmp = await asyncio.to_thread(self._temp_file)
+        tmp_path = Path(tmp.name)
+        hasher = hashlib.sha256()
+        size = 0
+        pending = bytearray()
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise BlobTooLarge(max_bytes)
+                hasher.update(chunk)
+                pending += chunk
+                if len(pending) >= WRITE_BUFFER_BYTES:
+                    await asyncio.to_thread(tmp.write, bytes(pending))
+                    pending.clear()
+            if pending:
+                await asyncio.to_thread(tmp.write, bytes(pending))
+            await asyncio.to_thread(tmp.close)
+            if verify is not None:
+                verify(size)
+            digest = hasher.hexdigest()
+            await asyncio.to_thread(self._move, tmp_path, digest)
+        except BaseException:
+            tmp.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return blob_ref(digest, normalize_media_type(media_type)), size
+
+    async def exists(self, ref: str) -> bool:
+        """Есть ли содержимое по ссылке."""
+        try:
+            digest, _ = parse_blob_ref(ref)
+        except BlobNotFound:
+            return False
+        return await asyncio.to_thread(self.path_for(digest).is_file)
+
+    async def get(self, ref: str) -> tuple[bytes, str]:
+        """Содержимое и MIME-тип по ссылке blob:."""
+        digest, media_type = parse_blob_ref(ref)
+        try:
+            data = await asyncio.to_thread(self.path_for(digest).read_bytes)
+        except FileNotFoundError as exc:
+            raise BlobNotFound(ref) from exc
+        return data, media_type
+
+    def _write(self, digest: str, data: bytes) -> None:
+        path = self.path_for(digest)
+        if path.exists():
+            self.deduplicated += 1
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Запись во временный файл и rename: читатель не увидит
+        # недописанное содержимое.
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self.stored += 1
+
+    def _temp_file(self) -> BinaryIO:
+        self.root.mkdir(parents=True, exist_ok=True)
+        return tempfile.NamedTemporaryFile(
+            dir=self.root, prefix=".upload-", delete=False
+        )
+
+    def _move(self, source: Path, digest: str) -> None:
+        path = self.path_for(digest)
+        if path.exists():
+            self.deduplicated += 1
+            source.unlink()
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, path)
+        self.stored += 1
+
+
+@lru_cache()
+def get_blob_store() -> LocalBlobStore:
+    """Хранилище содержимого процесса."""
+    return LocalBlobStore(get_settings().blob_store_dir)
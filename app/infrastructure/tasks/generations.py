@@ -1,24 +1,63 @@
 import asyncio
 import logging
-from typing import Callable
+from typing import Any, Callable, Sequence
 from uuid import UUID
 
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.application.use_cases.generations import GenerationService
-from app.domain.entities import GenerationStatus
+from app.domain.entities import (
+    GenerationJob,
+    GenerationKind,
+    GenerationStatus,
+)
 from app.infrastructure.db.base import AsyncSessionLocal
 from app.infrastructure.db.repositories import (
     SQLAlchemyBalanceTransactionRepository,
     SQLAlchemyGenerationJobRepository,
+    SQLAlchemyGenerationResultRepository,
     SQLAlchemyUserRepository,
 )
 from app.infrastructure.fal.client import HttpFalClient
+from app.infrastructure.fal.routing import get_model_router
+from app.infrastructure.fal.stats import model_stats
+from app.infrastructure.media.mirror import get_media_mirror
+from app.infrastructure.media.thumbnails import get_thumbnail_generator
 from app.infrastructure.settings import get_settings
+from app.infrastructure.storage.blobs import get_blob_store
+from app.infrastructure.tasks.hedging import (
+    HedgeAttempt,
+    HedgePolicy,
+    get_hedge_policy,
+)
+from app.infrastructure.tasks.limits import (
+    get_concurrency_limiter,
+    get_tier_policy,
+    submission_lane,
+)
 
 logger = logging.getLogger(__name__)
 
 POLL_INTERVAL_SECONDS = 2.0
 TOTAL_TIMEOUT_SECONDS = 15 * 60
 
+FANOUT_KINDS = frozenset(
+    {GenerationKind.TEXT_TO_IMAGE, GenerationKind.IMAGE_TO_IMAGE}
+)
+ACTIVE_FAL_STATUSES = frozenset(
+    {
+        GenerationStatus.SUBMITTED,
+        GenerationStatus.IN_QUEUE,
+        GenerationStatus.IN_PROGRESS,
+    }
+)
+STARTED_STATUSES = frozenset(
+    {GenerationStatus.IN_PROGRESS, GenerationStatus.COMPLETED}
+)
+TERMINAL_CHILD_STATUSES = frozenset(
+    {GenerationStatus.COMPLETED, GenerationStatus.FAILED}
+)
+
 
 async def run_generation_job(
     job_id: UUID,
@@ -26,117 +65,232 @@ async def run_generation_job(
     poll_interval_seconds: float = POLL_INTERVAL_SECONDS,
     total_timeout_seconds: float = TOTAL_TIMEOUT_SECONDS,
 ) -> None:
-    """Запустить и отслеживать генерацию."""
-    settings = get_settings()
-    client = fal_client_factory() if fal_client_factory else HttpFalClient()
+    """Запустить и отслеживать генерацию.
 
+    Этап конвейера после завершения сразу передаёт результат следующему
+    и продолжает с ним в той же фоновой задаче.
+    """
+    client = fal_client_factory() if fal_client_factory else HttpFalClient()
+    limiter = get_concurrency_limiter()
+    tiers = get_tier_policy()
     try:
-        async with AsyncSessionLocal() as session:
-            users = SQLAlchemyUserRepository(session)
-            tx_repo = SQLAlchemyBalanceTransactionRepository(session)
-            jobs = SQLAlchemyGenerationJobRepository(session)
-            service = GenerationService(
-                users, jobs, tx_repo, settings.token_prices
+        next_job_id: UUID | None = job_id
+        while next_job_id is not None:
+            queued = await _load_queued(next_job_id)
+            if queued is None:
+                return
+            # Пока нет слота модели, задача остаётся QUEUED; сессия БД
+            # на время ожидания не открыта.
+            async with limiter.slot(
+                queued.model_id,
+                fanout_size(queued),
+                user_id=queued.user_id,
+                lane=submission_lane(queued.kind),
+                cost=queued.cost_tokens,
+                tier_weight=tiers.weight_for(queued.user_id),
+            ):
+                next_job_id = await _run_stage(
+                    next_job_id,
+                    client,
+                    poll_interval_seconds,
+                    total_timeout_seconds,
+                )
+    finally:
+        await client.client.aclose()
+
+
+async def _load_queued(job_id: UUID) -> GenerationJob | None:
+    """Задача, если она ещё ждёт отправки."""
+    async with AsyncSessionLocal() as session:
+        job = await SQLAlchemyGenerationJobRepository(session).get(job_id)
+    if job is None or job.status != GenerationStatus.QUEUED:
+        return None
+    return job
+
+
+async def _run_stage(
+    job_id: UUID,
+    client: HttpFalClient,
+    poll_interval_seconds: float,
+    total_timeout_seconds: float,
+) -> UUID | None:
+    """Отправить задачу и дождаться её; вернуть следующий этап."""
+    settings = get_settings()
+    async with AsyncSessionLocal() as session:
+        users = SQLAlchemyUserRepository(session)
+        tx_repo = SQLAlchemyBalanceTransactionRepository(session)
+        jobs = SQLAlchemyGenerationJobRepository(session)
+        service = GenerationService(
+            users,
+            jobs,
+            tx_repo,
+            settings.token_prices,
+            results=result_repository(session),
+        )
+
+        job = await jobs.get(job_id)
+        if not job:
+            return
+        if job.status != GenerationStatus.QUEUED:
+            return
+        if fanout_size(job) > 1:
+            return await _run_fanout(
+                session,
+                service,
+                job,
+                client,
+                poll_interval_seconds,
+                total_timeout_seconds,
             )
 
-            job = await jobs.get(job_id)
-            if not job:
-                return
-            if job.status != GenerationStatus.QUEUED:
-                return
+        # Роутеру засчитываются только ошибки самого вызова fal: сбои
+        # хранилища, БД и локальной проверки к здоровью модели не относятся.
+        calling_fal = False
+        try:
+            # Ссылки blob: превращаются обратно в data: URI только
+            # на время отправки.
+            payload = await get_blob_store().inline(job.input_json)
+            calling_fal = True
+            response = await client.submit(job.model_id, payload)
+            request_id, status_url, result_url, cancel_url = parse_submission(
+                job.model_id, response
+            )
+            calling_fal = False
 
-            try:
-                response = await client.submit(job.model_id, job.input_json)
-                request_id = response.get("request_id") or response.get("id")
-                status_url = response.get("status_url") or response.get(
-                    "statusUrl"
-                )
-                result_url = response.get("response_url") or response.get(
-                    "responseUrl"
-                )
-                cancel_url = response.get("cancel_url") or response.get(
-                    "cancelUrl"
-                )
-                if not request_id:
-                    raise RuntimeError("fal response missing request id")
-                if not status_url:
-                    status_url = build_status_url(job.model_id, request_id)
-                if not result_url:
-                    result_url = build_result_url(job.model_id, request_id)
-                if not cancel_url:
-                    cancel_url = build_cancel_url(job.model_id, request_id)
-
-                job.fal_request_id = request_id
-                job.status_url = status_url
-                job.response_url = result_url
-                job.cancel_url = cancel_url
-
-                await jobs.update_status(
-                    job.id,
-                    GenerationStatus.SUBMITTED,
-                    fal_request_id=request_id,
-                    status_url=status_url,
-                    response_url=result_url,
-                    cancel_url=cancel_url,
-                )
-                await session.commit()
-            except Exception as exc:
-                await session.rollback()
-                await service.refund_job(job, error_message=str(exc))
-                await session.commit()
-                logger.error(
-                    "generation_submit_failed",
-                    extra={"job_id": str(job.id), "error": str(exc)},
+            job.fal_request_id = request_id
+            job.status_url = status_url
+            job.response_url = result_url
+            job.cancel_url = cancel_url
+
+            await jobs.update_status(
+                job.id,
+                GenerationStatus.SUBMITTED,
+                fal_request_id=request_id,
+                status_url=status_url,
+                response_url=result_url,
+                cancel_url=cancel_url,
+            )
+            await session.commit()
+            submitted_at = asyncio.get_event_loop().time()
+        except Exception as exc:
+            await session.rollback()
+            if calling_fal:
+                get_model_router().record_completion(
+                    job.model_id, None, ok=False
                 )
-                return
+            await service.refund_job(job, error_message=str(exc))
+            await session.commit()
+            logger.error(
+                "generation_submit_failed",
+                extra={"job_id": str(job.id), "error": str(exc)},
+            )
+            return
 
-            deadline = asyncio.get_event_loop().time() + total_timeout_seconds
+        hedging = get_hedge_policy()
+        hedge: HedgeAttempt | None = None
+        # Отправленный дубль держит слот своей модели до конца этапа,
+        # если победил, или до конца гонки.
+        started_hedge: HedgeAttempt | None = None
+        hedged = False
+        # Модель запроса, за которым следит задача; после победы дубля —
+        # модель дубля: ей засчитываются задержка и ошибки.
+        served_model = job.model_id
+        queue_recorded = False
+        deadline = asyncio.get_event_loop().time() + total_timeout_seconds
+        try:
             while asyncio.get_event_loop().time() < deadline:
                 await asyncio.sleep(poll_interval_seconds)
                 try:
+                    calling_fal = True
                     status_response = await client.get_status(
                         job.status_url
                         or build_status_url(
-                            job.model_id, job.fal_request_id or request_id
+                            served_model, job.fal_request_id or request_id
                         )
                     )
-                    status_value = status_response.get(
-                        "status"
-                    ) or status_response.get("state")
-                    status_enum = (
-                        GenerationStatus(status_value)
-                        if status_value in GenerationStatus._value2member_map_
-                        else GenerationStatus.IN_QUEUE
-                    )
+                    status_enum = parse_status(status_response)
+                    calling_fal = False
+                    now = asyncio.get_event_loop().time()
+                    if not queue_recorded and status_enum in STARTED_STATUSES:
+                        queue_recorded = True
+                        model_stats.record_queue_time(
+                            served_model, now - submitted_at
+                        )
+                    if hedge is not None and hedging is not None:
+                        status_enum, status_response, hedge, winner = (
+                            await _race_hedge(
+                                client,
+                                job,
+                                hedge,
+                                hedging,
+                                status_enum,
+                                status_response,
+                                now,
+                            )
+                        )
+                        if winner is not None:
+                            served_model = winner.model_id
+                            submitted_at = winner.started_at
+                            queue_recorded = winner.queue_recorded
 
                     if status_enum in {
                         GenerationStatus.IN_QUEUE,
                         GenerationStatus.IN_PROGRESS,
                         GenerationStatus.SUBMITTED,
                     }:
-                        await jobs.update_status(job.id, status_enum)
+                        if (
+                            hedging is not None
+                            and hedge is None
+                            and not hedged
+                            and status_enum != GenerationStatus.IN_PROGRESS
+                        ):
+                            hedge, hedged = await _start_hedge(
+                                client,
+                                job,
+                                payload,
+                                hedging,
+                                now - submitted_at,
+                            )
+                            started_hedge = hedge
+                        await jobs.update_status(
+                            job.id, status_enum, **fal_urls(job)
+                        )
                         await session.commit()
                         continue
 
                     if status_enum == GenerationStatus.COMPLETED:
+                        calling_fal = True
                         result = await client.get_result(
                             job.response_url
                             or build_result_url(
-                                job.model_id, job.fal_request_id or request_id
+                                served_model, job.fal_request_id or request_id
                             )
                         )
+                        calling_fal = False
+                        get_model_router().record_completion(
+                            served_model, now - submitted_at, ok=True
+                        )
+                        result = await mirror_media(job.id, result)
+                        result = await add_thumbnails(job, result)
                         await jobs.update_status(
                             job.id,
                             GenerationStatus.COMPLETED,
                             result_json=result,
+                            **fal_urls(job),
                         )
                         await session.commit()
                         logger.info(
                             "generation_completed",
                             extra={"job_id": str(job.id)},
                         )
-                        return
+                        await remember_result(session, service, job, result)
+                        return await start_next_stage(
+                            session, service, job, result
+                        )
 
+                    get_model_router().record_completion(
+                        served_model, now - submitted_at, ok=False
+                    )
                     await service.refund_job(
                         job,
                         error_message=status_response.get("error", "failed"),
@@ -148,6 +302,10 @@ async def run_generation_job(
                     return
                 except Exception as exc:
                     await session.rollback()
+                    if calling_fal:
+                        get_model_router().record_completion(
+                            served_model, None, ok=False
+                        )
                     await service.refund_job(job, error_message=str(exc))
                     await session.commit()
                     logger.error(
@@ -156,13 +314,565 @@ async def run_generation_job(
                     )
                     return
 
+            get_model_router().record_completion(
+                served_model, total_timeout_seconds, ok=False
+            )
             await service.refund_job(
                 job, error_message="timeout waiting for fal"
             )
             await session.commit()
             logger.error("generation_timeout", extra={"job_id": str(job.id)})
-    finally:
-        await client.client.aclose()
+        finally:
+            if hedge is not None:
+                # Ошибка, тайм-аут или отмена воркера посреди гонки:
+                # дубль больше никто не ждёт.
+                await _cancel_quietly(client, job, hedge.cancel_url)
+            if started_hedge is not None:
+                _release_hedge_slot(started_hedge)
+
+
+async def _start_hedge(
+    client: HttpFalClient,
+    job: GenerationJob,
+    payload: dict[str, Any],
+    hedging: HedgePolicy,
+    queued_seconds: float,
+) -> tuple[HedgeAttempt | None, bool]:
+    """Отправить дубль задачи, дольше порога ждущей в очереди fal.
+
+    Возвращает дубль (None — не отправлен) и признак, что попытка
+    израсходовала бюджет и больше не повторяется. Дубль не ждёт слота
+    своей модели: если свободного нет, он пропускается до следующего
+    опроса. Дубль записывается в children_json задачи (его сохраняет
+    следующий update_status), чтобы отмена задачи отменила и его.
+    """
+    if not hedging.is_due(job.model_id, queued_seconds):
+        return None, False
+    model_id = hedging.hedge_model(job.model_id)
+    limiter = get_concurrency_limiter()
+    slot_weight = limiter.try_acquire(model_id)
+    if slot_weight is None:
+        hedging.metrics.rejected_by_slots += 1
+        return None, False
+    if not hedging.should_hedge(job.model_id, queued_seconds, job.cost_tokens):
+        limiter.release(model_id, slot_weight)
+        return None, False
+    try:
+        response = await client.submit(model_id, payload)
+        request_id, status_url, result_url, cancel_url = parse_submission(
+            model_id, response
+        )
+    except Exception as exc:
+        limiter.release(model_id, slot_weight)
+        hedging.metrics.failed += 1
+        logger.warning(
+            "generation_hedge_submit_failed",
+            extra={"job_id": str(job.id), "error": str(exc)},
+        )
+        return None, True
+    logger.info(
+        "generation_hedged",
+        extra={
+            "job_id": str(job.id),
+            "model_id": model_id,
+            "queued_seconds": queued_seconds,
+        },
+    )
+    hedge = HedgeAttempt(
+        model_id=model_id,
+        request_id=request_id,
+        status_url=status_url,
+        response_url=result_url,
+        cancel_url=cancel_url,
+        started_at=asyncio.get_event_loop().time(),
+        primary_queued_seconds=queued_seconds,
+        slot_weight=slot_weight,
+    )
+    job.children_json = [hedge.child(GenerationStatus.SUBMITTED)]
+    return hedge, True
+
+
+def _release_hedge_slot(hedge: HedgeAttempt) -> None:
+    """Вернуть слот дубля; повторный вызов ничего не делает."""
+    get_concurrency_limiter().release(hedge.model_id, hedge.slot_weight)
+    hedge.slot_weight = 0
+
+
+async def _race_hedge(
+    client: HttpFalClient,
+    job: GenerationJob,
+    hedge: HedgeAttempt,
+    hedging: HedgePolicy,
+    primary_status: GenerationStatus,
+    primary_response: dict[str, Any],
+    now: float,
+) -> tuple[
+    GenerationStatus, dict[str, Any], HedgeAttempt | None, HedgeAttempt | None
+]:
+    """Шаг гонки основного запроса и дубля.
+
+    Возвращает статус и ответ запроса, за которым дальше следит задача,
+    дубль, если гонка продолжается, и дубль, если он победил. Проигравший
+    отменяется; если побеждает дубль, его ID и URL переходят в задачу.
+    """
+    try:
+        hedge_response = await client.get_status(hedge.status_url)
+        hedge_status = parse_status(hedge_response)
+    except Exception as exc:
+        hedge_response = {"error": str(exc)}
+        hedge_status = GenerationStatus.FAILED
+    if not hedge.queue_recorded and hedge_status in STARTED_STATUSES:
+        hedge.queue_recorded = True
+        model_stats.record_queue_time(hedge.model_id, now - hedge.started_at)
+
+    if primary_status == GenerationStatus.COMPLETED or (
+        hedge_status not in ACTIVE_FAL_STATUSES
+        and hedge_status != GenerationStatus.COMPLETED
+    ):
+        if hedge_status in ACTIVE_FAL_STATUSES:
+            await _cancel_quietly(client, job, hedge.cancel_url)
+        if primary_status == GenerationStatus.COMPLETED:
+            hedging.metrics.primary_wins += 1
+        else:
+            hedging.metrics.failed += 1
+        _release_hedge_slot(hedge)
+        job.children_json = []
+        return primary_status, primary_response, None, None
+
+    if (
+        hedge_status == GenerationStatus.COMPLETED
+        or primary_status not in ACTIVE_FAL_STATUSES
+    ):
+        if primary_status in ACTIVE_FAL_STATUSES:
+            await _cancel_quietly(client, job, job.cancel_url)
+        if hedge_status == GenerationStatus.COMPLETED:
+            hedging.record_hedge_win(job.model_id, hedge, now)
+        job.fal_request_id = hedge.request_id
+        job.status_url = hedge.status_url
+        job.response_url = hedge.response_url
+        job.cancel_url = hedge.cancel_url
+        job.children_json = []
+        return hedge_status, hedge_response, None, hedge
+
+    job.children_json = [hedge.child(hedge_status)]
+    return primary_status, primary_response, hedge, None
+
+
+async def _cancel_quietly(
+    client: HttpFalClient,
+    job: GenerationJob,
+    cancel_url: str | None,
+) -> None:
+    """Отменить запрос в fal; ошибка отмены только логируется."""
+    if not cancel_url:
+        return
+    try:
+        await client.cancel(cancel_url)
+    except Exception as exc:
+        logger.warning(
+            "generation_cancel_failed",
+            extra={"job_id": str(job.id), "error": str(exc)},
+        )
+
+
+def fal_urls(job: GenerationJob) -> dict[str, Any]:
+    """ID запроса, URL fal и запись дубля задачи для update_status."""
+    return {
+        "fal_request_id": job.fal_request_id,
+        "status_url": job.status_url,
+        "response_url": job.response_url,
+        "cancel_url": job.cancel_url,
+        "children_json": job.children_json,
+    }
+
+
+def parse_status(response: dict[str, Any]) -> GenerationStatus:
+    """Статус из ответа fal; неизвестный считается IN_QUEUE."""
+    status_value = response.get("status") or response.get("state")
+    if status_value in GenerationStatus._value2member_map_:
+        return GenerationStatus(status_value)
+    return GenerationStatus.IN_QUEUE
+
+
+def fanout_size(job: GenerationJob) -> int:
+    """Число отдельных запросов fal для задачи; 1 — без разбиения."""
+    if not get_settings().fanout_enabled or job.kind not in FANOUT_KINDS:
+        return 1
+    return max(1, int(job.input_json.get("num_images") or 1))
+
+
+async def _run_fanout(
+    session: AsyncSession,
+    service: GenerationService,
+    job: GenerationJob,
+    client: HttpFalClient,
+    poll_interval_seconds: float,
+    total_timeout_seconds: float,
+) -> UUID | None:
+    """Разбить задачу на N запросов по одному изображению.
+
+    Дочерние запросы идут в fal одновременно и хранятся в children_json
+    той же задачи; готовые изображения сразу попадают в result_json.
+    Не выполненные дочерние запросы возвращаются пропорционально. При
+    сбое задача завершается с ошибкой и полным возвратом, а ещё не
+    завершённые дочерние запросы отменяются.
+    """
+    children: list[dict[str, Any]] = []
+    try:
+        outcome = await _collect_fanout(
+            session,
+            service,
+            job,
+            client,
+            children,
+            poll_interval_seconds,
+            total_timeout_seconds,
+        )
+    except Exception as exc:
+        await session.rollback()
+        await _cancel_children(client, job, children, str(exc))
+        await service.refund_job(job, error_message=str(exc))
+        await session.commit()
+        logger.error(
+            "generation_fanout_failed",
+            extra={"job_id": str(job.id), "error": str(exc)},
+        )
+        return None
+    if outcome is None:
+        return None
+    result, failed = outcome
+    if not failed:
+        await remember_result(session, service, job, result)
+    return await start_next_stage(session, service, job, result)
+
+
+async def _collect_fanout(
+    session: AsyncSession,
+    service: GenerationService,
+    job: GenerationJob,
+    client: HttpFalClient,
+    children: list[dict[str, Any]],
+    poll_interval_seconds: float,
+    total_timeout_seconds: float,
+) -> tuple[dict[str, Any], int] | None:
+    """Отправить и дождаться дочерних запросов; завершить задачу.
+
+    children заполняется по мере отправки. Возвращает результат и число
+    невыполненных запросов; None — задача уже завершена с ошибкой.
+    """
+    jobs = service.jobs
+    count = fanout_size(job)
+    payload = await get_blob_store().inline(job.input_json)
+    submissions = await asyncio.gather(
+        *(
+            client.submit(job.model_id, child_payload(payload, index))
+            for index in range(count)
+        ),
+        return_exceptions=True,
+    )
+    for index, response in enumerate(submissions):
+        try:
+            if isinstance(response, BaseException):
+                raise response
+            request_id, status_url, result_url, cancel_url = parse_submission(
+                job.model_id, response
+            )
+        except Exception as exc:
+            children.append(
+                {
+                    "index": index,
+                    "status": GenerationStatus.FAILED.value,
+                    "error": str(exc),
+                }
+            )
+            continue
+        children.append(
+            {
+                "index": index,
+                "status": GenerationStatus.SUBMITTED.value,
+                "request_id": request_id,
+                "status_url": status_url,
+                "response_url": result_url,
+                "cancel_url": cancel_url,
+            }
+        )
+    submitted = [child for child in children if "request_id" in child]
+    if not submitted:
+        await service.refund_job(job, error_message=children[0]["error"])
+        await session.commit()
+        logger.error("generation_submit_failed", extra={"job_id": str(job.id)})
+        return None
+
+    first = submitted[0]
+    await jobs.update_status(
+        job.id,
+        GenerationStatus.SUBMITTED,
+        fal_request_id=first["request_id"],
+        status_url=first["status_url"],
+        response_url=first["response_url"],
+        cancel_url=first["cancel_url"],
+        children_json=children,
+    )
+    await session.commit()
+    submitted_at = asyncio.get_event_loop().time()
+
+    results: dict[int, dict[str, Any]] = {}
+    pending = list(submitted)
+    deadline = asyncio.get_event_loop().time() + total_timeout_seconds
+    while pending and asyncio.get_event_loop().time() < deadline:
+        await asyncio.sleep(poll_interval_seconds)
+        await asyncio.gather(
+            *(_poll_child(client, child, results) for child in pending)
+        )
+        pending = [
+            child
+            for child in pending
+            if GenerationStatus(child["status"]) not in TERMINAL_CHILD_STATUSES
+        ]
+        # Частичный результат виден в статусе до завершения всех запросов.
+        await jobs.update_status(
+            job.id,
+            (
+                GenerationStatus.IN_PROGRESS
+                if results
+                or any(
+                    child["status"] == GenerationStatus.IN_PROGRESS.value
+                    for child in children
+                )
+                else GenerationStatus.IN_QUEUE
+            ),
+            result_json=merge_results(results),
+            children_json=children,
+        )
+        await session.commit()
+
+    await _cancel_children(client, job, children, "timeout waiting for fal")
+
+    get_model_router().record_completion(
+        job.model_id,
+        asyncio.get_event_loop().time() - submitted_at,
+        ok=bool(results),
+    )
+    if not results:
+        await service.refund_job(
+            job,
+            error_message="; ".join(
+                sorted({child.get("error", "failed") for child in children})
+            ),
+        )
+        await session.commit()
+        logger.error("generation_failed", extra={"job_id": str(job.id)})
+        return None
+
+    result = merge_results(results) or {}
+    result = await mirror_media(job.id, result)
+    result = await add_thumbnails(job, result)
+    failed = count - len(results)
+    await jobs.update_status(
+        job.id,
+        GenerationStatus.COMPLETED,
+        result_json=result,
+        children_json=children,
+    )
+    await service.refund_partial(job, job.cost_tokens * failed // count)
+    await session.commit()
+    logger.info(
+        "generation_completed",
+        extra={"job_id": str(job.id), "failed_children": failed},
+    )
+    return result, failed
+
+
+async def _cancel_children(
+    client: HttpFalClient,
+    job: GenerationJob,
+    children: list[dict[str, Any]],
+    error: str,
+) -> None:
+    """Отменить ещё не завершённые дочерние запросы в fal."""
+    for child in children:
+        if GenerationStatus(child["status"]) in TERMINAL_CHILD_STATUSES:
+            continue
+        child["status"] = GenerationStatus.FAILED.value
+        child["error"] = error
+        try:
+            await client.cancel(child["cancel_url"])
+        except Exception:
+            logger.warning(
+                "generation_child_cancel_failed",
+                extra={"job_id": str(job.id), "index": child["index"]},
+            )
+
+
+async def _poll_child(
+    client: HttpFalClient,
+    child: dict[str, Any],
+    results: dict[int, dict[str, Any]],
+) -> None:
+    """Обновить статус дочернего запроса; готовый — забрать результат."""
+    try:
+        response = await client.get_status(child["status_url"])
+        status = parse_status(response)
+        if status == GenerationStatus.COMPLETED:
+            results[child["index"]] = await client.get_result(
+                child["response_url"]
+            )
+        elif status not in ACTIVE_FAL_STATUSES:
+            status = GenerationStatus.FAILED
+            child["error"] = response.get("error", "failed")
+        child["status"] = status.value
+    except Exception as exc:
+        child["status"] = GenerationStatus.FAILED.value
+        child["error"] = str(exc)
+
+
+def child_payload(payload: dict[str, Any], index: int) -> dict[str, Any]:
+    """Вход дочернего запроса: одно изображение, свой seed."""
+    child = {**payload, "num_images": 1}
+    if child.get("seed") is not None:
+        # С одинаковым seed все дочерние запросы дали бы одну картинку.
+        child["seed"] = child["seed"] + index
+    return child
+
+
+def merge_results(
+    results: dict[int, dict[str, Any]],
+) -> dict[str, Any] | None:
+    """Объединить результаты дочерних запросов в порядке их номеров.
+
+    Списки (images, has_nsfw_concepts) склеиваются, остальные поля
+    берутся из первого результата.
+    """
+    if not results:
+        return None
+    ordered = [results[index] for index in sorted(results)]
+    merged = dict(ordered[0])
+    for key, value in merged.items():
+        if isinstance(value, list):
+            merged[key] = [
+                item for result in ordered for item in (result.get(key) or [])
+            ]
+    return merged
+
+
+def parse_submission(
+    model_id: str,
+    response: dict[str, Any],
+) -> tuple[str, str, str, str]:
+    """ID запроса и URL статуса, результата и отмены из ответа fal."""
+    request_id = response.get("request_id") or response.get("id")
+    status_url = response.get("status_url") or response.get("statusUrl")
+    result_url = response.get("response_url") or response.get("responseUrl")
+    cancel_url = response.get("cancel_url") or response.get("cancelUrl")
+    if not request_id:
+        raise RuntimeError("fal response missing request id")
+    if not status_url:
+        status_url = build_status_url(model_id, request_id)
+    if not result_url:
+        result_url = build_result_url(model_id, request_id)
+    if not cancel_url:
+        cancel_url = build_cancel_url(model_id, request_id)
+    return request_id, status_url, result_url, cancel_url
+
+
+async def run_generation_jobs(
+    job_ids: Sequence[UUID],
+    fal_client_factory: Callable[[], HttpFalClient] | None = None,
+) -> None:
+    """Запустить пачку генераций одной фоновой задачей."""
+    results = await asyncio.gather(
+        *(
+            run_generation_job(job_id, fal_client_factory)
+            for job_id in job_ids
+        ),
+        return_exceptions=True,
+    )
+    for job_id, result in zip(job_ids, results):
+        if isinstance(result, Exception):
+            logger.error(
+                "generation_batch_job_failed",
+                extra={"job_id": str(job_id), "error": str(result)},
+            )
+
+
+async def mirror_media(
+    job_id: UUID,
+    result: dict[str, Any],
+) -> dict[str, Any]:
+    """Скопировать медиа результата до перехода в COMPLETED.
+
+    Завершённая задача больше не меняется (её кэшируют), поэтому
+    копирование идёт раньше, пока задача ещё IN_PROGRESS.
+    """
+    mirror = get_media_mirror()
+    if mirror is None:
+        return result
+    return await mirror.mirror_result(job_id, result)
+
+
+async def add_thumbnails(
+    job: GenerationJob,
+    result: dict[str, Any],
+) -> dict[str, Any]:
+    """Построить миниатюры скопированных изображений до COMPLETED."""
+    thumbnails = get_thumbnail_generator()
+    if thumbnails is None:
+        return result
+    return await thumbnails.add_thumbnails(job.id, job.kind, result)
+
+
+async def start_next_stage(
+    session: AsyncSession,
+    service: GenerationService,
+    job: GenerationJob,
+    result: dict[str, Any],
+) -> UUID | None:
+    """Подставить результат этапа в следующий этап конвейера."""
+    if job.pipeline_id is None:
+        return None
+    try:
+        stage = await service.advance_pipeline(job, result)
+        await session.commit()
+    except Exception as exc:
+        await session.rollback()
+        logger.error(
+            "pipeline_advance_failed",
+            extra={"job_id": str(job.id), "error": str(exc)},
+        )
+        return None
+    return stage.id if stage else None
+
+
+def result_repository(
+    session: AsyncSession,
+) -> SQLAlchemyGenerationResultRepository | None:
+    """Репозиторий кэша результатов, если кэш включён."""
+    settings = get_settings()
+    if not settings.result_cache_enabled:
+        return None
+    return SQLAlchemyGenerationResultRepository(
+        session,
+        settings.result_cache_ttl_seconds,
+        settings.result_cache_max_entries,
+    )
+
+
+async def remember_result(
+    session: AsyncSession,
+    service: GenerationService,
+    job: GenerationJob,
+    result: dict[str, Any],
+) -> None:
+    """Сохранить результат в кэш; сбой кэша не влияет на задачу."""
+    try:
+        await service.remember_result(job, result)
+        await session.commit()
+    except Exception as exc:
+        await session.rollback()
+        logger.warning(
+            "result_cache_store_failed",
+            extra={"job_id": str(job.id), "error": str(exc)},
+        )
 
 
 def base_model(model_id: str) -> str:
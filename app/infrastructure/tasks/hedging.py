@@ -0,0 +1,202 @@
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from app.domain.entities import GenerationStatus
+from app.infrastructure.fal.stats import ModelLatencyStats, model_stats
+from app.infrastructure.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Метка записи дубля в children_json задачи (у дочерних запросов
+# разбитой задачи её нет).
+HEDGE_ROLE = "hedge"
+
+
+@dataclass(slots=True)
+class HedgeAttempt:
+    """Дублирующий запрос в fal для задачи, застрявшей в очереди."""
+
+    model_id: str
+    request_id: str
+    status_url: str
+    response_url: str
+    cancel_url: str
+    started_at: float
+    primary_queued_seconds: float
+    queue_recorded: bool = False
+    # Слоты модели дубля в ModelConcurrencyLimiter; 0 — уже возвращены.
+    slot_weight: int = 0
+
+    def child(self, status: GenerationStatus) -> dict[str, Any]:
+        """Запись дубля для children_json: по ней его можно отменить."""
+        return {
+            "role": HEDGE_ROLE,
+            "model_id": self.model_id,
+            "request_id": self.request_id,
+            "status_url": self.status_url,
+            "response_url": self.response_url,
+            "cancel_url": self.cancel_url,
+            "status": status.value,
+        }
+
+
+class HedgeBudget:
+    """Общий лимит стоимости дублей за скользящее окно."""
+
+    def __init__(self, max_tokens: int, window_seconds: float) -> None:
+        self.max_tokens = max_tokens
+        self.window_seconds = window_seconds
+        self._spent: deque[tuple[float, int]] = deque()
+        self._total = 0
+
+    @property
+    def spent(self) -> int:
+        """Потрачено в текущем окне."""
+        self._expire(time.monotonic())
+        return self._total
+
+    def try_spend(self, tokens: int) -> bool:
+        """Зарезервировать стоимость дубля, если лимит позволяет."""
+        now = time.monotonic()
+        self._expire(now)
+        if self._total + tokens > self.max_tokens:
+            return False
+        self._spent.append((now, tokens))
+        self._total += tokens
+        return True
+
+    def _expire(self, now: float) -> None:
+        while self._spent and now - self._spent[0][0] > self.window_seconds:
+            self._total -= self._spent.popleft()[1]
+
+
+class HedgeStats:
+    """Счётчики дублирования запросов."""
+
+    def __init__(self) -> None:
+        self.started = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.failed = 0
+        self.rejected_by_budget = 0
+        self.rejected_by_slots = 0
+        self.spent_tokens = 0
+        self.saved_seconds = 0.0
+
+    def snapshot(self) -> dict[str, float]:
+        """Текущие значения счётчиков."""
+        return {
+            "started": self.started,
+            "hedge_wins": self.hedge_wins,
+            "primary_wins": self.primary_wins,
+            "failed": self.failed,
+            "rejected_by_budget": self.rejected_by_budget,
+            "rejected_by_slots": self.rejected_by_slots,
+            "spent_tokens": self.spent_tokens,
+            "saved_seconds": self.saved_seconds,
+        }
+
+
+class HedgePolicy:
+    """Когда и куда отправлять дубль задачи, ждущей в очереди fal.
+
+    Порог — квантиль наблюдаемого времени в очереди модели, но не
+    меньше min_queue_seconds; до min_samples измерений дублей нет.
+    """
+
+    def __init__(
+        self,
+        budget: HedgeBudget,
+        quantile: float,
+        min_samples: int,
+        min_queue_seconds: float,
+        alternates: dict[str, str] | None = None,
+        stats: ModelLatencyStats = model_stats,
+    ) -> None:
+        self.budget = budget
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_queue_seconds = min_queue_seconds
+        self.alternates = alternates or {}
+        self.stats = stats
+        self.metrics = HedgeStats()
+
+    def threshold(self, model_id: str) -> float | None:
+        """Время в очереди, после которого задачу стоит дублировать."""
+        if self.stats.samples(model_id) < self.min_samples:
+            return None
+        quantile = self.stats.queue_quantile(model_id, self.quantile)
+        if quantile is None:
+            return None
+        return max(self.min_queue_seconds, quantile)
+
+    def is_due(self, model_id: str, queued_seconds: float) -> bool:
+        """Ждёт ли задача в очереди дольше порога модели."""
+        threshold = self.threshold(model_id)
+        return threshold is not None and queued_seconds >= threshold
+
+    def should_hedge(
+        self,
+        model_id: str,
+        queued_seconds: float,
+        cost_tokens: int,
+    ) -> bool:
+        """Пора ли дублировать; при «да» стоимость списывается с лимита."""
+        if not self.is_due(model_id, queued_seconds):
+            return False
+        if not self.budget.try_spend(cost_tokens):
+            self.metrics.rejected_by_budget += 1
+            return False
+        self.metrics.started += 1
+        self.metrics.spent_tokens += cost_tokens
+        return True
+
+    def hedge_model(self, model_id: str) -> str:
+        """Модель для дубля: альтернативная, если задана."""
+        return self.alternates.get(model_id, model_id)
+
+    def record_hedge_win(
+        self,
+        model_id: str,
+        attempt: HedgeAttempt,
+        now: float,
+    ) -> None:
+        """Дубль завершился первым: оценить сэкономленное время.
+
+        Оценка — среднее оставшееся ожидание основного запроса по
+        наблюдениям, которые ждали дольше него.
+        """
+        self.metrics.hedge_wins += 1
+        elapsed = attempt.primary_queued_seconds + now - attempt.started_at
+        remaining = self.stats.expected_remaining(model_id, elapsed)
+        if remaining is not None:
+            self.metrics.saved_seconds += remaining
+
+
+@lru_cache()
+def get_hedge_policy() -> HedgePolicy | None:
+    """Политика дублирования процесса; None, если выключена."""
+    settings = get_settings()
+    if not settings.hedging_enabled:
+        return None
+    try:
+        alternates = json.loads(settings.hedge_alternate_models_json)
+    except json.JSONDecodeError as exc:
+        raise RuntimeError(
+            "HEDGE_ALTERNATE_MODELS_JSON must be valid JSON"
+        ) from exc
+    return HedgePolicy(
+        HedgeBudget(
+            settings.hedge_budget_tokens,
+            settings.hedge_budget_window_seconds,
+        ),
+        settings.hedge_quantile,
+        settings.hedge_min_samples,
+        settings.hedge_min_queue_seconds,
+        {str(k): str(v) for k, v in alternates.items()},
+    )
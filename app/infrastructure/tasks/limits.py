@@ -0,0 +1,354 @@
+import asyncio
+import json
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, Hashable
+
+from app.application.use_cases.generations import IMAGE_PRODUCING_KINDS
+from app.domain.entities import GenerationKind
+from app.infrastructure.settings import get_settings
+
+IMAGE_LANE = "image"
+VIDEO_LANE = "video"
+# Порядок предпочтения: короткие задачи изображений обслуживаются первыми.
+LANES = (IMAGE_LANE, VIDEO_LANE)
+DEFAULT_TIER = "default"
+
+
+def submission_lane(kind: GenerationKind) -> str:
+    """Полоса очереди отправки для типа генерации."""
+    return IMAGE_LANE if kind in IMAGE_PRODUCING_KINDS else VIDEO_LANE
+
+
+class ModelSlots:
+    """Счётчик занятых слотов одной модели."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.in_use = 0
+
+    def fits(self, weight: int) -> bool:
+        """Хватает ли свободных слотов."""
+        return self.in_use + weight <= self.limit
+
+
+@dataclass(slots=True, eq=False)
+class Ticket:
+    """Ожидающая отправки задача."""
+
+    model_id: str
+    weight: int
+    cost: int
+    future: asyncio.Future[None]
+
+
+@dataclass(slots=True)
+class UserQueue:
+    """Очередь пользователя в полосе и его дефицит DRR."""
+
+    quantum: int
+    tickets: deque[Ticket] = field(default_factory=deque)
+    deficit: int = 0
+    new_turn: bool = True
+
+
+class ModelConcurrencyLimiter:
+    """Лимиты одновременных запросов к fal и справедливая очередь отправки.
+
+    Задача, которой не хватило слота модели или общего лимита, остаётся
+    в QUEUED и ждёт в очереди процесса. Очереди пользователей внутри
+    полосы обслуживаются по deficit round robin: стоимость задачи —
+    её цена в токенах, квант пропорционален весу тарифа. Полоса
+    изображений получает больше выдач, чем полоса видео, но свободные
+    слоты никогда не простаивают.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, int] | None = None,
+        default_limit: int = 0,
+        capacity: int = 0,
+        quantum: int = 10,
+        lane_weights: dict[str, int] | None = None,
+    ) -> None:
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self.capacity = capacity
+        self.quantum = quantum
+        self.lane_weights = lane_weights or {IMAGE_LANE: 3, VIDEO_LANE: 1}
+        self.in_use = 0
+        self._slots: dict[str, ModelSlots] = {}
+        self._lanes: dict[str, dict[Hashable, UserQueue]] = {
+            lane: {} for lane in LANES
+        }
+        self._active: dict[str, deque[Hashable]] = {
+            lane: deque() for lane in LANES
+        }
+        self._lane_credit = dict(self.lane_weights)
+
+    def limit_for(self, model_id: str) -> int | None:
+        """Лимит модели; None — без ограничения."""
+        limit = self.limits.get(model_id, self.default_limit)
+        return limit if limit > 0 else None
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        model_id: str,
+        weight: int = 1,
+        *,
+        user_id: Hashable = None,
+        lane: str = IMAGE_LANE,
+        cost: int = 1,
+        tier_weight: int = 1,
+    ) -> AsyncIterator[None]:
+        """Удерживать weight слотов модели на время запроса к fal."""
+        limit = self.limit_for(model_id)
+        if limit is None and self.capacity <= 0:
+            yield
+            return
+        if limit is not None and model_id not in self._slots:
+            self._slots[model_id] = ModelSlots(limit)
+        # Задача больше лимита всё равно должна выполниться.
+        for bound in (limit, self.capacity):
+            if bound:
+                weight = min(weight, bound)
+        await self._acquire(
+            Ticket(
+                model_id,
+                weight,
+                max(cost, 1),
+                asyncio.get_running_loop().create_future(),
+            ),
+            user_id,
+            lane,
+            max(self.quantum * tier_weight, 1),
+        )
+        try:
+            yield
+        finally:
+            self._release(model_id, weight)
+
+    def try_acquire(self, model_id: str, weight: int = 1) -> int | None:
+        """Занять слоты без ожидания: занятый вес или None, если мест нет.
+
+        Для запросов, которые лучше пропустить, чем ставить в очередь
+        (дубли). Вернуть слоты — release с тем же весом.
+        """
+        limit = self.limit_for(model_id)
+        if limit is None and self.capacity <= 0:
+            return 0
+        if limit is not None and model_id not in self._slots:
+            self._slots[model_id] = ModelSlots(limit)
+        for bound in (limit, self.capacity):
+            if bound:
+                weight = min(weight, bound)
+        if not self._fits(model_id, weight):
+            return None
+        self._take(model_id, weight)
+        return weight
+
+    def release(self, model_id: str, weight: int) -> None:
+        """Вернуть слоты, занятые try_acquire."""
+        if weight:
+            self._release(model_id, weight)
+
+    async def _acquire(
+        self, ticket: Ticket, user_id: Hashable, lane: str, quantum: int
+    ) -> None:
+        queues = self._lanes[lane]
+        queue = queues.get(user_id)
+        if queue is None:
+            queue = queues[user_id] = UserQueue(quantum)
+            self._active[lane].append(user_id)
+        queue.quantum = quantum
+        queue.tickets.append(ticket)
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Слот уже выдан, но ожидающего отменили: вернуть его.
+                self._release(ticket.model_id, ticket.weight)
+            else:
+                if ticket in queue.tickets:
+                    queue.tickets.remove(ticket)
+                registered = self._lanes[lane].get(user_id) is queue
+                if registered and not queue.tickets:
+                    self._drop(lane, user_id)
+                self._dispatch()
+            raise
+
+    def _release(self, model_id: str, weight: int) -> None:
+        self.in_use -= weight
+        slots = self._slots.get(model_id)
+        if slots is not None:
+            slots.in_use -= weight
+        self._dispatch()
+
+    def _fits(self, model_id: str, weight: int) -> bool:
+        if self.capacity > 0 and self.in_use + weight > self.capacity:
+            return False
+        slots = self._slots.get(model_id)
+        return slots is None or slots.fits(weight)
+
+    def _take(self, model_id: str, weight: int) -> None:
+        self.in_use += weight
+        slots = self._slots.get(model_id)
+        if slots is not None:
+            slots.in_use += weight
+
+    def _dispatch(self) -> None:
+        while True:
+            if self.capacity > 0 and self.in_use >= self.capacity:
+                return
+            # Полосы с остатком кредита — первыми, при равенстве — по
+            # порядку LANES.
+            lanes = sorted(
+                (lane for lane in LANES if self._active[lane]),
+                key=lambda lane: self._lane_credit[lane] <= 0,
+            )
+            for lane in lanes:
+                ticket = self._next_in_lane(lane)
+                if ticket is not None:
+                    break
+            else:
+                return
+            self._lane_credit[lane] -= 1
+            if all(credit <= 0 for credit in self._lane_credit.values()):
+                self._lane_credit = dict(self.lane_weights)
+            self._take(ticket.model_id, ticket.weight)
+            ticket.future.set_result(None)
+
+    def _next_in_lane(self, lane: str) -> Ticket | None:
+        """Следующая задача полосы по deficit round robin."""
+        queues = self._lanes[lane]
+        active = self._active[lane]
+        for user_id in list(active):
+            # Отменённые ожидающие могли ещё не успеть выйти из очереди.
+            tickets = queues[user_id].tickets
+            while tickets and tickets[0].future.done():
+                tickets.popleft()
+            if not tickets:
+                self._drop(lane, user_id)
+        if not any(self._fits_head(queues[user]) for user in active):
+            return None
+        while True:
+            user_id = active[0]
+            queue = queues[user_id]
+            head = queue.tickets[0]
+            if not self._fits(head.model_id, head.weight):
+                # Модель пользователя занята: ход переходит дальше.
+                queue.new_turn = True
+                active.rotate(-1)
+                continue
+            if queue.new_turn:
+                queue.deficit += queue.quantum
+                queue.new_turn = False
+            if head.cost > queue.deficit:
+                queue.new_turn = True
+                active.rotate(-1)
+                continue
+            queue.deficit -= head.cost
+            queue.tickets.popleft()
+            if not queue.tickets:
+                self._drop(lane, user_id)
+            return head
+
+    def _fits_head(self, queue: UserQueue) -> bool:
+        head = queue.tickets[0]
+        return self._fits(head.model_id, head.weight)
+
+    def _drop(self, lane: str, user_id: Hashable) -> None:
+        # Опустевшая очередь теряет накопленный дефицит.
+        del self._lanes[lane][user_id]
+        self._active[lane].remove(user_id)
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        """Лимит, занятые и ожидающие слоты по моделям."""
+        waiting: dict[str, int] = {}
+        for queues in self._lanes.values():
+            for queue in queues.values():
+                for ticket in queue.tickets:
+                    waiting[ticket.model_id] = (
+                        waiting.get(ticket.model_id, 0) + 1
+                    )
+        return {
+            model_id: {
+                "limit": slots.limit,
+                "in_use": slots.in_use,
+                "waiting": waiting.get(model_id, 0),
+            }
+            for model_id, slots in sorted(self._slots.items())
+        }
+
+    def queue_snapshot(self) -> dict[str, int]:
+        """Общий лимит отправки и ожидающие задачи по полосам."""
+        snapshot = {"capacity": self.capacity, "in_use": self.in_use}
+        for lane, queues in self._lanes.items():
+            snapshot[f"{lane}_users"] = len(queues)
+            snapshot[f"{lane}_waiting"] = sum(
+                len(queue.tickets) for queue in queues.values()
+            )
+        return snapshot
+
+
+@dataclass(frozen=True, slots=True)
+class TierPolicy:
+    """Веса тарифов для справедливой очереди отправки."""
+
+    weights: dict[str, int]
+    user_tiers: dict[str, str]
+
+    def weight_for(self, user_id: Hashable) -> int:
+        """Вес тарифа пользователя."""
+        tier = self.user_tiers.get(str(user_id), DEFAULT_TIER)
+        return self.weights.get(tier, self.weights.get(DEFAULT_TIER, 1))
+
+
+def _load_json(raw: str, name: str) -> dict:
+    try:
+        value = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise RuntimeError(f"{name} must be valid JSON") from exc
+    if not isinstance(value, dict):
+        raise RuntimeError(f"{name} must be a JSON object")
+    return value
+
+
+@lru_cache()
+def get_concurrency_limiter() -> ModelConcurrencyLimiter:
+    """Лимиты одновременных запросов процесса."""
+    settings = get_settings()
+    limits = _load_json(
+        settings.model_concurrency_limits_json,
+        "MODEL_CONCURRENCY_LIMITS_JSON",
+    )
+    return ModelConcurrencyLimiter(
+        {str(model_id): int(limit) for model_id, limit in limits.items()},
+        settings.model_concurrency_default,
+        capacity=settings.submission_concurrency,
+        quantum=settings.scheduler_quantum_tokens,
+        lane_weights={
+            IMAGE_LANE: settings.scheduler_image_lane_weight,
+            VIDEO_LANE: settings.scheduler_video_lane_weight,
+        },
+    )
+
+
+@lru_cache()
+def get_tier_policy() -> TierPolicy:
+    """Тарифы пользователей из настроек."""
+    settings = get_settings()
+    weights = _load_json(
+        settings.scheduler_tier_weights_json, "SCHEDULER_TIER_WEIGHTS_JSON"
+    )
+    user_tiers = _load_json(
+        settings.scheduler_user_tiers_json, "SCHEDULER_USER_TIERS_JSON"
+    )
+    return TierPolicy(
+        {str(tier): max(int(weight), 1) for tier, weight in weights.items()},
+        {str(user): str(tier) for user, tier in user_tiers.items()},
+    )
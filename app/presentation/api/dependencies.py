@@ -1,3 +1,6 @@
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Callable
+
 from fastapi import Depends, Header, HTTPException, status
 
 from app.application.use_cases.auth import AuthService
@@ -5,13 +8,19 @@ from app.application.use_cases.balance import BalanceService
 from app.application.use_cases.generations import GenerationService
 from app.application.use_cases.webhook import WebhookTopupService
 from app.domain.entities import User
+from app.infrastructure.cache.singleflight import read_flights
 from app.infrastructure.db.base import get_session
 from app.infrastructure.db.repositories import (
+    SQLAlchemyAssetRepository,
     SQLAlchemyBalanceTransactionRepository,
     SQLAlchemyGenerationJobRepository,
     SQLAlchemyUserRepository,
 )
 from app.infrastructure.settings import get_settings
+from app.infrastructure.storage.blobs import get_blob_store
+from app.infrastructure.tasks.generations import result_repository
+
+WebhookServiceScope = Callable[[], AsyncContextManager[WebhookTopupService]]
 
 
 async def get_user_repository(session=Depends(get_session)):
@@ -38,11 +47,21 @@ async def get_job_repository(session=Depends(get_session)):
     return SQLAlchemyGenerationJobRepository(session)
 
 
+async def get_asset_repository(session=Depends(get_session)):
+    """Репозиторий владельцев ассетов."""
+    return SQLAlchemyAssetRepository(session)
+
+
+async def get_result_repository(session=Depends(get_session)):
+    """Репозиторий кэша результатов (None, если кэш выключен)."""
+    return result_repository(session)
+
+
 async def get_auth_service(
     users=Depends(get_user_repository),
 ) -> AuthService:
     """Сервис аутентификации."""
-    return AuthService(users)
+    return AuthService(users, read_flights)
 
 
 async def get_balance_service(
@@ -57,6 +76,8 @@ async def get_generation_service(
     users=Depends(get_user_repository),
     jobs=Depends(get_job_repository),
     transactions=Depends(get_transaction_repository),
+    results=Depends(get_result_repository),
+    assets=Depends(get_asset_repository),
 ) -> GenerationService:
     """Сервис генераций."""
     settings = get_settings()
@@ -65,6 +86,11 @@ async def get_generation_service(
         jobs,
         transactions,
         settings.token_prices,
+        read_flights,
+        results=results,
+        result_cache_price=settings.result_cache_price,
+        blobs=get_blob_store(),
+        assets=assets,
     )
 
 
@@ -76,6 +102,21 @@ async def get_webhook_service(
     return WebhookTopupService(users, transactions)
 
 
+@asynccontextmanager
+async def webhook_service_scope() -> AsyncIterator[WebhookTopupService]:
+    """Сервис вебхуков в собственной транзакции."""
+    async with asynccontextmanager(get_session)() as session:
+        yield WebhookTopupService(
+            SQLAlchemyUserRepository(session),
+            SQLAlchemyBalanceTransactionRepository(session),
+        )
+
+
+async def get_webhook_service_scope() -> WebhookServiceScope:
+    """Фабрика сервиса вебхуков: по транзакции на кусок пачки."""
+    return webhook_service_scope
+
+
 async def get_current_user(
     api_key: str | None = Header(None, alias="X-API-Key"),
     auth_service: AuthService = Depends(get_auth_service),
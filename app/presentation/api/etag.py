@@ -0,0 +1,50 @@
+import hashlib
+from datetime import datetime, timezone
+from typing import Iterable
+from uuid import UUID
+
+CACHE_CONTROL = "private, no-cache"
+# Содержимое по хэшу не меняется: повторная проверка не нужна.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _timestamp_us(value: datetime) -> int:
+    """Время в микросекундах; naive считается UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+def job_etag(job_id: UUID, updated_at: datetime) -> str:
+    """Слабый ETag задачи."""
+    return f'W/"{job_id.hex}-{_timestamp_us(updated_at)}"'
+
+
+def media_etag(digest: str) -> str:
+    """Сильный ETag содержимого по его SHA-256."""
+    return f'"{digest}"'
+
+
+def page_etag(
+    versions: Iterable[tuple[UUID, datetime]],
+    *params: object,
+) -> str:
+    """Слабый ETag страницы: версии задач и параметры запроса."""
+    digest = hashlib.sha256(repr(params).encode())
+    for job_id, updated_at in versions:
+        digest.update(job_id.bytes)
+        digest.update(_timestamp_us(updated_at).to_bytes(8, "big"))
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Слабое сравнение ETag с заголовком If-None-Match."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
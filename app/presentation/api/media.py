@@ -0,0 +1,57 @@
+from typing import Any
+from uuid import UUID
+
+from app.infrastructure.media.mirror import iter_media_items
+
+
+def media_path(job_id: UUID, index: int) -> str:
+    """Путь нашей копии n-го медиафайла задачи."""
+    return f"/generations/{job_id}/media/{index}"
+
+
+def thumbnail_path(job_id: UUID, index: int) -> str:
+    """Путь миниатюры n-го медиафайла задачи."""
+    return f"{media_path(job_id, index)}/thumbnail"
+
+
+def thumbnail_urls(
+    job_id: UUID,
+    result: dict[str, Any] | None,
+) -> list[str] | None:
+    """Ссылки на миниатюры в порядке медиафайлов; None, если их нет."""
+    if not result:
+        return None
+    urls = [
+        thumbnail_path(job_id, index)
+        for index, item in enumerate(iter_media_items(result))
+        if "thumbnail" in item
+    ]
+    return urls or None
+
+
+def public_result(
+    job_id: UUID,
+    result: dict[str, Any] | None,
+) -> dict[str, Any] | None:
+    """Результат для клиента: скопированные медиа — по нашим ссылкам."""
+    if not result:
+        return result
+    if not any("blob" in item for item in iter_media_items(result)):
+        return result
+    rendered = _copy(result)
+    for index, item in enumerate(iter_media_items(rendered)):
+        if "blob" in item:
+            del item["blob"]
+            item["url"] = media_path(job_id, index)
+        if "thumbnail" in item:
+            item["thumbnail"].pop("blob", None)
+            item["thumbnail"]["url"] = thumbnail_path(job_id, index)
+    return rendered
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+CRLF = b"\r\n"
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class MultipartError(ValueError):
+    """Некорректное тело multipart/form-data."""
+
+
+@dataclass(slots=True)
+class MultipartPart:
+    """Заголовки части multipart."""
+
+    name: str | None
+    filename: str | None
+    content_type: str | None
+
+
+def parse_boundary(content_type: str) -> bytes:
+    """Граница из заголовка Content-Type multipart/form-data."""
+    media_type, _, params = content_type.partition(";")
+    if media_type.strip().lower() != "multipart/form-data":
+        raise MultipartError("expected multipart/form-data")
+    for param in params.split(";"):
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            boundary = value.strip().strip('"')
+            if 1 <= len(boundary) <= 70:
+                return boundary.encode("latin-1")
+    raise MultipartError("missing multipart boundary")
+
+
+def _disposition_params(value: str) -> dict[str, str]:
+    params = {}
+    for item in value.split(";")[1:]:
+        key, _, raw = item.strip().partition("=")
+        params[key.lower()] = raw.strip().strip('"')
+    return params
+
+
+class MultipartReader:
+    """Потоковый разбор multipart/form-data без буферизации частей.
+
+    Тело части отдаётся кусками по мере чтения запроса; в памяти
+    остаётся только хвост длиной с разделитель.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], boundary: bytes):
+        self._chunks = chunks.__aiter__()
+        self._delimiter = CRLF + b"--" + boundary
+        # Ведущий CRLF: первая граница совпадает с разделителем.
+        self._buffer = bytearray(CRLF)
+        self._started = False
+        self._in_body = False
+        self._done = False
+
+    async def next_part(self) -> MultipartPart | None:
+        """Перейти к следующей части; None после закрывающей границы."""
+        if self._in_body:
+            async for _ in self.iter_body():
+                pass
+        if not self._started:
+            self._started = True
+            if not await self._skip_delimiter():
+                return None
+        if self._done:
+            return None
+
+        headers = await self._read_headers()
+        params = _disposition_params(headers.get("content-disposition", ""))
+        self._in_body = True
+        return MultipartPart(
+            name=params.get("name"),
+            filename=params.get("filename"),
+            content_type=headers.get("content-type"),
+        )
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        """Тело текущей части кусками."""
+        keep = len(self._delimiter) - 1
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index >= 0:
+                if index:
+                    yield bytes(self._buffer[:index])
+                del self._buffer[:index]
+                break
+            if len(self._buffer) > keep:
+                yield bytes(self._buffer[:-keep])
+                del self._buffer[:-keep]
+            if not await self._fill():
+                raise MultipartError("unexpected end of multipart body")
+        self._in_body = False
+        await self._skip_delimiter()
+
+    async def _fill(self) -> bool:
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return False
+        self._buffer += chunk
+        return True
+
+    async def _skip_delimiter(self) -> bool:
+        """Пропустить до разделителя; False на закрывающей границе."""
+        keep = len(self._delimiter) - 1
+        while (index := self._buffer.find(self._delimiter)) < 0:
+            if len(self._buffer) > keep:
+                del self._buffer[:-keep]
+            if not await self._fill():
+                raise MultipartError("multipart boundary not found")
+        del self._buffer[: index + len(self._delimiter)]
+        while len(self._buffer) < 2:
+            if not await self._fill():
+                raise MultipartError("unexpected end of multipart body")
+        if self._buffer[:2] == b"--":
+            self._done = True
+            return False
+        if self._buffer[:2] != CRLF:
+            raise MultipartError("malformed multipart boundary")
+        del self._buffer[:2]
+        return True
+
+    async def _read_headers(self) -> dict[str, str]:
+        while (end := self._buffer.find(CRLF + CRLF)) < 0:
+            if len(self._buffer) > MAX_HEADER_BYTES:
+                raise MultipartError("multipart headers too large")
+            if not await self._fill():
+                raise MultipartError("unexpected end of multipart body")
+        raw = bytes(self._buffer[:end])
+        del self._buffer[: end + 4]
+        headers = {}
+        for line in raw.split(CRLF):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return headers
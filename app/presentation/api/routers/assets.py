@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.application.interfaces.blob_store import BlobTooLarge
+from app.application.interfaces.repositories import AssetRepository
+from app.domain.entities import User
+from app.infrastructure.db.base import get_session
+from app.infrastructure.settings import get_settings
+from app.infrastructure.storage.blobs import get_blob_store, parse_blob_ref
+from app.presentation.api.dependencies import (
+    get_asset_repository,
+    get_current_user,
+)
+from app.presentation.api.multipart import (
+    MultipartError,
+    MultipartReader,
+    parse_boundary,
+)
+from app.presentation.schemas.assets import AssetResponse
+
+router = APIRouter(prefix="/assets", tags=["assets"])
+
+ASSET_FIELD = "file"
+# Запас на границы и заголовки частей сверх размера файла.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_201_CREATED,
+    response_model=AssetResponse,
+)
+async def upload_asset(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    assets: AssetRepository = Depends(get_asset_repository),
+    current_user: User = Depends(get_current_user),
+) -> AssetResponse:
+    """Загрузить файл (поле file) потоком на диск; вернуть ID ассета.
+
+    ID принимают только запросы загрузившего пользователя.
+    """
+    max_bytes = get_settings().asset_max_bytes
+    try:
+        boundary = parse_boundary(request.headers.get("content-type", ""))
+    except MultipartError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=str(exc),
+        )
+    content_length = request.headers.get("content-length")
+    if (
+        content_length
+        and content_length.isdigit()
+        and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail="asset too large",
+        )
+    # Соединение с БД не нужно на время загрузки.
+    await session.commit()
+
+    reader = MultipartReader(request.stream(), boundary)
+    try:
+        while (part := await reader.next_part()) is not None:
+            if part.name != ASSET_FIELD:
+                continue
+            asset_id, size = await get_blob_store().put_stream(
+                reader.iter_body(), part.content_type or "", max_bytes
+            )
+            _, media_type = parse_blob_ref(asset_id)
+            await assets.add(current_user.id, asset_id)
+            return AssetResponse(
+                asset_id=asset_id,
+                media_type=media_type,
+                size_bytes=size,
+            )
+    except MultipartError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        )
+    except BlobTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail="asset too large",
+        )
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"missing {ASSET_FIELD} field",
+    )
@@ -1,38 +1,115 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.application.use_cases.auth import AuthService
 from app.application.use_cases.generations import (
+    GenerationRequest,
     GenerationService,
     InsufficientBalance,
 )
-from app.domain.entities import GenerationKind, GenerationStatus, User
+from app.domain.entities import (
+    GenerationJob,
+    GenerationKind,
+    GenerationStatus,
+    User,
+)
 from app.infrastructure.background import maybe_run_background
-from app.infrastructure.db.base import get_session
+from app.infrastructure.db.base import AsyncSessionLocal, get_session
+from app.infrastructure.db.repositories import (
+    SQLAlchemyGenerationJobRepository,
+)
+from app.infrastructure.events.bus import (
+    JobEvent,
+    UserSubscription,
+    job_events,
+)
 from app.infrastructure.fal.client import HttpFalClient
+from app.infrastructure.fal.routing import get_model_router
+from app.infrastructure.media.mirror import iter_media_items
+from app.infrastructure.storage.blobs import get_blob_store, parse_blob_ref
 from app.infrastructure.tasks.generations import (
     build_cancel_url,
+    fanout_size,
     run_generation_job,
+    run_generation_jobs,
 )
+from app.infrastructure.tasks.hedging import HEDGE_ROLE
 from app.presentation.api.dependencies import (
+    get_auth_service,
     get_current_user,
     get_generation_service,
 )
+from app.presentation.api.etag import (
+    CACHE_CONTROL,
+    IMMUTABLE_CACHE_CONTROL,
+    etag_matches,
+    job_etag,
+    media_etag,
+    page_etag,
+)
+from app.presentation.api.media import public_result, thumbnail_urls
 from app.presentation.schemas.common import (
+    MAX_STATUS_IDS,
     GenerationBaseResponse,
     GenerationDetailResponse,
+    GenerationEventResponse,
+    JobStatusesRequest,
+    JobStatusesResponse,
+    JobStatusFrame,
+    JobSubscriptionMessage,
     ListGenerationsResponse,
+    decode_cursor,
+    encode_cursor,
 )
 from app.presentation.schemas.generations import (
+    BatchGenerationRequest,
+    BatchGenerationResponse,
     ImageToImageRequest,
     ImageToVideoRequest,
+    PipelineResponse,
     TextToImageRequest,
+    TextToImageToVideoRequest,
     TextToVideoRequest,
 )
 
 router = APIRouter(prefix="/generations", tags=["generations"])
 
+SSE_HEARTBEAT_SECONDS = 15.0
+SSE_RETRY_MILLISECONDS = 3000
+WS_SEND_QUEUE_SIZE = 256
+# Предел явных подписок на соединение: MAX_STATUS_IDS ограничивает
+# только одно сообщение.
+WS_MAX_SUBSCRIBED_IDS = 10 * MAX_STATUS_IDS
+PENDING_CHILD_STATUSES = frozenset(
+    {GenerationStatus.SUBMITTED.value, GenerationStatus.IN_QUEUE.value}
+)
+
+
+def fanout_children(job) -> list[dict[str, Any]]:
+    """Дочерние запросы разбитой задачи (без записи дубля)."""
+    return [
+        child
+        for child in job.children_json or []
+        if child.get("role") != HEDGE_ROLE
+    ]
+
 
 def job_response(job) -> GenerationBaseResponse:
     """Краткий ответ по задаче."""
@@ -53,11 +130,38 @@ def detail_response(job) -> GenerationDetailResponse:
         status=job.status,
         cost_tokens=job.cost_tokens,
         fal_request_id=job.fal_request_id,
-        result=job.result_json,
+        result=public_result(job.id, job.result_json),
+        thumbnails=thumbnail_urls(job.id, job.result_json),
+        children=[child["status"] for child in fanout_children(job)] or None,
         error_message=job.error_message,
     )
 
 
+def summary_response(job) -> GenerationDetailResponse:
+    """Ответ по задаче без тяжёлого result."""
+    return GenerationDetailResponse(
+        job_id=job.id,
+        type=job.kind,
+        model_id=job.model_id,
+        status=job.status,
+        cost_tokens=job.cost_tokens,
+        fal_request_id=job.fal_request_id,
+        error_message=job.error_message,
+    )
+
+
+def schedule_job(request: Request, job: GenerationJob) -> None:
+    """Запустить генерацию в фоне, если задача ещё ждёт отправки."""
+    if job.status != GenerationStatus.QUEUED:
+        return
+    maybe_run_background(
+        request.app.state.task_manager,
+        lambda: run_generation_job(
+            job.id, request.app.state.fal_client_factory
+        ),
+    )
+
+
 @router.post(
     "/images/text-to-image",
     status_code=status.HTTP_202_ACCEPTED,
@@ -75,7 +179,7 @@ async def create_text_to_image(
         job = await service.create_job(
             current_user,
             GenerationKind.TEXT_TO_IMAGE,
-            "fal-ai/wan-25-preview/text-to-image",
+            get_model_router().choose(GenerationKind.TEXT_TO_IMAGE),
             payload.model_dump(exclude_none=True),
         )
     except InsufficientBalance:
@@ -84,12 +188,7 @@ async def create_text_to_image(
             detail="insufficient balance",
         )
     await session.commit()
-    maybe_run_background(
-        request.app.state.task_manager,
-        lambda: run_generation_job(
-            job.id, request.app.state.fal_client_factory
-        ),
-    )
+    schedule_job(request, job)
     return job_response(job)
 
 
@@ -110,7 +209,7 @@ async def create_image_to_image(
         job = await service.create_job(
             current_user,
             GenerationKind.IMAGE_TO_IMAGE,
-            "fal-ai/wan-25-preview/image-to-image",
+            get_model_router().choose(GenerationKind.IMAGE_TO_IMAGE),
             payload.model_dump(exclude_none=True),
         )
     except InsufficientBalance:
@@ -119,12 +218,7 @@ async def create_image_to_image(
             detail="insufficient balance",
         )
     await session.commit()
-    maybe_run_background(
-        request.app.state.task_manager,
-        lambda: run_generation_job(
-            job.id, request.app.state.fal_client_factory
-        ),
-    )
+    schedule_job(request, job)
     return job_response(job)
 
 
@@ -145,7 +239,7 @@ async def create_text_to_video(
         job = await service.create_job(
             current_user,
             GenerationKind.TEXT_TO_VIDEO,
-            "fal-ai/wan-25-preview/text-to-video",
+            get_model_router().choose(GenerationKind.TEXT_TO_VIDEO),
             payload.model_dump(exclude_none=True),
             duration=payload.duration,
         )
@@ -155,12 +249,7 @@ async def create_text_to_video(
             detail="insufficient balance",
         )
     await session.commit()
-    maybe_run_background(
-        request.app.state.task_manager,
-        lambda: run_generation_job(
-            job.id, request.app.state.fal_client_factory
-        ),
-    )
+    schedule_job(request, job)
     return job_response(job)
 
 
@@ -181,7 +270,7 @@ async def create_image_to_video(
         job = await service.create_job(
             current_user,
             GenerationKind.IMAGE_TO_VIDEO,
-            "fal-ai/wan-25-preview/image-to-video",
+            get_model_router().choose(GenerationKind.IMAGE_TO_VIDEO),
             payload.model_dump(exclude_none=True),
             duration=payload.duration,
         )
@@ -191,41 +280,577 @@ async def create_image_to_video(
             detail="insufficient balance",
         )
     await session.commit()
-    maybe_run_background(
-        request.app.state.task_manager,
-        lambda: run_generation_job(
-            job.id, request.app.state.fal_client_factory
+    schedule_job(request, job)
+    return job_response(job)
+
+
+@router.post(
+    "/batch",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=BatchGenerationResponse,
+)
+async def create_generation_batch(
+    payload: BatchGenerationRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+) -> BatchGenerationResponse:
+    """Пачка генераций разных типов одним списанием."""
+    requests = [
+        GenerationRequest(
+            item.type,
+            get_model_router().choose(item.type),
+            item.model_dump(exclude={"type"}, exclude_none=True),
+            duration=getattr(item, "duration", None),
+        )
+        for item in payload.items
+    ]
+    try:
+        batch_id, jobs = await service.create_jobs(current_user, requests)
+    except InsufficientBalance:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="insufficient balance",
+        )
+    await session.commit()
+    queued = [job.id for job in jobs if job.status == GenerationStatus.QUEUED]
+    if queued:
+        maybe_run_background(
+            request.app.state.task_manager,
+            lambda: run_generation_jobs(
+                queued, request.app.state.fal_client_factory
+            ),
+        )
+    return BatchGenerationResponse(
+        batch_id=batch_id,
+        cost_tokens=sum(job.cost_tokens for job in jobs),
+        items=[job_response(job) for job in jobs],
+    )
+
+
+@router.post(
+    "/pipelines/text-to-image-to-video",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=PipelineResponse,
+)
+async def create_text_to_image_to_video(
+    payload: TextToImageToVideoRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+) -> PipelineResponse:
+    """Текст в изображение, затем изображение в видео без участия клиента."""
+    stages = [
+        GenerationRequest(
+            GenerationKind.TEXT_TO_IMAGE,
+            get_model_router().choose(GenerationKind.TEXT_TO_IMAGE),
+            payload.image.model_dump(exclude_none=True),
+        ),
+        GenerationRequest(
+            GenerationKind.IMAGE_TO_VIDEO,
+            get_model_router().choose(GenerationKind.IMAGE_TO_VIDEO),
+            payload.video.model_dump(exclude_none=True),
+            duration=payload.video.duration,
         ),
+    ]
+    try:
+        pipeline_id, jobs = await service.create_pipeline(current_user, stages)
+    except InsufficientBalance:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="insufficient balance",
+        )
+    await session.commit()
+    # Следующие этапы запускает воркер по завершении предыдущего.
+    schedule_job(request, jobs[0])
+    return pipeline_response(pipeline_id, jobs, summary_response)
+
+
+@router.get("/pipelines/{pipeline_id}", response_model=PipelineResponse)
+async def get_pipeline(
+    pipeline_id: UUID,
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+) -> PipelineResponse:
+    """Конвейер со статусом каждого этапа."""
+    jobs = await service.get_pipeline(pipeline_id, current_user)
+    if not jobs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="pipeline not found",
+        )
+    return pipeline_response(pipeline_id, jobs, detail_response)
+
+
+def pipeline_response(
+    pipeline_id: UUID,
+    jobs: list[GenerationJob],
+    render: Callable[[GenerationJob], GenerationDetailResponse],
+) -> PipelineResponse:
+    """Ответ по конвейеру: статус — первого незавершённого этапа."""
+    current = next(
+        (job for job in jobs if job.status != GenerationStatus.COMPLETED),
+        jobs[-1],
+    )
+    return PipelineResponse(
+        pipeline_id=pipeline_id,
+        status=current.status,
+        cost_tokens=sum(job.cost_tokens for job in jobs),
+        stages=[render(job) for job in jobs],
+    )
+
+
+@router.get("/status", response_model=JobStatusesResponse)
+async def get_generation_statuses(
+    ids: list[str] = Query(..., description="ID задач, через запятую"),
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+) -> JobStatusesResponse:
+    """Статусы нескольких задач."""
+    try:
+        job_ids = list(
+            dict.fromkeys(
+                UUID(part)
+                for value in ids
+                for part in value.split(",")
+                if part.strip()
+            )
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="invalid job id"
+        )
+    if len(job_ids) > MAX_STATUS_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"at most {MAX_STATUS_IDS} ids",
+        )
+    statuses = await service.get_statuses(job_ids, current_user)
+    return JobStatusesResponse(statuses=statuses)
+
+
+@router.post("/status", response_model=JobStatusesResponse)
+async def post_generation_statuses(
+    payload: JobStatusesRequest,
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+) -> JobStatusesResponse:
+    """Статусы нескольких задач (ID в теле запроса)."""
+    job_ids = list(dict.fromkeys(payload.ids))
+    statuses = await service.get_statuses(job_ids, current_user)
+    return JobStatusesResponse(statuses=statuses)
+
+
+def not_modified(etag: str) -> Response:
+    """Ответ 304 без тела."""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
     )
-    return job_response(job)
 
 
 @router.get("/{job_id}", response_model=GenerationDetailResponse)
 async def get_generation(
     job_id: UUID,
+    response: Response,
     current_user: User = Depends(get_current_user),
     service: GenerationService = Depends(get_generation_service),
-) -> GenerationDetailResponse:
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+) -> GenerationDetailResponse | Response:
     """Получить задачу."""
+    if if_none_match:
+        # Лёгкий запрос только updated_at: неизменённый опрос не читает
+        # и не сериализует result_json.
+        version = await service.get_job_version(job_id, current_user)
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="job not found"
+            )
+        etag = job_etag(job_id, version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
     job = await service.get_job(job_id, current_user)
     if not job:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="job not found"
         )
+    response.headers["ETag"] = job_etag(job.id, job.updated_at)
+    response.headers["Cache-Control"] = CACHE_CONTROL
     return detail_response(job)
 
 
-@router.get("", response_model=ListGenerationsResponse)
+@router.api_route(
+    "/{job_id}/media/{index}",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+)
+async def get_generation_media(
+    job_id: UUID,
+    index: int,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+) -> Response:
+    """Скопированный медиафайл задачи (с поддержкой Range)."""
+    item = await _media_item(job_id, index, session, current_user, service)
+    return blob_file_response(item.get("blob"), if_none_match)
+
+
+@router.api_route(
+    "/{job_id}/media/{index}/thumbnail",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+)
+async def get_generation_thumbnail(
+    job_id: UUID,
+    index: int,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+) -> Response:
+    """Миниатюра изображения задачи."""
+    item = await _media_item(job_id, index, session, current_user, service)
+    thumbnail = item.get("thumbnail") or {}
+    return blob_file_response(thumbnail.get("blob"), if_none_match)
+
+
+async def _media_item(
+    job_id: UUID,
+    index: int,
+    session: AsyncSession,
+    current_user: User,
+    service: GenerationService,
+) -> dict:
+    job = await service.get_job(job_id, current_user)
+    # Соединение с БД не нужно на время отдачи файла.
+    await session.commit()
+    items = iter_media_items(job.result_json) if job else []
+    if not 0 <= index < len(items):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="media not found"
+        )
+    return items[index]
+
+
+def blob_file_response(
+    ref: str | None,
+    if_none_match: str | None,
+) -> Response:
+    """Файл хранилища по ссылке blob: с ETag по хэшу."""
+    if ref is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="media not found"
+        )
+    digest, media_type = parse_blob_ref(ref)
+    etag = media_etag(digest)
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+    path = get_blob_store().path_for(digest)
+    if not path.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="media not found"
+        )
+    # FileResponse сам обрабатывает Range/If-Range и отдаёт файл кусками
+    # (или через http.response.pathsend, если сервер его поддерживает).
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def sse_message(job_event: JobEvent) -> str:
+    """Событие задачи в формате SSE."""
+    data = GenerationEventResponse(
+        job_id=job_event.job_id,
+        status=job_event.status,
+        result=public_result(job_event.job_id, job_event.result_json),
+        error_message=job_event.error_message,
+    ).model_dump_json()
+    return f"id: {job_event.event_id}\nevent: status\ndata: {data}\n\n"
+
+
+def event_state(job_event: JobEvent) -> tuple[Any, ...]:
+    """Видимое клиенту состояние события: статус и данные."""
+    return (
+        job_event.status,
+        job_event.result_json,
+        job_event.error_message,
+    )
+
+
+async def _load_event(job_event: JobEvent) -> JobEvent:
+    """Дочитать результат для события из другого процесса."""
+    async with AsyncSessionLocal() as session:
+        job = await SQLAlchemyGenerationJobRepository(session).get(
+            job_event.job_id
+        )
+    if job is None:
+        return job_event
+    return JobEvent(
+        job_id=job.id,
+        user_id=job.user_id,
+        status=job.status,
+        updated_at=job.updated_at,
+        result_json=job.result_json,
+        error_message=job.error_message,
+    )
+
+
+async def job_event_stream(
+    job: GenerationJob,
+    queue: asyncio.Queue[JobEvent],
+    last_event_id: int,
+    heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """Поток SSE: текущее состояние, затем переходы до финального."""
+    try:
+        yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+        current = JobEvent(
+            job_id=job.id,
+            user_id=job.user_id,
+            status=job.status,
+            updated_at=job.updated_at,
+            result_json=job.result_json,
+            error_message=job.error_message,
+        )
+        if current.event_id > last_event_id:
+            yield sse_message(current)
+            last_event_id = current.event_id
+        if current.is_terminal:
+            return
+
+        # Частичные результаты веерной задачи приходят без смены статуса.
+        fanout = fanout_size(job) > 1
+        last_state = event_state(current)
+        while True:
+            try:
+                job_event = await asyncio.wait_for(
+                    queue.get(), heartbeat_seconds
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if job_event.event_id <= last_event_id:
+                continue
+            last_event_id = job_event.event_id
+            if job_event.partial and (job_event.is_terminal or fanout):
+                job_event = await _load_event(job_event)
+            # Воркер повторяет одно и то же состояние на каждом опросе fal.
+            state = event_state(job_event)
+            if state == last_state and not job_event.is_terminal:
+                continue
+            last_state = state
+            yield sse_message(job_event)
+            if job_event.is_terminal:
+                return
+    finally:
+        job_events.unsubscribe(job.id, queue)
+
+
+@router.get("/{job_id}/events", response_class=StreamingResponse)
+async def stream_generation_events(
+    job_id: UUID,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    service: GenerationService = Depends(get_generation_service),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+) -> StreamingResponse:
+    """Поток событий статуса задачи (SSE)."""
+    # Подписка до чтения из БД, чтобы не потерять переход между ними.
+    queue = job_events.subscribe(job_id)
+    try:
+        job = await service.get_job(job_id, current_user)
+        # Соединение с БД не нужно на всё время жизни потока.
+        await session.commit()
+    except Exception:
+        job_events.unsubscribe(job_id, queue)
+        raise
+    if not job:
+        job_events.unsubscribe(job_id, queue)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="job not found"
+        )
+    try:
+        resume_from = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        resume_from = 0
+    return StreamingResponse(
+        job_event_stream(job, queue, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _send_job_frames(
+    websocket: WebSocket,
+    subscription: UserSubscription,
+) -> None:
+    """Отправлять кадры из очереди подписки."""
+    while True:
+        job_event = await subscription.queue.get()
+        if job_event is None:
+            await websocket.close(
+                code=status.WS_1013_TRY_AGAIN_LATER, reason="slow consumer"
+            )
+            return
+        frame = JobStatusFrame(
+            job_id=job_event.job_id,
+            status=job_event.status,
+            error_message=job_event.error_message,
+        )
+        await websocket.send_text(frame.model_dump_json(exclude_none=True))
+
+
+async def _receive_job_subscriptions(
+    websocket: WebSocket,
+    subscription: UserSubscription,
+) -> None:
+    """Применять подписки клиента; на явные ID отдавать текущий статус."""
+    while True:
+        raw = await websocket.receive_text()
+        try:
+            message = JobSubscriptionMessage.model_validate_json(raw)
+        except ValidationError:
+            await websocket.send_json(
+                {"type": "error", "detail": "invalid message"}
+            )
+            continue
+
+        if message.action == "unsubscribe":
+            subscription.job_ids.difference_update(message.job_ids)
+            if message.all:
+                subscription.all_jobs = False
+            await websocket.send_json({"type": "ack", "action": "unsubscribe"})
+            continue
+
+        new_ids = set(message.job_ids) - subscription.job_ids
+        if len(subscription.job_ids) + len(new_ids) > WS_MAX_SUBSCRIBED_IDS:
+            await websocket.send_json(
+                {
+                    "type": "error",
+                    "detail": f"at most {WS_MAX_SUBSCRIBED_IDS} job ids"
+                    " per connection",
+                }
+            )
+            continue
+        subscription.job_ids.update(new_ids)
+        subscription.all_jobs = subscription.all_jobs or message.all
+        await websocket.send_json({"type": "ack", "action": "subscribe"})
+        if message.job_ids:
+            async with AsyncSessionLocal() as session:
+                jobs = SQLAlchemyGenerationJobRepository(session)
+                statuses = await jobs.statuses_for_user(
+                    subscription.user_id, message.job_ids
+                )
+            for job_id, job_status in statuses.items():
+                frame = JobStatusFrame(job_id=job_id, status=job_status)
+                await websocket.send_text(
+                    frame.model_dump_json(exclude_none=True)
+                )
+
+
+@router.websocket("/ws")
+async def generations_websocket(
+    websocket: WebSocket,
+    session: AsyncSession = Depends(get_session),
+    auth_service: AuthService = Depends(get_auth_service),
+) -> None:
+    """Подписка на статусы задач пользователя по WebSocket."""
+    api_key = websocket.headers.get("X-API-Key")
+    user = await auth_service.authenticate(api_key) if api_key else None
+    # Соединение с БД не нужно на всё время жизни сокета.
+    await session.commit()
+    if not user:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="invalid api key"
+        )
+        return
+
+    await websocket.accept()
+    subscription = job_events.subscribe_user(user.id, WS_SEND_QUEUE_SIZE)
+    tasks = [
+        asyncio.create_task(_send_job_frames(websocket, subscription)),
+        asyncio.create_task(
+            _receive_job_subscriptions(websocket, subscription)
+        ),
+    ]
+    try:
+        done, pending = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                raise exc
+    finally:
+        job_events.unsubscribe_user(subscription)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.get(
+    "",
+    response_model=ListGenerationsResponse,
+    response_model_exclude_unset=True,
+)
 async def list_generations(
+    response: Response,
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None),
+    view: Literal["full", "summary"] = Query("full"),
     current_user: User = Depends(get_current_user),
     service: GenerationService = Depends(get_generation_service),
-) -> ListGenerationsResponse:
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+) -> ListGenerationsResponse | Response:
     """Список задач."""
-    jobs = await service.list_jobs(current_user, limit, offset)
-    items = [detail_response(job) for job in jobs]
-    return ListGenerationsResponse(items=items, limit=limit, offset=offset)
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="invalid cursor",
+            )
+    etag_params = (view, limit, offset, cursor)
+    if if_none_match:
+        versions = await service.list_job_versions(
+            current_user, limit, offset, after
+        )
+        etag = page_etag(versions, *etag_params)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    with_payloads = view == "full"
+    jobs = list(
+        await service.list_jobs(
+            current_user, limit, offset, after, with_payloads
+        )
+    )
+    to_response = detail_response if with_payloads else summary_response
+    items = [to_response(job) for job in jobs]
+    next_cursor = (
+        encode_cursor(jobs[-1].created_at, jobs[-1].id)
+        if len(jobs) == limit
+        else None
+    )
+    response.headers["ETag"] = page_etag(
+        ((job.id, job.updated_at) for job in jobs), *etag_params
+    )
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return ListGenerationsResponse(
+        items=items,
+        limit=limit,
+        offset=offset,
+        next_cursor=next_cursor,
+    )
 
 
 @router.post("/{job_id}/cancel", response_model=GenerationDetailResponse)
@@ -251,20 +876,39 @@ async def cancel_generation(
             detail="cannot cancel finished job",
         )
 
-    if job.fal_request_id and job.status in {
+    cancel_urls = []
+    children = fanout_children(job)
+    if children:
+        # Разбитая задача: отменяются все ещё ожидающие дочерние запросы.
+        cancel_urls = [
+            child["cancel_url"]
+            for child in children
+            if child["status"] in PENDING_CHILD_STATUSES
+        ]
+    elif job.fal_request_id and job.status in {
         GenerationStatus.IN_QUEUE,
         GenerationStatus.SUBMITTED,
     }:
+        cancel_urls = [
+            job.cancel_url
+            or build_cancel_url(job.model_id, job.fal_request_id)
+        ]
+    # Дубль, ещё ждущий в очереди fal, отменяется вместе с задачей.
+    cancel_urls += [
+        child["cancel_url"]
+        for child in job.children_json or []
+        if child.get("role") == HEDGE_ROLE
+        and child["status"] in PENDING_CHILD_STATUSES
+    ]
+    if cancel_urls:
         fal_client = (
             request.app.state.fal_client_factory()
             if request.app.state.fal_client_factory
             else HttpFalClient()
         )
         try:
-            cancel_url = job.cancel_url or build_cancel_url(
-                job.model_id, job.fal_request_id
-            )
-            await fal_client.cancel(cancel_url)
+            for cancel_url in cancel_urls:
+                await fal_client.cancel(cancel_url)
         finally:
             await fal_client.client.aclose()
     await service.refund_job(
@@ -1,5 +1,17 @@
+from typing import Any
+
 from fastapi import APIRouter
 
+from app.infrastructure.cache.jobs import terminal_jobs
+from app.infrastructure.cache.results import result_cache_stats
+from app.infrastructure.cache.singleflight import read_flights
+from app.infrastructure.cache.users import users_cache
+from app.infrastructure.fal.routing import get_model_router
+from app.infrastructure.media.mirror import get_media_mirror
+from app.infrastructure.media.thumbnails import get_thumbnail_generator
+from app.infrastructure.tasks.hedging import get_hedge_policy
+from app.infrastructure.tasks.limits import get_concurrency_limiter
+
 router = APIRouter(tags=["health"])
 
 
@@ -7,3 +19,34 @@ router = APIRouter(tags=["health"])
 async def healthcheck() -> dict[str, str]:
     """Проверка состояния."""
     return {"status": "ok"}
+
+
+@router.get("/healthz/models")
+async def model_concurrency() -> dict[str, Any]:
+    """Занятые и ожидающие слоты моделей fal в этом процессе."""
+    limiter = get_concurrency_limiter()
+    return {
+        "models": limiter.snapshot(),
+        "submissions": limiter.queue_snapshot(),
+    }
+
+
+@router.get("/healthz/metrics")
+async def process_metrics() -> dict[str, Any]:
+    """Счётчики кэшей и фоновых компонентов этого процесса.
+
+    Выключенный компонент отдаётся как null.
+    """
+    mirror = get_media_mirror()
+    hedging = get_hedge_policy()
+    thumbnails = get_thumbnail_generator()
+    return {
+        "result_cache": result_cache_stats.snapshot(),
+        "terminal_jobs": terminal_jobs.stats(),
+        "users_cache": users_cache.stats(),
+        "read_flights": read_flights.stats(),
+        "media_mirror": mirror.stats.snapshot() if mirror else None,
+        "thumbnails": thumbnails.stats.snapshot() if thumbnails else None,
+        "hedging": hedging.metrics.snapshot() if hedging else None,
+        "model_router": get_model_router().snapshot(),
+    }
@@ -1,12 +1,37 @@
-from fastapi import APIRouter, Depends, Header
+import logging
+from typing import AsyncIterator
 
-from app.application.use_cases.webhook import WebhookTopupService
+from fastapi import APIRouter, Depends, Header, Request
+from pydantic import ValidationError
+
+from app.application.use_cases.webhook import TopupEvent, WebhookTopupService
 from app.infrastructure.security.webhook import verify_webhook_secret
-from app.presentation.api.dependencies import get_webhook_service
-from app.presentation.schemas.webhook import OkResponse, TopupRequest
+from app.presentation.api.dependencies import (
+    WebhookServiceScope,
+    get_webhook_service,
+    get_webhook_service_scope,
+)
+from app.presentation.api.streaming import (
+    DuplexStreamingResponse,
+    iter_json_array,
+    iter_ndjson,
+)
+from app.presentation.schemas.webhook import (
+    OkResponse,
+    TopupBatchItem,
+    TopupBatchResult,
+    TopupRequest,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
+TOPUP_BATCH_CHUNK_SIZE = 500
+# Событие — несколько полей; строка длиннее — ошибка клиента.
+TOPUP_BATCH_MAX_ITEM_BYTES = 16 * 1024
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 
 @router.post(
     "/topup",
@@ -23,3 +48,127 @@ async def webhook_topup(
         payload.external_user_id, payload.amount, x_event_id
     )
     return OkResponse(ok=True)
+
+
+@router.post(
+    "/topup/batch",
+    response_class=DuplexStreamingResponse,
+    dependencies=[Depends(verify_webhook_secret)],
+)
+async def webhook_topup_batch(
+    request: Request,
+    service_scope: WebhookServiceScope = Depends(get_webhook_service_scope),
+) -> DuplexStreamingResponse:
+    """Обработать пачку пополнений (JSON-массив или NDJSON)."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(NDJSON_MEDIA_TYPE):
+        source = iter_ndjson(request.stream(), TOPUP_BATCH_MAX_ITEM_BYTES)
+    else:
+        source = iter_json_array(request.stream(), TOPUP_BATCH_MAX_ITEM_BYTES)
+    return DuplexStreamingResponse(
+        _stream_topup_batch(source, service_scope),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
+
+
+async def _apply_chunk(
+    service_scope: WebhookServiceScope,
+    chunk: list[tuple[int, TopupBatchItem]],
+) -> list[TopupBatchResult]:
+    """Зачислить кусок пачки в отдельной транзакции.
+
+    Если кусок целиком откатился, события повторяются по одному:
+    зачисление идемпотентно по event_id, а ошибка достаётся только
+    сломанному событию.
+    """
+    try:
+        async with service_scope() as service:
+            credited = await service.handle_topup_batch(
+                [_event(item) for _, item in chunk]
+            )
+    except Exception as exc:
+        if len(chunk) == 1:
+            index, item = chunk[0]
+            logger.error(
+                "topup_batch_event_failed",
+                extra={"event_id": item.event_id, "error": str(exc)},
+            )
+            return [
+                TopupBatchResult(
+                    index=index,
+                    event_id=item.event_id,
+                    status="error",
+                    error="internal error",
+                )
+            ]
+        logger.warning(
+            "topup_batch_chunk_failed",
+            extra={"size": len(chunk), "error": str(exc)},
+        )
+        results: list[TopupBatchResult] = []
+        for entry in chunk:
+            results += await _apply_chunk(service_scope, [entry])
+        return results
+    return [
+        TopupBatchResult(
+            index=index,
+            event_id=item.event_id,
+            status="credited" if ok else "duplicate",
+        )
+        for (index, item), ok in zip(chunk, credited)
+    ]
+
+
+def _event(item: TopupBatchItem) -> TopupEvent:
+    return TopupEvent(
+        external_user_id=item.external_user_id,
+        amount=item.amount,
+        event_id=item.event_id,
+    )
+
+
+async def _stream_topup_batch(
+    source: AsyncIterator[bytes],
+    service_scope: WebhookServiceScope,
+) -> AsyncIterator[str]:
+    """Обработать пачку кусками и отдавать результаты по мере готовности.
+
+    Если тело ломается после начала ответа, уже разобранный кусок всё
+    равно зачисляется и попадает в ответ до обрыва. До первой строки
+    ответа клиент получает ошибку целиком, и ни одно событие не
+    зачислено.
+    """
+    chunk: list[tuple[int, TopupBatchItem]] = []
+    index = 0
+    streamed = False
+    try:
+        async for raw in source:
+            try:
+                item = TopupBatchItem.model_validate_json(raw)
+            except ValidationError as exc:
+                invalid = TopupBatchResult(
+                    index=index,
+                    status="invalid",
+                    error=str(exc.errors(include_url=False)[0]["msg"]),
+                )
+                streamed = True
+                yield invalid.model_dump_json() + "\n"
+                index += 1
+                continue
+
+            chunk.append((index, item))
+            index += 1
+            if len(chunk) >= TOPUP_BATCH_CHUNK_SIZE:
+                streamed = True
+                for result in await _apply_chunk(service_scope, chunk):
+                    yield result.model_dump_json() + "\n"
+                chunk = []
+    except Exception:
+        if streamed and chunk:
+            for result in await _apply_chunk(service_scope, chunk):
+                yield result.model_dump_json() + "\n"
+        raise
+
+    if chunk:
+        for result in await _apply_chunk(service_scope, chunk):
+            yield result.model_dump_json() + "\n"
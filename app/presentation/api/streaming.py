@@ -0,0 +1,202 @@
+import re
+from typing import AsyncIterable, AsyncIterator
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+# Внутри строки значимы только кавычка и обратный слэш.
+_STRING_TOKENS = re.compile(rb'["\\]')
+_STRUCTURE_TOKENS = re.compile(rb'["\[\]{},]')
+_NON_SPACE = re.compile(rb"\S")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Потоковый ответ, читающий тело запроса во время отправки.
+
+    Стандартный ``StreamingResponse`` параллельно слушает ``receive`` ради
+    http.disconnect и отбирает у обработчика куски тела запроса. Здесь
+    отключение клиента проявляется как ``ClientDisconnect`` при чтении
+    ``request.stream()``.
+
+    Заголовки уходят вместе с первым куском ответа: ``HTTPException``,
+    поднятая до него (например, при разборе начала тела), превращается в
+    обычный ответ с ошибкой.
+    """
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        iterator = aiter(self.body_iterator)
+        try:
+            first = await anext(iterator)
+        except StopAsyncIteration:
+            self.body_iterator = _chain([], iterator)
+        except HTTPException as exc:
+            error = JSONResponse(
+                {"detail": exc.detail},
+                status_code=exc.status_code,
+                headers=exc.headers,
+            )
+            await error(scope, receive, send)
+            return
+        else:
+            self.body_iterator = _chain([first], iterator)
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _chain(
+    head: list[str | bytes], rest: AsyncIterator[str | bytes]
+) -> AsyncIterator[str | bytes]:
+    for chunk in head:
+        yield chunk
+    async for chunk in rest:
+        yield chunk
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        detail=f"batch item exceeds {max_bytes} bytes",
+    )
+
+
+async def iter_ndjson(
+    chunks: AsyncIterable[bytes], max_line_bytes: int
+) -> AsyncIterator[bytes]:
+    """Непустые строки NDJSON по мере чтения тела.
+
+    В памяти держится только незавершённый хвост; строка длиннее
+    ``max_line_bytes`` отклоняется с 413.
+    """
+    tail = bytearray()
+    async for chunk in chunks:
+        lines = chunk.split(b"\n")
+        tail += lines[0]
+        if len(lines) > 1:
+            complete = [bytes(tail), *lines[1:-1]]
+            tail = bytearray(lines[-1])
+            for line in complete:
+                if len(line) > max_line_bytes:
+                    raise _too_large(max_line_bytes)
+                if line.strip():
+                    yield line
+        if len(tail) > max_line_bytes:
+            raise _too_large(max_line_bytes)
+    if tail.strip():
+        yield bytes(tail)
+
+
+class JsonArraySplitter:
+    """Инкрементальное разбиение JSON-массива на сырые элементы.
+
+    Разбирается только структура верхнего уровня (скобки, строки,
+    запятые); сами элементы проверяет схема. Ошибка структуры —
+    ``ValueError``.
+    """
+
+    def __init__(self, max_item_bytes: int) -> None:
+        self.max_item_bytes = max_item_bytes
+        self._item = bytearray()
+        self._opened = False
+        self._closed = False
+        self._separated = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Принять кусок тела, вернуть завершённые элементы."""
+        items: list[bytes] = []
+        start = pos = 0
+        size = len(data)
+        while pos < size:
+            if self._closed:
+                if _NON_SPACE.search(data, pos):
+                    raise ValueError("data after the closing bracket")
+                return items
+            if not self._opened:
+                match = _NON_SPACE.search(data, pos)
+                if match is None:
+                    return items
+                if data[match.start()] != ord("["):
+                    raise ValueError("body is not a JSON array")
+                self._opened = True
+                start = pos = match.end()
+                continue
+            if self._escape:
+                self._escape = False
+                pos += 1
+                continue
+            if self._in_string:
+                match = _STRING_TOKENS.search(data, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if data[match.start()] == ord("\\"):
+                    self._escape = True
+                else:
+                    self._in_string = False
+                continue
+            match = _STRUCTURE_TOKENS.search(data, pos)
+            if match is None:
+                break
+            pos = match.end()
+            token = data[match.start()]
+            if token == ord('"'):
+                self._in_string = True
+            elif token in b"[{":
+                self._depth += 1
+            elif self._depth > 0 and token in b"]}":
+                self._depth -= 1
+            elif self._depth == 0 and token in b",]":
+                self._item += data[start : match.start()]
+                item = bytes(self._item).strip()
+                self._item.clear()
+                self._check(item)
+                # Пустой элемент между запятыми — ошибка элемента,
+                # пустой массив — просто конец, запятая перед
+                # закрывающей скобкой — ошибка структуры.
+                if token == ord("]") and not item and self._separated:
+                    raise ValueError("trailing comma in JSON array")
+                if item or token == ord(","):
+                    items.append(item)
+                start = pos
+                self._separated = token == ord(",")
+                self._closed = token == ord("]")
+        if self._opened and not self._closed:
+            self._item += data[start:size]
+            self._check(self._item)
+        return items
+
+    def close(self) -> None:
+        """Проверить, что массив закрыт."""
+        if not self._closed:
+            raise ValueError("unterminated JSON array")
+
+    def _check(self, item: bytes | bytearray) -> None:
+        if len(item) > self.max_item_bytes:
+            raise _too_large(self.max_item_bytes)
+
+
+async def iter_json_array(
+    chunks: AsyncIterable[bytes], max_item_bytes: int
+) -> AsyncIterator[bytes]:
+    """Элементы JSON-массива по мере чтения тела; 400 при ошибке."""
+    splitter = JsonArraySplitter(max_item_bytes)
+    try:
+        async for chunk in chunks:
+            for item in splitter.feed(chunk):
+                yield item
+        splitter.close()
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="batch body must be a JSON array",
+        ) from exc
@@ -7,14 +7,30 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
+from app.application.interfaces.blob_store import (
+    BlobNotFound,
+    InvalidDataUri,
+)
 from app.infrastructure.background import BackgroundTaskManager
+from app.infrastructure.cache.users import users_cache
+from app.infrastructure.db.base import engine
+from app.infrastructure.events.notify import (
+    BALANCE_EVENTS_CHANNEL,
+    JOB_EVENTS_CHANNEL,
+    PgNotificationListener,
+    make_balance_event_handler,
+    make_job_event_handler,
+)
 from app.infrastructure.fal.client import HttpFalClient
 from app.infrastructure.logging.config import (
     configure_logging,
     request_id_ctx_var,
 )
+from app.infrastructure.media.mirror import get_media_mirror
+from app.infrastructure.media.thumbnails import get_thumbnail_generator
 from app.infrastructure.settings import get_settings
 from app.presentation.api.routers import (
+    assets,
     auth,
     balance,
     generations,
@@ -37,10 +53,35 @@ async def lifespan(app: FastAPI):
     if not getattr(app.state, "fal_client_factory", None):
         app.state.fal_client_factory = HttpFalClient
 
+    if not getattr(app.state, "notification_listener", None):
+        app.state.notification_listener = None
+        if engine.dialect.name == "postgresql":
+            listener = PgNotificationListener(settings.database_url)
+            listener.add_handler(JOB_EVENTS_CHANNEL, make_job_event_handler())
+            listener.add_handler(
+                BALANCE_EVENTS_CHANNEL, make_balance_event_handler()
+            )
+            # Пропущенные за время переподключения уведомления не
+            # восстановить, поэтому кэш сбрасывается целиком.
+            listener.add_reset_handler(users_cache.clear)
+            app.state.notification_listener = listener
+    if app.state.notification_listener:
+        await app.state.notification_listener.start()
+
     try:
         yield
     finally:
+        if app.state.notification_listener:
+            await app.state.notification_listener.stop()
         await app.state.task_manager.shutdown()
+        if get_media_mirror.cache_info().currsize:
+            mirror = get_media_mirror()
+            if mirror is not None:
+                await mirror.aclose()
+        if get_thumbnail_generator.cache_info().currsize:
+            thumbnails = get_thumbnail_generator()
+            if thumbnails is not None:
+                thumbnails.shutdown()
 
 
 app = FastAPI(
@@ -77,6 +118,30 @@ async def correlation_middleware(
     return response
 
 
+@app.exception_handler(InvalidDataUri)
+async def invalid_data_uri_handler(
+    request: Request,
+    exc: InvalidDataUri,
+):
+    """Некорректный data: URI во входных данных."""
+    return JSONResponse(
+        status_code=422,
+        content={"detail": str(exc)},
+    )
+
+
+@app.exception_handler(BlobNotFound)
+async def blob_not_found_handler(
+    request: Request,
+    exc: BlobNotFound,
+):
+    """Ссылка на неизвестный ассет во входных данных."""
+    return JSONResponse(
+        status_code=422,
+        content={"detail": "unknown asset id"},
+    )
+
+
 @app.exception_handler(Exception)
 async def generic_exception_handler(
     request: Request,
@@ -90,6 +155,7 @@ async def generic_exception_handler(
     )
 
 
+app.include_router(assets.router)
 app.include_router(auth.router)
 app.include_router(health.router)
 app.include_router(balance.router)
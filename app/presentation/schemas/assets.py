@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class AssetResponse(BaseModel):
+    """Загруженный ассет."""
+
+    asset_id: str
+    media_type: str
+    size_bytes: int
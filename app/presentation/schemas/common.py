@@ -1,10 +1,19 @@
-from typing import Optional
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Literal, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, Field, HttpUrl, TypeAdapter
 
+from app.application.interfaces.blob_store import (
+    BLOB_REF_PREFIX,
+    BLOB_REF_RE,
+)
 from app.domain.entities import GenerationKind, GenerationStatus
 
+MAX_STATUS_IDS = 500
+
 
 class ImageSize(BaseModel):
     """Размер изображения."""
@@ -32,6 +41,8 @@ class GenerationDetailResponse(BaseModel):
     cost_tokens: int
     fal_request_id: str | None = None
     result: dict | None = None
+    thumbnails: list[str] | None = None
+    children: list[GenerationStatus] | None = None
     error_message: str | None = None
 
 
@@ -41,14 +52,61 @@ class ListGenerationsResponse(BaseModel):
     items: list[GenerationDetailResponse]
     limit: int
     offset: int
+    next_cursor: str | None = None
+
+
+class GenerationEventResponse(BaseModel):
+    """Событие изменения статуса генерации."""
+
+    job_id: UUID
+    status: GenerationStatus
+    result: dict | None = None
+    error_message: str | None = None
+
+
+class JobStatusesRequest(BaseModel):
+    """Запрос статусов нескольких задач."""
+
+    ids: list[UUID] = Field(..., min_length=1, max_length=MAX_STATUS_IDS)
+
+
+class JobStatusesResponse(BaseModel):
+    """Статусы задач; чужие и неизвестные ID отсутствуют."""
+
+    statuses: dict[UUID, GenerationStatus]
+
+
+class JobSubscriptionMessage(BaseModel):
+    """Сообщение клиента WebSocket: подписка или отписка."""
+
+    action: Literal["subscribe", "unsubscribe"]
+    job_ids: list[UUID] = Field(
+        default_factory=list, max_length=MAX_STATUS_IDS
+    )
+    all: bool = False
+
+
+class JobStatusFrame(BaseModel):
+    """Компактный кадр изменения статуса для WebSocket."""
+
+    type: Literal["status"] = "status"
+    job_id: UUID
+    status: GenerationStatus
+    error_message: str | None = None
 
 
 http_url_adapter = TypeAdapter(HttpUrl)
 
 
 def validate_data_or_url(value: str) -> str:
-    """Проверить data или URL."""
+    """Проверить data:, ID ассета (blob:) или URL."""
+    if value.startswith(BLOB_REF_PREFIX):
+        if not BLOB_REF_RE.match(value):
+            raise ValueError("invalid asset id")
+        return value
     if value.startswith("data:"):
+        if "," not in value:
+            raise ValueError("invalid data uri")
         return value
     http_url_adapter.validate_python(value)
     return value
@@ -57,3 +115,19 @@ def validate_data_or_url(value: str) -> str:
 def validate_url_list(urls: list[str]) -> list[str]:
     """Проверить список URL."""
     return [validate_data_or_url(v) for v in urls]
+
+
+def encode_cursor(created_at: datetime, job_id: UUID) -> str:
+    """Непрозрачный курсор по (created_at, id)."""
+    raw = json.dumps([created_at.isoformat(), str(job_id)])
+    return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Разобрать курсор; ValueError при неверном формате."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, job_id = json.loads(urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(job_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
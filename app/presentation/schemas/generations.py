@@ -1,8 +1,15 @@
-from typing import Literal, Optional
+from typing import Annotated, Literal, Optional
+from uuid import UUID
 
 from pydantic import BaseModel, Field, field_validator
 
-from app.presentation.schemas.common import ImageSize, validate_data_or_url
+from app.domain.entities import GenerationKind, GenerationStatus
+from app.presentation.schemas.common import (
+    GenerationBaseResponse,
+    GenerationDetailResponse,
+    ImageSize,
+    validate_data_or_url,
+)
 
 
 class TextToImageRequest(BaseModel):
@@ -67,11 +74,10 @@ class TextToVideoRequest(BaseModel):
         return value
 
 
-class ImageToVideoRequest(BaseModel):
-    """Запрос изображение→видео."""
+class ImageToVideoStage(BaseModel):
+    """Параметры изображение→видео без исходного изображения."""
 
     prompt: str = Field(..., max_length=800)
-    image_url: str
     audio_url: Optional[str] = None
     resolution: Optional[Literal["480p", "720p", "1080p"]] = None
     duration: int = Field(5)
@@ -80,12 +86,6 @@ class ImageToVideoRequest(BaseModel):
     seed: int | None = None
     enable_safety_checker: bool | None = None
 
-    @field_validator("image_url")
-    @classmethod
-    def validate_image(cls, value: str) -> str:
-        """Проверить URL изображения."""
-        return validate_data_or_url(value)
-
     @field_validator("audio_url")
     @classmethod
     def validate_audio(cls, value: str | None) -> str | None:
@@ -101,3 +101,83 @@ class ImageToVideoRequest(BaseModel):
         if value not in (5, 10):
             raise ValueError("duration must be 5 or 10")
         return value
+
+
+class ImageToVideoRequest(ImageToVideoStage):
+    """Запрос изображение→видео."""
+
+    image_url: str
+
+    @field_validator("image_url")
+    @classmethod
+    def validate_image(cls, value: str) -> str:
+        """Проверить URL изображения."""
+        return validate_data_or_url(value)
+
+
+MAX_BATCH_ITEMS = 500
+
+
+class BatchTextToImageItem(TextToImageRequest):
+    """Элемент пачки: текст→изображение."""
+
+    type: Literal[GenerationKind.TEXT_TO_IMAGE]
+
+
+class BatchImageToImageItem(ImageToImageRequest):
+    """Элемент пачки: изображение→изображение."""
+
+    type: Literal[GenerationKind.IMAGE_TO_IMAGE]
+
+
+class BatchTextToVideoItem(TextToVideoRequest):
+    """Элемент пачки: текст→видео."""
+
+    type: Literal[GenerationKind.TEXT_TO_VIDEO]
+
+
+class BatchImageToVideoItem(ImageToVideoRequest):
+    """Элемент пачки: изображение→видео."""
+
+    type: Literal[GenerationKind.IMAGE_TO_VIDEO]
+
+
+BatchItem = Annotated[
+    BatchTextToImageItem
+    | BatchImageToImageItem
+    | BatchTextToVideoItem
+    | BatchImageToVideoItem,
+    Field(discriminator="type"),
+]
+
+
+class BatchGenerationRequest(BaseModel):
+    """Пачка запросов генерации разных типов."""
+
+    items: list[BatchItem] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_ITEMS
+    )
+
+
+class BatchGenerationResponse(BaseModel):
+    """Ответ на пачку: ID пачки и задачи в порядке запроса."""
+
+    batch_id: UUID
+    cost_tokens: int
+    items: list[GenerationBaseResponse]
+
+
+class TextToImageToVideoRequest(BaseModel):
+    """Конвейер: изображение по тексту, затем видео из него."""
+
+    image: TextToImageRequest
+    video: ImageToVideoStage
+
+
+class PipelineResponse(BaseModel):
+    """Конвейер и его этапы по порядку."""
+
+    pipeline_id: UUID
+    status: GenerationStatus
+    cost_tokens: int
+    stages: list[GenerationDetailResponse]
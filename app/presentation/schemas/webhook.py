@@ -1,3 +1,4 @@
+from typing import Literal
 from uuid import UUID
 
 from pydantic import BaseModel, Field
@@ -14,3 +15,20 @@ class OkResponse(BaseModel):
     """OK-ответ."""
 
     ok: bool
+
+
+class TopupBatchItem(BaseModel):
+    """Элемент пачки пополнений."""
+
+    external_user_id: UUID
+    amount: int = Field(..., gt=0)
+    event_id: str = Field(..., min_length=1, max_length=255)
+
+
+class TopupBatchResult(BaseModel):
+    """Результат обработки элемента пачки."""
+
+    index: int
+    event_id: str | None = None
+    status: Literal["credited", "duplicate", "invalid", "error"]
+    error: str | None = None
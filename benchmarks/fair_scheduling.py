@@ -0,0 +1,133 @@
+"""Время до отправки у маленьких пользователей при всплеске тяжёлого.
+
+Запуск: ``python -m benchmarks.fair_scheduling --burst 5000``.
+Симуляция без fal и БД: задачи проходят через очередь отправки
+(``ModelConcurrencyLimiter``) и держат слот заданное время. Режим
+``fifo`` ставит всех в одну общую очередь — так очередь вела себя до
+справедливого планирования; ``fair`` — очереди по пользователям и
+полосам. Для сравнения выводится и прогон без всплеска.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("FAL_KEY", "bench")
+os.environ.setdefault("PAYMENT_WEBHOOK_SECRET", "bench")
+os.environ.setdefault("TOKEN_PRICES_JSON", "{}")
+
+from app.infrastructure.tasks.limits import (  # noqa: E402
+    IMAGE_LANE,
+    VIDEO_LANE,
+    ModelConcurrencyLimiter,
+)
+
+MODEL = "fal-ai/bench"
+VIDEO_COST = 50
+IMAGE_COST = 2
+
+
+def p95(samples: list[float]) -> float:
+    """95-й перцентиль."""
+    return statistics.quantiles(samples, n=20)[-1]
+
+
+async def run(
+    mode: str,
+    burst: int,
+    users: int,
+    rate: float,
+    capacity: int,
+    duration: float,
+    video_seconds: float,
+    image_seconds: float,
+) -> list[float]:
+    """Время до отправки (с) задач маленьких пользователей.
+
+    Каждый из users отправляет задачи изображений с частотой rate в
+    секунду в течение duration; тяжёлый пользователь в начале ставит
+    burst видеозадач.
+    """
+    limiter = ModelConcurrencyLimiter(capacity=capacity)
+    fair = mode == "fair"
+    waits: list[float] = []
+
+    async def job(user: str, lane: str, cost: int, hold: float) -> float:
+        started = time.perf_counter()
+        async with limiter.slot(
+            MODEL,
+            user_id=user if fair else None,
+            lane=lane if fair else IMAGE_LANE,
+            cost=cost,
+        ):
+            waited = time.perf_counter() - started
+            await asyncio.sleep(hold)
+        return waited
+
+    async def small_user(index: int) -> None:
+        rng = random.Random(index)
+        deadline = time.perf_counter() + duration
+        jobs = []
+        while time.perf_counter() < deadline:
+            user = f"small-{index}"
+            jobs.append(
+                asyncio.create_task(
+                    job(user, IMAGE_LANE, IMAGE_COST, image_seconds)
+                )
+            )
+            await asyncio.sleep(rng.expovariate(rate))
+        waits.extend(await asyncio.gather(*jobs))
+
+    heavy = [
+        asyncio.create_task(
+            job("heavy", VIDEO_LANE, VIDEO_COST, video_seconds)
+        )
+        for _ in range(burst)
+    ]
+    await asyncio.gather(*(small_user(i) for i in range(users)))
+    await asyncio.gather(*heavy)
+    return waits
+
+
+def main() -> None:
+    """Точка входа."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=100.0)
+    parser.add_argument("--capacity", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--video-ms", type=float, default=20.0)
+    parser.add_argument("--image-ms", type=float, default=4.0)
+    args = parser.parse_args()
+    runs = [
+        ("quiet", "fair", 0),
+        ("fifo", "fifo", args.burst),
+        ("fair", "fair", args.burst),
+    ]
+    for label, mode, burst in runs:
+        waits = asyncio.run(
+            run(
+                mode,
+                burst,
+                args.users,
+                args.rate,
+                args.capacity,
+                args.duration,
+                args.video_ms / 1000,
+                args.image_ms / 1000,
+            )
+        )
+        print(
+            f"{label:>5}: burst={burst} small_jobs={len(waits)}"
+            f" p50={statistics.median(waits) * 1000:.1f}ms"
+            f" p95={p95(waits) * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
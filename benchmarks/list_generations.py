@@ -0,0 +1,108 @@
+"""Время страницы GET /generations на глубине: offset против курсора.
+
+Запуск: ``python -m benchmarks.list_generations --jobs 50000``.
+Использует ``DATABASE_URL`` из окружения; без него — SQLite в памяти.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("FAL_KEY", "bench")
+os.environ.setdefault("PAYMENT_WEBHOOK_SECRET", "bench")
+os.environ.setdefault("TOKEN_PRICES_JSON", "{}")
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.domain.entities import (  # noqa: E402
+    GenerationKind,
+    GenerationStatus,
+)
+from app.infrastructure.db.base import (  # noqa: E402
+    AsyncSessionLocal,
+    Base,
+    engine,
+)
+from app.infrastructure.db.models import (  # noqa: E402
+    GenerationJobModel,
+    UserModel,
+)
+from app.infrastructure.db.repositories import (  # noqa: E402
+    SQLAlchemyGenerationJobRepository,
+)
+
+PAGE = 100
+
+
+async def seed(jobs: int):
+    """Создать пользователя с ``jobs`` задачами."""
+    if engine.dialect.name == "sqlite":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    user_id = uuid4()
+    base_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    async with AsyncSessionLocal() as session:
+        session.add(
+            UserModel(id=user_id, external_user_id=uuid4(), balance_tokens=0)
+        )
+        await session.flush()
+        rows = [
+            {
+                "id": uuid4(),
+                "user_id": user_id,
+                "kind": GenerationKind.TEXT_TO_IMAGE,
+                "model_id": "bench",
+                "status": GenerationStatus.COMPLETED,
+                "cost_tokens": 5,
+                "input_json": {"prompt": "bench"},
+                "created_at": base_time + timedelta(seconds=i),
+                "updated_at": base_time,
+            }
+            for i in range(jobs)
+        ]
+        for start in range(0, jobs, 5000):
+            await session.execute(
+                insert(GenerationJobModel), rows[start : start + 5000]
+            )
+        await session.commit()
+    return user_id
+
+
+async def run(jobs: int) -> None:
+    """Сравнить offset и курсор на разной глубине."""
+    user_id = await seed(jobs)
+    depths = [d for d in (0, 1_000, 10_000, 40_000) if d + PAGE <= jobs]
+    async with AsyncSessionLocal() as session:
+        repo = SQLAlchemyGenerationJobRepository(session)
+        for depth in depths:
+            started = time.perf_counter()
+            await repo.list_for_user(user_id, PAGE, depth)
+            offset_ms = (time.perf_counter() - started) * 1000
+
+            after = None
+            if depth:
+                # Курсор указывает на последнюю строку предыдущей страницы.
+                prev = list(await repo.list_for_user(user_id, 1, depth - 1))
+                after = (prev[0].created_at, prev[0].id)
+            started = time.perf_counter()
+            await repo.list_for_user(user_id, PAGE, 0, after)
+            cursor_ms = (time.perf_counter() - started) * 1000
+            print(
+                f"depth={depth:>6} offset={offset_ms:7.2f}ms "
+                f"cursor={cursor_ms:7.2f}ms"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--jobs", type=int, default=50_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.jobs))
+
+
+if __name__ == "__main__":
+    main()
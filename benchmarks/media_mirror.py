@@ -0,0 +1,99 @@
+"""Пропускная способность и пик памяти зеркалирования медиа.
+
+Запуск: ``python -m benchmarks.media_mirror --files 8 --size-mb 64``.
+Файлы отдаются потоком из памяти процесса (без сети), поэтому рост
+пикового RSS показывает, сколько держит в памяти сам конвейер.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("FAL_KEY", "bench")
+os.environ.setdefault("PAYMENT_WEBHOOK_SECRET", "bench")
+os.environ.setdefault("TOKEN_PRICES_JSON", "{}")
+
+import httpx  # noqa: E402
+
+from app.infrastructure.media.mirror import (  # noqa: E402
+    MediaMirror,
+    MirrorStats,
+)
+from app.infrastructure.storage.blobs import LocalBlobStore  # noqa: E402
+
+CHUNK_BYTES = 64 * 1024
+
+
+def source_transport(size: int) -> httpx.MockTransport:
+    """Источник: каждый файл — size байт, отдаваемых кусками."""
+    chunk = b"\xab" * CHUNK_BYTES
+
+    async def body(seed: bytes):
+        yield seed
+        sent = len(seed)
+        while sent < size:
+            part = chunk[: min(CHUNK_BYTES, size - sent)]
+            sent += len(part)
+            yield part
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seed = request.url.path.encode()
+        return httpx.Response(
+            200,
+            headers={"content-length": str(max(size, len(seed)))},
+            content=body(seed),
+        )
+
+    return httpx.MockTransport(handler)
+
+
+async def run(files: int, size: int, concurrency: int, per_job: int) -> None:
+    """Скопировать files файлов одной задачи и вывести метрики."""
+    with tempfile.TemporaryDirectory() as root:
+        mirror = MediaMirror(
+            LocalBlobStore(root),
+            max_concurrency=concurrency,
+            per_job_concurrency=per_job,
+            max_file_bytes=size * 2,
+            client=httpx.AsyncClient(transport=source_transport(size)),
+        )
+        result = {
+            "videos": [
+                {"url": f"https://fal.media/{i}.mp4"} for i in range(files)
+            ]
+        }
+        rss_before = MirrorStats.peak_rss_bytes()
+        started = time.perf_counter()
+        await mirror.mirror_result(uuid4(), result)
+        elapsed = time.perf_counter() - started
+        await mirror.aclose()
+
+    stats = mirror.stats.snapshot()
+    total_mb = stats["bytes"] / 1024 / 1024
+    print(f"files={stats['files']} failures={stats['failures']}")
+    print(f"total={total_mb:.1f} MiB wall={elapsed:.2f}s")
+    print(f"throughput={total_mb / elapsed:.1f} MiB/s")
+    print(f"peak_in_flight={stats['peak_in_flight']}")
+    growth = (stats["peak_rss_bytes"] - rss_before) / 1024 / 1024
+    print(f"peak_rss_growth={growth:.1f} MiB (file size {size >> 20} MiB)")
+
+
+def main() -> None:
+    """Точка входа."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--per-job", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(
+        run(args.files, args.size_mb << 20, args.concurrency, args.per_job)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Латентность вебхука пополнения (p50/p95/p99).
+
+Запуск: ``python -m benchmarks.webhook_topup --events 2000``.
+Использует ``DATABASE_URL`` из окружения; без него — SQLite в памяти.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("FAL_KEY", "bench")
+os.environ.setdefault("PAYMENT_WEBHOOK_SECRET", "bench")
+os.environ.setdefault("TOKEN_PRICES_JSON", "{}")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+
+from app.infrastructure.db.base import Base, engine  # noqa: E402
+from app.presentation.main import app  # noqa: E402
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Перцентиль по отсортированной выборке."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * len(ordered))))
+    return ordered[index]
+
+
+async def run(events: int, users: int, retry_ratio: float) -> None:
+    """Прогнать пополнения и вывести перцентили."""
+    if engine.dialect.name == "sqlite":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    secret = os.environ["PAYMENT_WEBHOOK_SECRET"]
+    user_ids = [str(uuid4()) for _ in range(users)]
+    sent: list[str] = []
+    samples: list[float] = []
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://b") as ac:
+        for i in range(events):
+            if sent and (i % 100) < retry_ratio * 100:
+                event_id = sent[i % len(sent)]
+            else:
+                event_id = str(uuid4())
+                sent.append(event_id)
+            started = time.perf_counter()
+            resp = await ac.post(
+                "/webhook/topup",
+                json={
+                    "external_user_id": user_ids[i % users],
+                    "amount": 10,
+                },
+                headers={"X-Webhook-Secret": secret, "X-Event-Id": event_id},
+            )
+            samples.append((time.perf_counter() - started) * 1000)
+            resp.raise_for_status()
+
+    print(
+        f"events={events} users={users} retry_ratio={retry_ratio:.2f} "
+        f"mean={statistics.fmean(samples):.2f}ms "
+        f"p50={percentile(samples, 50):.2f}ms "
+        f"p95={percentile(samples, 95):.2f}ms "
+        f"p99={percentile(samples, 99):.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--retry-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(run(args.events, args.users, args.retry_ratio))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import asyncio
 import os
+import tempfile
 from typing import AsyncIterator
 from uuid import uuid4
 
@@ -12,6 +13,7 @@ os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
 os.environ.setdefault("FAL_KEY", "test")
 os.environ.setdefault("PAYMENT_WEBHOOK_SECRET", "secret")
 os.environ.setdefault("TOKEN_PRICES_JSON", '{"text_to_image":5}')
+os.environ.setdefault("BLOB_STORE_DIR", tempfile.mkdtemp(prefix="blobs-"))
 
 from app.infrastructure.background import BackgroundTaskManager
 from app.infrastructure.db.base import AsyncSessionLocal, Base, engine
@@ -0,0 +1,323 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from app.application.use_cases.generations import GenerationService
+from app.domain.entities import (
+    GenerationJob,
+    GenerationKind,
+    GenerationStatus,
+    User,
+)
+from app.infrastructure.cache.jobs import TerminalJobCache, estimate_job_bytes
+from app.infrastructure.cache.results import ResultCacheStats
+from app.infrastructure.cache.singleflight import SingleFlight
+from app.infrastructure.cache.users import UserCache
+from app.infrastructure.db.base import AsyncSessionLocal, engine
+from app.infrastructure.db.models import GenerationJobModel, UserModel
+from app.infrastructure.db.repositories import (
+    SQLAlchemyBalanceTransactionRepository,
+    SQLAlchemyGenerationJobRepository,
+    SQLAlchemyGenerationResultRepository,
+    SQLAlchemyUserRepository,
+)
+from app.infrastructure.events.notify import make_balance_event_handler
+
+
+def make_job(status=GenerationStatus.COMPLETED, prompt="cat"):
+    """Доменная задача для тестов кэша."""
+    now = datetime.now(timezone.utc)
+    return GenerationJob(
+        id=uuid4(),
+        user_id=uuid4(),
+        kind=GenerationKind.TEXT_TO_IMAGE,
+        model_id="fal-ai/wan-25-preview/text-to-image",
+        fal_request_id=None,
+        status=status,
+        cost_tokens=5,
+        input_json={"prompt": prompt},
+        result_json={"images": [{"url": "https://example.com/a.png"}]},
+        error_message=None,
+        status_url=None,
+        response_url=None,
+        cancel_url=None,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def test_terminal_cache_evicts_least_recently_used_by_bytes():
+    """Кэш хранит только завершённые задачи и вытесняет старые по байтам."""
+    first, second, third = make_job(), make_job(), make_job()
+    cache = TerminalJobCache(max_bytes=estimate_job_bytes(first) * 2)
+
+    cache.put(make_job(status=GenerationStatus.IN_PROGRESS))
+    assert len(cache) == 0
+
+    cache.put(first)
+    cache.put(second)
+    assert cache.get(first.id) is not None
+    cache.put(third)
+
+    assert cache.get(second.id) is None
+    assert cache.get(first.id).id == first.id
+    assert cache.get(third.id).id == third.id
+    assert cache.current_bytes <= cache.max_bytes
+
+    copy = cache.get(first.id)
+    copy.status = GenerationStatus.FAILED
+    assert cache.get(first.id).status == GenerationStatus.COMPLETED
+
+
+async def test_repository_serves_terminal_job_from_cache():
+    """Повторное чтение завершённой задачи не обращается к БД."""
+    cache = TerminalJobCache(max_bytes=1024 * 1024)
+    async with AsyncSessionLocal() as session:
+        user = UserModel(
+            id=uuid4(), external_user_id=uuid4(), balance_tokens=0
+        )
+        session.add(user)
+        job = GenerationJobModel(
+            id=uuid4(),
+            user_id=user.id,
+            kind=GenerationKind.TEXT_TO_IMAGE,
+            model_id="fal-ai/wan-25-preview/text-to-image",
+            status=GenerationStatus.COMPLETED,
+            cost_tokens=5,
+            input_json={"prompt": "cached"},
+            result_json={"ok": True},
+        )
+        session.add(job)
+        await session.commit()
+        job_id, user_id = job.id, user.id
+
+    async with AsyncSessionLocal() as session:
+        repo = SQLAlchemyGenerationJobRepository(session, cache)
+        assert (await repo.get(job_id)).result_json == {"ok": True}
+        await session.execute(
+            sa.delete(GenerationJobModel).where(
+                GenerationJobModel.id == job_id
+            )
+        )
+        await session.commit()
+
+        cached = await repo.get(job_id)
+        assert cached is not None and cached.user_id == user_id
+        assert await repo.get_version(job_id, user_id) == cached.updated_at
+        assert await repo.get_version(job_id, uuid4()) is None
+    assert cache.hits == 3
+
+
+async def test_user_cache_write_through_applies_only_committed_balance():
+    """Баланс попадает в кэш после commit, откат кэш не меняет."""
+    cache = UserCache(ttl_seconds=60, max_entries=10)
+    fingerprint = uuid4().hex[:16]
+    async with AsyncSessionLocal() as session:
+        user = UserModel(
+            id=uuid4(),
+            external_user_id=uuid4(),
+            api_key_fingerprint=fingerprint,
+            balance_tokens=10,
+        )
+        session.add(user)
+        await session.commit()
+        user_id = user.id
+
+    async with AsyncSessionLocal() as session:
+        repo = SQLAlchemyUserRepository(session, cache)
+        assert (await repo.get_by_api_key_fingerprint(fingerprint)).id == (
+            user_id
+        )
+        await repo.adjust_balance(user_id, 5)
+        assert cache.get(user_id).balance_tokens == 10
+        await session.commit()
+    assert cache.get(user_id).balance_tokens == 15
+
+    async with AsyncSessionLocal() as session:
+        await SQLAlchemyUserRepository(session, cache).adjust_balance(
+            user_id, -7
+        )
+        await session.rollback()
+    cached = cache.get_by_fingerprint(fingerprint)
+    assert cached is not None and cached.balance_tokens == 15
+
+    make_balance_event_handler(cache)({"u": [str(user_id)]})
+    assert cache.get_by_fingerprint(fingerprint) is None
+
+
+def test_user_cache_entries_expire_after_ttl(monkeypatch):
+    """Запись старше TTL не отдаётся."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = UserCache(ttl_seconds=5, max_entries=10)
+    user = User(
+        id=uuid4(),
+        external_user_id=uuid4(),
+        api_key_hash=None,
+        api_key_fingerprint="abc",
+        balance_tokens=3,
+        created_at=datetime.now(timezone.utc),
+    )
+    cache.put(user)
+    assert cache.get_by_fingerprint("abc").balance_tokens == 3
+
+    now[0] += 6
+    assert cache.get_by_fingerprint("abc") is None
+    assert len(cache) == 0
+
+
+async def test_single_flight_coalesces_concurrent_identical_reads():
+    """Одинаковые одновременные чтения выполняются один раз."""
+    flights = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return calls
+
+    readers = [
+        asyncio.create_task(flights.do(("job", 1), load)) for _ in range(5)
+    ]
+    other = asyncio.create_task(flights.do(("job", 2), load))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*readers) == [2, 2, 2, 2, 2]
+    assert await other == 2
+    assert calls == 2
+    assert flights.stats() == {"job": {"leaders": 2, "coalesced": 4}}
+    assert len(flights) == 0
+
+
+async def test_single_flight_follower_retries_when_leader_cancelled():
+    """Отмена ведущего не отменяет ожидающих: они читают сами."""
+    flights = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "ok"
+
+    leader = asyncio.create_task(flights.do(("user", "k"), slow))
+    await started.wait()
+    follower = asyncio.create_task(flights.do(("user", "k"), fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "ok"
+    assert leader.cancelled()
+
+
+async def test_result_cache_completes_repeated_seeded_request():
+    """Повтор запроса с тем же seed завершается из кэша по цене кэша."""
+    stats = ResultCacheStats()
+    model_id = "fal-ai/wan-25-preview/text-to-image"
+    async with AsyncSessionLocal() as session:
+        user = UserModel(
+            id=uuid4(), external_user_id=uuid4(), balance_tokens=100
+        )
+        session.add(user)
+        await session.commit()
+
+    def make_service(session):
+        return GenerationService(
+            SQLAlchemyUserRepository(session, cache=None),
+            SQLAlchemyGenerationJobRepository(session, terminal_cache=None),
+            SQLAlchemyBalanceTransactionRepository(session),
+            {"text_to_image": 5},
+            results=SQLAlchemyGenerationResultRepository(
+                session, ttl_seconds=3600, max_entries=1, stats=stats
+            ),
+            result_cache_price=1,
+        )
+
+    payload = {"prompt": f"cat {uuid4()}", "seed": 42, "num_images": 1}
+    async with AsyncSessionLocal() as session:
+        service = make_service(session)
+        first = await service.create_job(
+            user, GenerationKind.TEXT_TO_IMAGE, model_id, payload
+        )
+        assert first.status == GenerationStatus.QUEUED
+        await service.remember_result(first, {"images": [{"url": "u"}]})
+        await session.commit()
+
+    async with AsyncSessionLocal() as session:
+        service = make_service(session)
+        repeated = await service.create_job(
+            user,
+            GenerationKind.TEXT_TO_IMAGE,
+            model_id,
+            dict(reversed(list(payload.items()))),
+        )
+        unseeded = await service.create_job(
+            user,
+            GenerationKind.TEXT_TO_IMAGE,
+            model_id,
+            {"prompt": payload["prompt"]},
+        )
+        balance = (
+            await SQLAlchemyUserRepository(
+                session, cache=None
+            ).get_by_id_for_update(user.id)
+        ).balance_tokens
+        await session.commit()
+
+    assert repeated.status == GenerationStatus.COMPLETED
+    assert repeated.result_json == {"images": [{"url": "u"}]}
+    assert repeated.cost_tokens == 1
+    assert unseeded.status == GenerationStatus.QUEUED
+    assert balance == 100 - 5 - 1 - 5
+    assert stats.hits == 1 and stats.misses == 1
+    assert stats.hit_rate == 0.5
+
+    async with AsyncSessionLocal() as session:
+        results = SQLAlchemyGenerationResultRepository(
+            session, ttl_seconds=3600, max_entries=1, stats=stats
+        )
+        await results.put(model_id, {"prompt": "other", "seed": 1}, {})
+        await session.commit()
+        assert await results.get(model_id, payload) is None
+    assert stats.evictions >= 1
+
+
+async def test_result_cache_evicts_in_batches_and_reports_hit_rate(client):
+    """Вытеснение идёт раз в несколько сохранений; доля попаданий видна."""
+    deletes: list[str] = []
+
+    def capture(conn, cursor, statement, *args) -> None:
+        if statement.startswith("DELETE"):
+            deletes.append(statement)
+
+    stats = ResultCacheStats()
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        async with AsyncSessionLocal() as session:
+            results = SQLAlchemyGenerationResultRepository(
+                session, ttl_seconds=3600, max_entries=300, stats=stats
+            )
+            assert results.sweep_every == 3
+            for index in range(3):
+                await results.put("m", {"seed": index, "id": str(uuid4())}, {})
+                assert len(deletes) == (2 if index == 2 else 0)
+            await session.rollback()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    response = await client.get("/healthz/metrics")
+    assert response.status_code == 200
+    metrics = response.json()
+    assert "hit_rate" in metrics["result_cache"]
+    assert {"hits", "misses"} <= metrics["terminal_jobs"].keys()
+    assert isinstance(metrics["read_flights"], dict)
+    assert "thumbnails" in metrics
+    assert metrics["model_router"]
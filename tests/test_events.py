@@ -0,0 +1,265 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.domain.entities import (
+    GenerationJob,
+    GenerationKind,
+    GenerationStatus,
+)
+from app.infrastructure.db.base import AsyncSessionLocal
+from app.infrastructure.db.models import GenerationJobModel, UserModel
+from app.infrastructure.db.repositories import (
+    PENDING_JOB_EVENTS_KEY,
+    SQLAlchemyGenerationJobRepository,
+)
+from app.infrastructure.events.bus import JobEvent, JobEventBus
+from app.infrastructure.events.notify import (
+    JOB_EVENTS_CHANNEL,
+    PROCESS_ID,
+    PgNotificationListener,
+    job_event_payload,
+    make_job_event_handler,
+)
+from app.presentation.api.routers import generations as generations_router
+from app.presentation.api.routers.generations import job_event_stream
+from app.presentation.main import app
+
+
+def make_event(job_id, user_id, status=GenerationStatus.IN_PROGRESS):
+    """Событие задачи для тестов."""
+    return JobEvent(
+        job_id=job_id,
+        user_id=user_id,
+        status=status,
+        updated_at=datetime.now(timezone.utc),
+    )
+
+
+def test_user_subscription_receives_only_subscribed_jobs():
+    """Подписка пользователя получает только выбранные задачи."""
+    bus = JobEventBus()
+    user_id = uuid4()
+    watched, ignored = uuid4(), uuid4()
+    subscription = bus.subscribe_user(user_id)
+    subscription.job_ids.add(watched)
+
+    bus.publish(make_event(watched, user_id))
+    bus.publish(make_event(ignored, user_id))
+    bus.publish(make_event(watched, uuid4()))
+
+    assert subscription.queue.qsize() == 1
+    assert subscription.queue.get_nowait().job_id == watched
+
+    subscription.all_jobs = True
+    bus.publish(make_event(ignored, user_id))
+    assert subscription.queue.get_nowait().job_id == ignored
+
+
+def test_slow_user_subscriber_is_dropped_without_blocking():
+    """Переполненная подписка отключается, остальные продолжают получать."""
+    bus = JobEventBus()
+    user_id = uuid4()
+    slow = bus.subscribe_user(user_id, queue_size=2)
+    fast = bus.subscribe_user(user_id, queue_size=10)
+    slow.all_jobs = fast.all_jobs = True
+
+    for _ in range(3):
+        bus.publish(make_event(uuid4(), user_id))
+
+    assert slow.dropped
+    assert slow.queue.get_nowait() is None
+    assert slow.queue.empty()
+    assert fast.queue.qsize() == 3
+
+    bus.publish(make_event(uuid4(), user_id))
+    assert slow.queue.empty()
+    assert fast.queue.qsize() == 4
+
+
+def test_notification_listener_dispatches_foreign_job_events():
+    """Уведомление другого процесса попадает в локальную шину."""
+    bus = JobEventBus()
+    listener = PgNotificationListener("postgresql+asyncpg://unused")
+    listener.add_handler(JOB_EVENTS_CHANNEL, make_job_event_handler(bus))
+    user_id, job_id = uuid4(), uuid4()
+    subscription = bus.subscribe_user(user_id)
+    subscription.all_jobs = True
+    event = make_event(job_id, user_id, GenerationStatus.COMPLETED)
+    payload = job_event_payload(event)
+
+    listener.dispatch(
+        JOB_EVENTS_CHANNEL, json.dumps({**payload, "o": PROCESS_ID})
+    )
+    assert subscription.queue.empty()
+
+    listener.dispatch(JOB_EVENTS_CHANNEL, json.dumps({**payload, "o": "x"}))
+    received = subscription.queue.get_nowait()
+    assert received.partial
+    assert received.job_id == job_id
+    assert received.status == GenerationStatus.COMPLETED
+    assert received.event_id == event.event_id
+
+
+async def test_update_status_queues_event_only_on_change():
+    """Повтор того же статуса без результата не порождает событие."""
+    async with AsyncSessionLocal() as session:
+        user = UserModel(
+            id=uuid4(), external_user_id=uuid4(), balance_tokens=0
+        )
+        session.add(user)
+        job = GenerationJobModel(
+            id=uuid4(),
+            user_id=user.id,
+            kind=GenerationKind.TEXT_TO_IMAGE,
+            model_id="fal-ai/wan-25-preview/text-to-image",
+            status=GenerationStatus.IN_QUEUE,
+            cost_tokens=5,
+            input_json={"prompt": "cat"},
+        )
+        session.add(job)
+        await session.commit()
+        job_id = job.id
+
+    async with AsyncSessionLocal() as session:
+        repo = SQLAlchemyGenerationJobRepository(session)
+        for status in [
+            GenerationStatus.IN_QUEUE,
+            GenerationStatus.IN_PROGRESS,
+            GenerationStatus.IN_PROGRESS,
+        ]:
+            await repo.update_status(job_id, status)
+        await repo.update_status(
+            job_id, GenerationStatus.IN_PROGRESS, result_json={"ok": True}
+        )
+        await repo.update_status(uuid4(), GenerationStatus.IN_PROGRESS)
+
+        events = session.info[PENDING_JOB_EVENTS_KEY]
+        assert [(e.status, e.result_json) for e in events] == [
+            (GenerationStatus.IN_PROGRESS, None),
+            (GenerationStatus.IN_PROGRESS, {"ok": True}),
+        ]
+        await session.rollback()
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_forwards_partial_results_with_same_status():
+    """Новые частичные результаты доходят до SSE без смены статуса."""
+    now = datetime.now(timezone.utc)
+    job = GenerationJob(
+        id=uuid4(),
+        user_id=uuid4(),
+        kind=GenerationKind.TEXT_TO_IMAGE,
+        model_id="fal-ai/wan-25-preview/text-to-image",
+        fal_request_id=None,
+        status=GenerationStatus.IN_PROGRESS,
+        cost_tokens=20,
+        input_json={"prompt": "cat", "num_images": 2},
+        result_json=None,
+        error_message=None,
+        status_url=None,
+        response_url=None,
+        cancel_url=None,
+        created_at=now,
+        updated_at=now,
+    )
+    first = {"images": [{"url": "https://fal.media/0.png"}]}
+    both = {"images": first["images"] + [{"url": "https://fal.media/1.png"}]}
+    queue: asyncio.Queue[JobEvent] = asyncio.Queue()
+    for step, (status, result) in enumerate(
+        [
+            (GenerationStatus.IN_PROGRESS, first),
+            (GenerationStatus.IN_PROGRESS, first),
+            (GenerationStatus.IN_PROGRESS, both),
+            (GenerationStatus.COMPLETED, both),
+        ],
+        start=1,
+    ):
+        queue.put_nowait(
+            JobEvent(
+                job_id=job.id,
+                user_id=job.user_id,
+                status=status,
+                updated_at=now + timedelta(seconds=step),
+                result_json=result,
+            )
+        )
+
+    messages = [
+        message
+        async for message in job_event_stream(job, queue, 0)
+        if message.startswith("id:")
+    ]
+
+    payloads = [json.loads(m.split("data: ", 1)[1]) for m in messages]
+    assert [len((p["result"] or {}).get("images", [])) for p in payloads] == [
+        0,
+        1,
+        2,
+        2,
+    ]
+    assert payloads[-1]["status"] == "COMPLETED"
+
+
+def test_generations_websocket_end_to_end(monkeypatch):
+    """WebSocket: отказ без ключа, ack и статус, ошибки сообщений."""
+    external_user_id = str(uuid4())
+    # Без lifespan: состояние приложения задаёт conftest.
+    client = TestClient(app)
+    with pytest.raises(WebSocketDisconnect) as rejected:
+        with client.websocket_connect(
+            "/generations/ws", headers={"X-API-Key": "bad"}
+        ) as websocket:
+            websocket.receive_text()
+    assert rejected.value.code == 1008
+
+    client.post(
+        "/webhook/topup",
+        json={"external_user_id": external_user_id, "amount": 100},
+        headers={"X-Webhook-Secret": "secret"},
+    )
+    api_key = client.post(
+        "/auth",
+        json={"external_user_id": external_user_id, "rotate": True},
+    ).json()["api_key"]
+    job_id = client.post(
+        "/generations/images/text-to-image",
+        json={"prompt": "fox"},
+        headers={"X-API-Key": api_key},
+    ).json()["job_id"]
+
+    monkeypatch.setattr(generations_router, "WS_MAX_SUBSCRIBED_IDS", 2)
+    with client.websocket_connect(
+        "/generations/ws", headers={"X-API-Key": api_key}
+    ) as websocket:
+        websocket.send_text("not json")
+        assert websocket.receive_json() == {
+            "type": "error",
+            "detail": "invalid message",
+        }
+
+        websocket.send_json({"action": "subscribe", "job_ids": [job_id]})
+        assert websocket.receive_json() == {
+            "type": "ack",
+            "action": "subscribe",
+        }
+        assert websocket.receive_json() == {
+            "type": "status",
+            "job_id": job_id,
+            "status": "QUEUED",
+        }
+
+        websocket.send_json(
+            {
+                "action": "subscribe",
+                "job_ids": [str(uuid4()), str(uuid4())],
+            }
+        )
+        error = websocket.receive_json()
+        assert error["type"] == "error"
+        assert "at most 2" in error["detail"]
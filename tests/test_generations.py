@@ -1,3 +1,6 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
 from uuid import UUID, uuid4
 
 import httpx
@@ -6,14 +9,29 @@ import sqlalchemy as sa
 
 from app.domain.entities import BalanceReason, GenerationKind, GenerationStatus
 from app.infrastructure.background import BackgroundTaskManager
-from app.infrastructure.db.base import AsyncSessionLocal
+from app.infrastructure.db.base import AsyncSessionLocal, engine
 from app.infrastructure.db.models import (
     BalanceTransactionModel,
     GenerationJobModel,
     UserModel,
 )
+from app.infrastructure.db.repositories import (
+    SQLAlchemyGenerationJobRepository,
+)
+from app.infrastructure.events.bus import job_events
 from app.infrastructure.fal.client import HttpFalClient
+from app.infrastructure.fal.routing import get_model_router
+from app.infrastructure.fal.stats import ModelLatencyStats
+from app.infrastructure.settings import get_settings
+from app.infrastructure.tasks import generations as tasks_module
 from app.infrastructure.tasks.generations import run_generation_job
+from app.infrastructure.tasks.hedging import (
+    HedgeAttempt,
+    HedgeBudget,
+    HedgePolicy,
+)
+from app.infrastructure.tasks.limits import ModelConcurrencyLimiter
+from app.presentation.api.routers import generations as generations_router
 
 
 @pytest.mark.asyncio
@@ -283,3 +301,1031 @@ async def test_run_generation_job_uses_status_urls(client, user_external_id):
         job = await session.get(GenerationJobModel, UUID(job_id))
         assert job.status == GenerationStatus.COMPLETED
         assert job.status_url == status_url
+
+
+@pytest.mark.asyncio
+async def test_list_generations_cursor_walks_seeded_jobs_by_keyset(
+    client, user_external_id
+):
+    """Курсорная пагинация обходит все задачи по ключу, а не по OFFSET."""
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id}
+    )
+    api_key = auth_resp.json()["api_key"]
+
+    base_time = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    async with AsyncSessionLocal() as session:
+        user = (
+            await session.execute(
+                sa.select(UserModel).where(
+                    UserModel.external_user_id == UUID(user_external_id)
+                )
+            )
+        ).scalar_one()
+        session.add_all(
+            GenerationJobModel(
+                id=uuid4(),
+                user_id=user.id,
+                kind=GenerationKind.TEXT_TO_IMAGE,
+                model_id="fal-ai/wan-25-preview/text-to-image",
+                status=GenerationStatus.COMPLETED,
+                cost_tokens=5,
+                input_json={"prompt": f"seed {i}"},
+                # Пары с одинаковым created_at проверяют сортировку по id.
+                created_at=base_time + timedelta(seconds=i // 2),
+                updated_at=base_time,
+            )
+            for i in range(250)
+        )
+        await session.commit()
+
+    statements: list[str] = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sa.event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        seen: list[str] = []
+        cursor = None
+        while True:
+            params = {"limit": 100}
+            if cursor:
+                params["cursor"] = cursor
+            resp = await client.get(
+                "/generations", params=params, headers={"X-API-Key": api_key}
+            )
+            assert resp.status_code == 200
+            data = resp.json()
+            seen.extend(item["job_id"] for item in data["items"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+    finally:
+        sa.event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    assert len(seen) == 250
+    assert len(set(seen)) == 250
+    job_queries = [s for s in statements if "FROM generation_jobs" in s]
+    assert len(job_queries) == 3
+    keyset = "(generation_jobs.created_at, generation_jobs.id) <"
+    assert all(keyset in s for s in job_queries[1:])
+
+    bad = await client.get(
+        "/generations",
+        params={"cursor": "not-a-cursor"},
+        headers={"X-API-Key": api_key},
+    )
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_list_generations_summary_view_skips_json_columns(
+    client, user_external_id
+):
+    """view=summary не читает JSON-колонки и не отдаёт result."""
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id}
+    )
+    api_key = auth_resp.json()["api_key"]
+
+    async with AsyncSessionLocal() as session:
+        user = (
+            await session.execute(
+                sa.select(UserModel).where(
+                    UserModel.external_user_id == UUID(user_external_id)
+                )
+            )
+        ).scalar_one()
+        session.add(
+            GenerationJobModel(
+                id=uuid4(),
+                user_id=user.id,
+                kind=GenerationKind.TEXT_TO_IMAGE,
+                model_id="fal-ai/wan-25-preview/text-to-image",
+                status=GenerationStatus.COMPLETED,
+                cost_tokens=5,
+                input_json={"prompt": "heavy", "image_urls": ["data:x"]},
+                result_json={"images": [{"url": "http://example.com"}]},
+            )
+        )
+        await session.commit()
+
+    statements: list[str] = []
+
+    def capture(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sa.event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        summary = await client.get(
+            "/generations",
+            params={"view": "summary"},
+            headers={"X-API-Key": api_key},
+        )
+    finally:
+        sa.event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    assert summary.status_code == 200
+    item = summary.json()["items"][0]
+    assert "result" not in item
+    assert item["status"] == GenerationStatus.COMPLETED
+    job_queries = [s for s in statements if "FROM generation_jobs" in s]
+    assert all("result_json" not in s for s in job_queries)
+    assert all("input_json" not in s for s in job_queries)
+
+    full = await client.get("/generations", headers={"X-API-Key": api_key})
+    assert full.json()["items"][0]["result"]["images"][0]["url"] == (
+        "http://example.com"
+    )
+
+
+@pytest.mark.asyncio
+async def test_generation_statuses_returns_only_own_jobs(
+    client, user_external_id
+):
+    """Пакетный статус отдаёт только задачи текущего пользователя."""
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id}
+    )
+    api_key = auth_resp.json()["api_key"]
+    other_resp = await client.post(
+        "/auth", json={"external_user_id": str(uuid4())}
+    )
+    other_key = other_resp.json()["api_key"]
+
+    async with AsyncSessionLocal() as session:
+        user = (
+            await session.execute(
+                sa.select(UserModel).where(
+                    UserModel.external_user_id == UUID(user_external_id)
+                )
+            )
+        ).scalar_one()
+        jobs = [
+            GenerationJobModel(
+                id=uuid4(),
+                user_id=user.id,
+                kind=GenerationKind.TEXT_TO_IMAGE,
+                model_id="fal-ai/wan-25-preview/text-to-image",
+                status=job_status,
+                cost_tokens=5,
+                input_json={"prompt": "status"},
+            )
+            for job_status in (
+                GenerationStatus.IN_PROGRESS,
+                GenerationStatus.COMPLETED,
+            )
+        ]
+        session.add_all(jobs)
+        await session.commit()
+        job_ids = [str(job.id) for job in jobs]
+
+    unknown = str(uuid4())
+    resp = await client.get(
+        "/generations/status",
+        params={"ids": ",".join(job_ids + [unknown])},
+        headers={"X-API-Key": api_key},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["statuses"] == {
+        job_ids[0]: GenerationStatus.IN_PROGRESS,
+        job_ids[1]: GenerationStatus.COMPLETED,
+    }
+
+    foreign = await client.post(
+        "/generations/status",
+        json={"ids": job_ids},
+        headers={"X-API-Key": other_key},
+    )
+    assert foreign.status_code == 200
+    assert foreign.json()["statuses"] == {}
+
+
+@pytest.mark.asyncio
+async def test_generation_events_stream_pushes_transitions_until_final(
+    client, user_external_id, monkeypatch
+):
+    """SSE-поток отдаёт переходы статуса из update_status до финального."""
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id}
+    )
+    api_key = auth_resp.json()["api_key"]
+
+    async with AsyncSessionLocal() as session:
+        user = (
+            await session.execute(
+                sa.select(UserModel).where(
+                    UserModel.external_user_id == UUID(user_external_id)
+                )
+            )
+        ).scalar_one()
+        job = GenerationJobModel(
+            id=uuid4(),
+            user_id=user.id,
+            kind=GenerationKind.TEXT_TO_IMAGE,
+            model_id="fal-ai/wan-25-preview/text-to-image",
+            status=GenerationStatus.IN_QUEUE,
+            cost_tokens=5,
+            input_json={"prompt": "sse"},
+        )
+        session.add(job)
+        await session.commit()
+        job_id = job.id
+
+    stream_started = asyncio.Event()
+    original_stream = generations_router.job_event_stream
+
+    async def observed_stream(*args, **kwargs):
+        async for chunk in original_stream(*args, **kwargs):
+            stream_started.set()
+            yield chunk
+
+    monkeypatch.setattr(
+        generations_router, "job_event_stream", observed_stream
+    )
+
+    async def drive_job() -> None:
+        await stream_started.wait()
+        async with AsyncSessionLocal() as session:
+            jobs = SQLAlchemyGenerationJobRepository(session)
+            for job_status in (
+                GenerationStatus.IN_PROGRESS,
+                GenerationStatus.IN_PROGRESS,
+            ):
+                await jobs.update_status(job_id, job_status)
+                await session.commit()
+            await jobs.update_status(job_id, GenerationStatus.FAILED)
+            await session.rollback()
+            await jobs.update_status(
+                job_id, GenerationStatus.COMPLETED, result_json={"ok": True}
+            )
+            await session.commit()
+
+    driver = asyncio.create_task(drive_job())
+    resp = await asyncio.wait_for(
+        client.get(
+            f"/generations/{job_id}/events", headers={"X-API-Key": api_key}
+        ),
+        timeout=5,
+    )
+    await driver
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = [
+        json.loads(line.removeprefix("data: "))
+        for line in resp.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert [event["status"] for event in events] == [
+        GenerationStatus.IN_QUEUE,
+        GenerationStatus.IN_PROGRESS,
+        GenerationStatus.COMPLETED,
+    ]
+    assert events[-1]["result"] == {"ok": True}
+    assert job_id not in job_events._by_job
+
+    last_id = [
+        line.removeprefix("id: ")
+        for line in resp.text.splitlines()
+        if line.startswith("id: ")
+    ][-1]
+    resumed = await client.get(
+        f"/generations/{job_id}/events",
+        headers={"X-API-Key": api_key, "Last-Event-ID": last_id},
+    )
+    assert "data: " not in resumed.text
+
+
+@pytest.mark.asyncio
+async def test_get_generation_etag_returns_304_until_status_changes(
+    client, user_external_id
+):
+    """If-None-Match даёт 304, пока задача не изменилась."""
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id}
+    )
+    api_key = auth_resp.json()["api_key"]
+    headers = {"X-API-Key": api_key}
+
+    async with AsyncSessionLocal() as session:
+        user = (
+            await session.execute(
+                sa.select(UserModel).where(
+                    UserModel.external_user_id == UUID(user_external_id)
+                )
+            )
+        ).scalar_one()
+        job = GenerationJobModel(
+            id=uuid4(),
+            user_id=user.id,
+            kind=GenerationKind.TEXT_TO_IMAGE,
+            model_id="fal-ai/wan-25-preview/text-to-image",
+            status=GenerationStatus.IN_QUEUE,
+            cost_tokens=5,
+            input_json={"prompt": "etag"},
+        )
+        session.add(job)
+        await session.commit()
+        job_id = job.id
+
+    first = await client.get(f"/generations/{job_id}", headers=headers)
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+    list_first = await client.get("/generations", headers=headers)
+    list_etag = list_first.headers["ETag"]
+
+    cached = await client.get(
+        f"/generations/{job_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    list_cached = await client.get(
+        "/generations", headers={**headers, "If-None-Match": list_etag}
+    )
+    assert list_cached.status_code == 304
+
+    async with AsyncSessionLocal() as session:
+        await SQLAlchemyGenerationJobRepository(session).update_status(
+            job_id, GenerationStatus.COMPLETED, result_json={"ok": True}
+        )
+        await session.commit()
+
+    changed = await client.get(
+        f"/generations/{job_id}", headers={**headers, "If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert changed.json()["result"] == {"ok": True}
+    assert changed.headers["ETag"] != etag
+    list_changed = await client.get(
+        "/generations", headers={**headers, "If-None-Match": list_etag}
+    )
+    assert list_changed.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_batch_generation_debits_once_and_enqueues_once(
+    client, user_external_id
+):
+    """Пачка списывается одной суммой и уходит в фон одним вызовом."""
+    await client.post(
+        "/webhook/topup",
+        json={"external_user_id": user_external_id, "amount": 100},
+        headers={"X-Webhook-Secret": "secret", "X-Event-Id": "evt-batch"},
+    )
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id, "rotate": True}
+    )
+    headers = {"X-API-Key": auth_resp.json()["api_key"]}
+    task_manager: BackgroundTaskManager = client.app.state.task_manager
+    enqueued = len(task_manager.enqueued)
+
+    resp = await client.post(
+        "/generations/batch",
+        json={
+            "items": [
+                {"type": "TEXT_TO_IMAGE", "prompt": "cat"},
+                {"type": "TEXT_TO_VIDEO", "prompt": "dog", "duration": 5},
+                {
+                    "type": "IMAGE_TO_VIDEO",
+                    "prompt": "bird",
+                    "image_url": "https://example.com/bird.png",
+                },
+            ]
+        },
+        headers=headers,
+    )
+    assert resp.status_code == 202
+    body = resp.json()
+    assert body["cost_tokens"] == 5 + 30 + 35
+    assert [item["cost_tokens"] for item in body["items"]] == [5, 30, 35]
+    assert len(task_manager.enqueued) == enqueued + 1
+
+    async with AsyncSessionLocal() as session:
+        jobs = (
+            (
+                await session.execute(
+                    sa.select(GenerationJobModel).where(
+                        GenerationJobModel.batch_id == UUID(body["batch_id"])
+                    )
+                )
+            )
+            .scalars()
+            .all()
+        )
+        assert {str(job.id) for job in jobs} == {
+            item["job_id"] for item in body["items"]
+        }
+        assert {job.model_id for job in jobs} == {
+            "fal-ai/wan-25-preview/text-to-image",
+            "fal-ai/wan-25-preview/text-to-video",
+            "fal-ai/wan-25-preview/image-to-video",
+        }
+        user = (
+            await session.execute(
+                sa.select(UserModel).where(
+                    UserModel.external_user_id == UUID(user_external_id)
+                )
+            )
+        ).scalar_one()
+        assert user.balance_tokens == 30
+        debits = (
+            await session.execute(
+                sa.select(BalanceTransactionModel.amount).where(
+                    BalanceTransactionModel.user_id == user.id,
+                    BalanceTransactionModel.reason == BalanceReason.GENERATION,
+                )
+            )
+        ).scalars()
+        assert sorted(debits) == [5, 30, 35]
+
+    too_big = await client.post(
+        "/generations/batch",
+        json={"items": [{"type": "TEXT_TO_VIDEO", "prompt": "x"}] * 2},
+        headers=headers,
+    )
+    assert too_big.status_code == 402
+    async with AsyncSessionLocal() as session:
+        count = await session.scalar(
+            sa.select(sa.func.count()).where(
+                GenerationJobModel.user_id == user.id
+            )
+        )
+    assert count == 3
+
+
+@pytest.mark.asyncio
+async def test_pipeline_feeds_image_into_video_and_refunds_unused_stage(
+    client, user_external_id
+):
+    """Конвейер отправляет видео с изображением первого этапа сам."""
+    await client.post(
+        "/webhook/topup",
+        json={"external_user_id": user_external_id, "amount": 100},
+        headers={"X-Webhook-Secret": "secret", "X-Event-Id": "evt-pipe"},
+    )
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id, "rotate": True}
+    )
+    headers = {"X-API-Key": auth_resp.json()["api_key"]}
+    body = {
+        "image": {"prompt": "castle"},
+        "video": {"prompt": "fly around", "duration": 5},
+    }
+    submitted: list[tuple[str, dict]] = []
+
+    class PipelineFal:
+        fail_images = False
+
+        async def submit(self, model_id, payload):
+            submitted.append((model_id, payload))
+            return {"request_id": f"req-{len(submitted)}"}
+
+        def is_image(self, url):
+            request_number = int(url.removesuffix("/status").rsplit("-", 1)[1])
+            return "image-to-video" not in submitted[request_number - 1][0]
+
+        async def get_status(self, status_url):
+            if self.fail_images and self.is_image(status_url):
+                return {"status": "FAILED", "error": "nsfw"}
+            return {"status": "COMPLETED"}
+
+        async def get_result(self, response_url):
+            if self.is_image(response_url):
+                return {"images": [{"url": "https://fal.media/castle.png"}]}
+            return {"video": {"url": "https://fal.media/castle.mp4"}}
+
+        @property
+        def client(self):
+            class DummyClient:
+                async def aclose(self):
+                    return None
+
+            return DummyClient()
+
+    async def balance() -> int:
+        resp = await client.get("/balance", headers=headers)
+        return resp.json()["balance_tokens"]
+
+    resp = await client.post(
+        "/generations/pipelines/text-to-image-to-video",
+        json=body,
+        headers=headers,
+    )
+    assert resp.status_code == 202
+    pipeline = resp.json()
+    assert pipeline["cost_tokens"] == 5 + 35
+    assert await balance() == 60
+    first, second = pipeline["stages"]
+    assert second["status"] == GenerationStatus.QUEUED
+
+    await run_generation_job(
+        UUID(first["job_id"]),
+        fal_client_factory=PipelineFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    assert [model_id for model_id, _ in submitted] == [
+        "fal-ai/wan-25-preview/text-to-image",
+        "fal-ai/wan-25-preview/image-to-video",
+    ]
+    assert submitted[1][1]["image_url"] == "https://fal.media/castle.png"
+    assert submitted[1][1]["prompt"] == "fly around"
+    detail = await client.get(
+        f"/generations/pipelines/{pipeline['pipeline_id']}", headers=headers
+    )
+    assert detail.json()["status"] == GenerationStatus.COMPLETED
+    assert [stage["status"] for stage in detail.json()["stages"]] == [
+        GenerationStatus.COMPLETED,
+        GenerationStatus.COMPLETED,
+    ]
+
+    resp = await client.post(
+        "/generations/pipelines/text-to-image-to-video",
+        json=body,
+        headers=headers,
+    )
+    failing = resp.json()
+    PipelineFal.fail_images = True
+    await run_generation_job(
+        UUID(failing["stages"][0]["job_id"]),
+        fal_client_factory=PipelineFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    assert len(submitted) == 3
+    assert await balance() == 60
+    detail = await client.get(
+        f"/generations/pipelines/{failing['pipeline_id']}", headers=headers
+    )
+    assert detail.json()["status"] == GenerationStatus.FAILED
+    assert [stage["status"] for stage in detail.json()["stages"]] == [
+        GenerationStatus.FAILED,
+        GenerationStatus.CANCELED,
+    ]
+    foreign = await client.get(
+        f"/generations/pipelines/{uuid4()}", headers=headers
+    )
+    assert foreign.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_fanout_splits_images_merges_results_and_refunds_failed_child(
+    client, user_external_id, monkeypatch
+):
+    """num_images уходит в fal отдельными запросами одновременно."""
+    monkeypatch.setattr(get_settings(), "fanout_enabled", True)
+    await client.post(
+        "/webhook/topup",
+        json={"external_user_id": user_external_id, "amount": 60},
+        headers={"X-Webhook-Secret": "secret", "X-Event-Id": "evt-fan"},
+    )
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": user_external_id, "rotate": True}
+    )
+    headers = {"X-API-Key": auth_resp.json()["api_key"]}
+    resp = await client.post(
+        "/generations/images/text-to-image",
+        json={"prompt": "tiles", "num_images": 3, "seed": 10},
+        headers=headers,
+    )
+    job_id = UUID(resp.json()["job_id"])
+    payloads: list[dict] = []
+    polls: dict[str, int] = {}
+    partial: list[dict | None] = []
+    in_flight = [0, 0]
+
+    class FanoutFal:
+        async def submit(self, model_id, payload):
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            await asyncio.sleep(0)
+            in_flight[0] -= 1
+            payloads.append(payload)
+            return {"request_id": f"child-{payload['seed']}"}
+
+        async def get_status(self, status_url):
+            request_id = status_url.rsplit("/", 2)[1]
+            polls[request_id] = polls.get(request_id, 0) + 1
+            if request_id == "child-12":
+                return {"status": "FAILED", "error": "nsfw"}
+            if request_id == "child-11" and polls[request_id] == 1:
+                return {"status": "IN_PROGRESS"}
+            if request_id == "child-11":
+                async with AsyncSessionLocal() as session:
+                    job = await session.get(GenerationJobModel, job_id)
+                    partial.append(job.result_json)
+            return {"status": "COMPLETED"}
+
+        async def get_result(self, response_url):
+            request_id = response_url.rsplit("/", 1)[1]
+            return {
+                "images": [{"url": f"https://fal.media/{request_id}.png"}],
+                "has_nsfw_concepts": [False],
+                "seed": int(request_id.split("-")[1]),
+            }
+
+        async def cancel(self, cancel_url):
+            return {}
+
+        @property
+        def client(self):
+            class DummyClient:
+                async def aclose(self):
+                    return None
+
+            return DummyClient()
+
+    await run_generation_job(
+        job_id,
+        fal_client_factory=FanoutFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    assert in_flight[1] == 3
+    assert sorted(p["seed"] for p in payloads) == [10, 11, 12]
+    assert all(p["num_images"] == 1 for p in payloads)
+    assert partial == [
+        {
+            "images": [{"url": "https://fal.media/child-10.png"}],
+            "has_nsfw_concepts": [False],
+            "seed": 10,
+        }
+    ]
+
+    detail = (
+        await client.get(f"/generations/{job_id}", headers=headers)
+    ).json()
+    assert detail["status"] == GenerationStatus.COMPLETED
+    assert [image["url"] for image in detail["result"]["images"]] == [
+        "https://fal.media/child-10.png",
+        "https://fal.media/child-11.png",
+    ]
+    assert detail["result"]["has_nsfw_concepts"] == [False, False]
+    assert detail["children"] == ["COMPLETED", "COMPLETED", "FAILED"]
+    balance = await client.get("/balance", headers=headers)
+    # Стоимость 5, не выполнена треть: возвращается 5 * 1 // 3 = 1.
+    assert balance.json()["balance_tokens"] == 60 - 5 + 1
+
+
+PRIMARY_MODEL = "fal-ai/wan-25-preview/text-to-image"
+ALT_MODEL = "fal-ai/alt/text-to-image"
+ALT_REQUESTS = "https://queue.fal.run/fal-ai/alt/requests"
+PRIMARY_REQUESTS = "https://queue.fal.run/fal-ai/wan-25-preview/requests"
+
+
+def hedge_policy() -> HedgePolicy:
+    """Политика, дублирующая любую задачу в альтернативную модель."""
+    stats = ModelLatencyStats()
+    for _ in range(3):
+        stats.record_queue_time(PRIMARY_MODEL, 0.0)
+    return HedgePolicy(
+        HedgeBudget(max_tokens=5, window_seconds=60),
+        quantile=0.95,
+        min_samples=3,
+        min_queue_seconds=0.0,
+        alternates={PRIMARY_MODEL: ALT_MODEL},
+        stats=stats,
+    )
+
+
+async def topped_up_headers(client, external_user_id, event_id):
+    """Ключ API пользователя с балансом 50."""
+    await client.post(
+        "/webhook/topup",
+        json={"external_user_id": external_user_id, "amount": 50},
+        headers={"X-Webhook-Secret": "secret", "X-Event-Id": event_id},
+    )
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": external_user_id, "rotate": True}
+    )
+    return {"X-API-Key": auth_resp.json()["api_key"]}
+
+
+@pytest.mark.asyncio
+async def test_stuck_job_is_hedged_and_loser_cancelled(
+    client, user_external_id, monkeypatch
+):
+    """Задача дольше порога в очереди дублируется; проигравший отменён."""
+    policy = hedge_policy()
+    monkeypatch.setattr(tasks_module, "get_hedge_policy", lambda: policy)
+    headers = await topped_up_headers(client, user_external_id, "evt-hedge")
+    router = get_model_router()
+    alt_samples = router.health(ALT_MODEL).samples
+    primary_samples = router.health(PRIMARY_MODEL).samples
+    persisted: list[list[dict]] = []
+    submitted: list[str] = []
+    cancelled: list[str] = []
+
+    class SlowQueueFal:
+        async def submit(self, model_id, payload):
+            submitted.append(model_id)
+            return {"request_id": f"req-{len(submitted)}"}
+
+        async def get_status(self, status_url):
+            if "fal-ai/alt" in status_url:
+                async with AsyncSessionLocal() as session:
+                    job = await session.get(GenerationJobModel, job_ids[0])
+                    persisted.append(job.children_json)
+                return {"status": "COMPLETED"}
+            return {"status": "IN_QUEUE"}
+
+        async def get_result(self, response_url):
+            return {"images": [{"url": response_url}]}
+
+        async def cancel(self, cancel_url):
+            cancelled.append(cancel_url)
+            return {}
+
+        @property
+        def client(self):
+            class DummyClient:
+                async def aclose(self):
+                    return None
+
+            return DummyClient()
+
+    job_ids = []
+    for prompt in ("first", "second"):
+        resp = await client.post(
+            "/generations/images/text-to-image",
+            json={"prompt": prompt},
+            headers=headers,
+        )
+        job_ids.append(UUID(resp.json()["job_id"]))
+
+    await run_generation_job(
+        job_ids[0],
+        fal_client_factory=SlowQueueFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    assert submitted == [
+        "fal-ai/wan-25-preview/text-to-image",
+        "fal-ai/alt/text-to-image",
+    ]
+    assert cancelled == [
+        "https://queue.fal.run/fal-ai/wan-25-preview/requests/req-1/cancel"
+    ]
+    async with AsyncSessionLocal() as session:
+        job = await session.get(GenerationJobModel, job_ids[0])
+        assert job.status == GenerationStatus.COMPLETED
+        assert job.fal_request_id == "req-2"
+        assert job.result_json == {
+            "images": [
+                {"url": "https://queue.fal.run/fal-ai/alt/requests/req-2"}
+            ]
+        }
+        # Гонка окончена: запись дубля больше не нужна.
+        assert job.children_json == []
+    assert persisted[0] == [
+        {
+            "role": "hedge",
+            "model_id": ALT_MODEL,
+            "request_id": "req-2",
+            "status_url": f"{ALT_REQUESTS}/req-2/status",
+            "response_url": f"{ALT_REQUESTS}/req-2",
+            "cancel_url": f"{ALT_REQUESTS}/req-2/cancel",
+            "status": "SUBMITTED",
+        }
+    ]
+    # Результат дала альтернативная модель: ей и засчитано завершение.
+    assert router.health(ALT_MODEL).samples == alt_samples + 1
+    assert router.health(PRIMARY_MODEL).samples == primary_samples
+    assert policy.metrics.hedge_wins == 1
+    assert policy.budget.spent == 5
+
+    # Лимит исчерпан: вторая задача ждёт в очереди без дубля.
+    await run_generation_job(
+        job_ids[1],
+        fal_client_factory=SlowQueueFal,
+        poll_interval_seconds=0.01,
+        total_timeout_seconds=0.05,
+    )
+    assert len(submitted) == 3
+    assert policy.metrics.rejected_by_budget >= 1
+    assert policy.metrics.started == 1
+
+
+class RaceFal:
+    """fal, в котором основной запрос и дубль застряли в очереди."""
+
+    submitted: list[str] = []
+    cancelled: list[str] = []
+    fail_primary_after = 1
+
+    def __init__(self):
+        self.polls = 0
+
+    async def submit(self, model_id, payload):
+        self.submitted.append(model_id)
+        return {"request_id": f"req-{len(self.submitted)}"}
+
+    async def get_status(self, status_url):
+        if ALT_MODEL not in status_url:
+            self.polls += 1
+            if self.polls > self.fail_primary_after:
+                raise httpx.ConnectError("fal unavailable")
+        return {"status": "IN_QUEUE"}
+
+    async def cancel(self, cancel_url):
+        self.cancelled.append(cancel_url)
+        return {}
+
+    @property
+    def client(self):
+        class DummyClient:
+            async def aclose(self):
+                return None
+
+        return DummyClient()
+
+
+@pytest.mark.asyncio
+async def test_worker_error_mid_race_cancels_hedge(
+    client, user_external_id, monkeypatch
+):
+    """Сбой опроса во время гонки отменяет и дубль."""
+    policy = hedge_policy()
+    monkeypatch.setattr(tasks_module, "get_hedge_policy", lambda: policy)
+    monkeypatch.setattr(RaceFal, "submitted", [])
+    monkeypatch.setattr(RaceFal, "cancelled", [])
+    headers = await topped_up_headers(
+        client, user_external_id, "evt-hedge-error"
+    )
+    resp = await client.post(
+        "/generations/images/text-to-image",
+        json={"prompt": "stuck"},
+        headers=headers,
+    )
+    job_id = UUID(resp.json()["job_id"])
+
+    await run_generation_job(
+        job_id,
+        fal_client_factory=RaceFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    assert RaceFal.submitted == [PRIMARY_MODEL, ALT_MODEL]
+    assert RaceFal.cancelled == [f"{ALT_REQUESTS}/req-2/cancel"]
+    async with AsyncSessionLocal() as session:
+        job = await session.get(GenerationJobModel, job_id)
+        assert job.status == GenerationStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_cancel_endpoint_cancels_persisted_hedge(
+    client, user_external_id, monkeypatch
+):
+    """Отмена задачи отменяет и дубль, записанный в children_json."""
+    monkeypatch.setattr(RaceFal, "cancelled", [])
+    monkeypatch.setattr(client.app.state, "fal_client_factory", RaceFal)
+    headers = await topped_up_headers(
+        client, user_external_id, "evt-hedge-cancel"
+    )
+    resp = await client.post(
+        "/generations/images/text-to-image",
+        json={"prompt": "stuck"},
+        headers=headers,
+    )
+    job_id = UUID(resp.json()["job_id"])
+    hedge = HedgeAttempt(
+        model_id=ALT_MODEL,
+        request_id="req-hedge",
+        status_url=f"{ALT_REQUESTS}/req-hedge/status",
+        response_url=f"{ALT_REQUESTS}/req-hedge",
+        cancel_url=f"{ALT_REQUESTS}/req-hedge/cancel",
+        started_at=0.0,
+        primary_queued_seconds=0.0,
+    )
+    async with AsyncSessionLocal() as session:
+        await SQLAlchemyGenerationJobRepository(session).update_status(
+            job_id,
+            GenerationStatus.IN_QUEUE,
+            fal_request_id="req-primary",
+            cancel_url="https://queue.fal.run/primary/cancel",
+            children_json=[hedge.child(GenerationStatus.IN_QUEUE)],
+        )
+        await session.commit()
+
+    detail = await client.get(f"/generations/{job_id}", headers=headers)
+    assert detail.json()["children"] is None
+
+    cancel = await client.post(
+        f"/generations/{job_id}/cancel", headers=headers
+    )
+    assert cancel.status_code == 200
+    assert cancel.json()["status"] == "CANCELED"
+    assert RaceFal.cancelled == [
+        "https://queue.fal.run/primary/cancel",
+        hedge.cancel_url,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_hedge_is_skipped_without_free_slot(
+    client, user_external_id, monkeypatch
+):
+    """Дубль не ждёт слота своей модели: без свободного его нет."""
+    policy = hedge_policy()
+    limiter = ModelConcurrencyLimiter({ALT_MODEL: 1})
+    monkeypatch.setattr(tasks_module, "get_hedge_policy", lambda: policy)
+    monkeypatch.setattr(
+        tasks_module, "get_concurrency_limiter", lambda: limiter
+    )
+    monkeypatch.setattr(RaceFal, "submitted", [])
+    monkeypatch.setattr(RaceFal, "cancelled", [])
+    monkeypatch.setattr(RaceFal, "fail_primary_after", 3)
+    headers = await topped_up_headers(
+        client, user_external_id, "evt-hedge-slots"
+    )
+    resp = await client.post(
+        "/generations/images/text-to-image",
+        json={"prompt": "stuck"},
+        headers=headers,
+    )
+    job_id = UUID(resp.json()["job_id"])
+
+    held = limiter.try_acquire(ALT_MODEL)
+    await run_generation_job(
+        job_id,
+        fal_client_factory=RaceFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+    assert RaceFal.submitted == [PRIMARY_MODEL]
+    assert policy.metrics.rejected_by_slots == 3
+    assert policy.metrics.started == 0
+    assert policy.budget.spent == 0
+
+    # Слот свободен: дубль отправлен и после гонки слот возвращён.
+    limiter.release(ALT_MODEL, held)
+    RaceFal.submitted.clear()
+    resp = await client.post(
+        "/generations/images/text-to-image",
+        json={"prompt": "stuck again"},
+        headers=headers,
+    )
+    await run_generation_job(
+        UUID(resp.json()["job_id"]),
+        fal_client_factory=RaceFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+    assert RaceFal.submitted == [PRIMARY_MODEL, ALT_MODEL]
+    assert limiter.snapshot()[ALT_MODEL]["in_use"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fanout_error_refunds_job_and_cancels_children(
+    client, user_external_id, monkeypatch
+):
+    """Сбой во время опроса разбитой задачи: возврат и отмена запросов."""
+    monkeypatch.setattr(get_settings(), "fanout_enabled", True)
+    monkeypatch.setattr(RaceFal, "submitted", [])
+    monkeypatch.setattr(RaceFal, "cancelled", [])
+    monkeypatch.setattr(RaceFal, "fail_primary_after", 100)
+    headers = await topped_up_headers(
+        client, user_external_id, "evt-fan-error"
+    )
+    resp = await client.post(
+        "/generations/images/text-to-image",
+        json={"prompt": "tiles", "num_images": 2},
+        headers=headers,
+    )
+    job_id = UUID(resp.json()["job_id"])
+    update_status = SQLAlchemyGenerationJobRepository.update_status
+
+    async def broken_update(self, job_id, status, **kwargs):
+        if status == GenerationStatus.IN_QUEUE:
+            raise RuntimeError("db down")
+        return await update_status(self, job_id, status, **kwargs)
+
+    monkeypatch.setattr(
+        SQLAlchemyGenerationJobRepository, "update_status", broken_update
+    )
+
+    await run_generation_job(
+        job_id,
+        fal_client_factory=RaceFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    assert len(RaceFal.submitted) == 2
+    assert sorted(RaceFal.cancelled) == [
+        f"{PRIMARY_REQUESTS}/req-1/cancel",
+        f"{PRIMARY_REQUESTS}/req-2/cancel",
+    ]
+    async with AsyncSessionLocal() as session:
+        job = await session.get(GenerationJobModel, job_id)
+        assert job.status == GenerationStatus.FAILED
+        assert job.error_message == "db down"
+    balance = await client.get("/balance", headers=headers)
+    assert balance.json()["balance_tokens"] == 50
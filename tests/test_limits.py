@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+
+from app.infrastructure.tasks.limits import (
+    VIDEO_LANE,
+    ModelConcurrencyLimiter,
+    TierPolicy,
+)
+
+MODEL = "fal-ai/wan-25-preview/text-to-video"
+
+
+async def hold(
+    limiter: ModelConcurrencyLimiter,
+    name: str,
+    started: list[str],
+    release: asyncio.Event,
+    weight: int = 1,
+) -> None:
+    """Занять слот и держать его до сигнала."""
+    async with limiter.slot(MODEL, weight):
+        started.append(name)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_excess_jobs_in_fifo_order():
+    """Сверх лимита задачи ждут и получают слоты по порядку."""
+    limiter = ModelConcurrencyLimiter({MODEL: 2})
+    started: list[str] = []
+    events = {name: asyncio.Event() for name in "abcd"}
+    tasks = [
+        asyncio.create_task(hold(limiter, name, started, events[name]))
+        for name in "abcd"
+    ]
+    await asyncio.sleep(0)
+
+    assert started == ["a", "b"]
+    assert limiter.snapshot()[MODEL] == {
+        "limit": 2,
+        "in_use": 2,
+        "waiting": 2,
+    }
+
+    events["b"].set()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert started == ["a", "b", "c"]
+
+    for event in events.values():
+        event.set()
+    await asyncio.gather(*tasks)
+    assert started == ["a", "b", "c", "d"]
+    assert limiter.snapshot()[MODEL] == {
+        "limit": 2,
+        "in_use": 0,
+        "waiting": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_limiter_weights_and_cancelled_waiters():
+    """Веерная задача занимает несколько слотов, отмена не теряет их."""
+    limiter = ModelConcurrencyLimiter(default_limit=4)
+    started: list[str] = []
+    release = asyncio.Event()
+    first = asyncio.create_task(hold(limiter, "a", started, release, 3))
+    fanout = asyncio.create_task(hold(limiter, "b", started, release, 4))
+    small = asyncio.create_task(hold(limiter, "c", started, release))
+    await asyncio.sleep(0)
+
+    # Маленькая задача не обгоняет ждущую веерную.
+    assert started == ["a"]
+    assert limiter.snapshot()[MODEL]["waiting"] == 2
+
+    fanout.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await fanout
+    await asyncio.sleep(0)
+    assert started == ["a", "c"]
+    assert limiter.snapshot()[MODEL]["in_use"] == 4
+
+    release.set()
+    await asyncio.gather(first, small)
+    assert limiter.snapshot()[MODEL]["in_use"] == 0
+    assert ModelConcurrencyLimiter().limit_for(MODEL) is None
+
+
+async def grant_order(
+    limiter: ModelConcurrencyLimiter, jobs: list[tuple[str, dict]]
+) -> list[str]:
+    """Порядок выдачи слотов задачам, вставшим в очередь разом."""
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def job(name: str, options: dict) -> None:
+        async with limiter.slot(MODEL, **options):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def blocker() -> None:
+        async with limiter.slot(MODEL):
+            await release.wait()
+
+    tasks = [asyncio.create_task(blocker())]
+    await asyncio.sleep(0)
+    tasks += [asyncio.create_task(job(name, opts)) for name, opts in jobs]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_scheduler_interleaves_users_by_deficit_and_tier():
+    """Маленький пользователь не ждёт пачку тяжёлого, тариф даёт долю."""
+    limiter = ModelConcurrencyLimiter(capacity=1, quantum=10)
+    heavy = [(f"heavy{i}", {"user_id": "heavy", "cost": 10}) for i in range(6)]
+    small = [("small0", {"user_id": "small", "cost": 2})]
+
+    order = await grant_order(limiter, heavy + small)
+
+    assert order.index("small0") <= 1
+
+    tiers = TierPolicy({"default": 1, "pro": 2}, {"pro-user": "pro"})
+    jobs = [
+        (
+            f"{user}{i}",
+            {
+                "user_id": user,
+                "cost": 10,
+                "tier_weight": tiers.weight_for(user),
+            },
+        )
+        for i in range(6)
+        for user in ("free-user", "pro-user")
+    ]
+    order = await grant_order(ModelConcurrencyLimiter(capacity=1), jobs)
+
+    first = order[:6]
+    assert sum(name.startswith("pro") for name in first) == 4
+
+
+@pytest.mark.asyncio
+async def test_scheduler_prefers_image_lane_without_starving_video():
+    """Полоса изображений получает больше слотов, видео не простаивает."""
+    limiter = ModelConcurrencyLimiter(capacity=1)
+    videos = [
+        (f"video{i}", {"user_id": "u", "lane": VIDEO_LANE}) for i in range(4)
+    ]
+    images = [(f"image{i}", {"user_id": "u"}) for i in range(6)]
+
+    order = await grant_order(limiter, videos + images)
+
+    assert [name[:5] for name in order[:4]].count("image") == 3
+    assert "video0" in order[:4]
+    assert limiter.queue_snapshot()["video_waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_try_acquire_never_waits_and_release_wakes_queue():
+    """try_acquire без свободного слота сразу отказывает."""
+    limiter = ModelConcurrencyLimiter({MODEL: 1})
+    assert ModelConcurrencyLimiter().try_acquire(MODEL) == 0
+
+    weight = limiter.try_acquire(MODEL)
+    assert weight == 1
+    assert limiter.try_acquire(MODEL) is None
+
+    started: list[str] = []
+    release = asyncio.Event()
+    task = asyncio.create_task(hold(limiter, "queued", started, release))
+    await asyncio.sleep(0)
+    assert started == []
+
+    limiter.release(MODEL, weight)
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert started == ["queued"]
+    release.set()
+    await task
+    assert limiter.snapshot()[MODEL]["in_use"] == 0
@@ -0,0 +1,259 @@
+import hashlib
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+import httpx
+import pytest
+import sqlalchemy as sa
+
+from app.domain.entities import GenerationKind, GenerationStatus
+from app.infrastructure.db.base import AsyncSessionLocal
+from app.infrastructure.db.models import GenerationJobModel, UserModel
+from app.infrastructure.media.mirror import MediaMirror, iter_media_items
+from app.infrastructure.media.thumbnails import (
+    ThumbnailGenerator,
+    render_thumbnail,
+)
+from app.infrastructure.security.hashing import api_key_fingerprint
+from app.infrastructure.storage.blobs import LocalBlobStore, get_blob_store
+from app.presentation.api.media import public_result, thumbnail_urls
+
+VIDEO_BYTES = b"\x00\x00\x00\x18ftypmp42" + bytes(range(256)) * 64
+
+
+def media_transport(bodies: dict[str, bytes], bad_md5: set[str] = set()):
+    """Источник файлов, отдающий тело кусками."""
+
+    async def chunks(body: bytes):
+        for start in range(0, len(body), 1000):
+            yield body[start : start + 1000]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = bodies[request.url.path]
+        digest = hashlib.md5(b"" if request.url.path in bad_md5 else body)
+        return httpx.Response(
+            200,
+            headers={
+                "content-length": str(len(body)),
+                "content-md5": b64encode(digest.digest()).decode(),
+            },
+            content=chunks(body),
+        )
+
+    return httpx.MockTransport(handler)
+
+
+async def test_mirror_streams_media_into_store_and_verifies_checksum(
+    tmp_path,
+):
+    """Медиа копируется потоком; файл с неверным MD5 остаётся у fal."""
+    store = LocalBlobStore(tmp_path)
+    bodies = {f"/v{i}.mp4": VIDEO_BYTES + bytes([i]) for i in range(4)}
+    mirror = MediaMirror(
+        store,
+        max_concurrency=8,
+        per_job_concurrency=2,
+        max_file_bytes=1024 * 1024,
+        client=httpx.AsyncClient(
+            transport=media_transport(bodies, bad_md5={"/v3.mp4"})
+        ),
+    )
+    result = {
+        "videos": [
+            {"url": f"https://fal.media{path}", "content_type": "video/mp4"}
+            for path in bodies
+        ],
+        "seed": 7,
+    }
+
+    mirrored = await mirror.mirror_result(uuid4(), result)
+    await mirror.aclose()
+
+    items = iter_media_items(mirrored)
+    assert [("blob" in item) for item in items] == [True, True, True, False]
+    assert items[0]["url"] == "https://fal.media/v0.mp4"
+    data, media_type = await store.get(items[0]["blob"])
+    assert data == bodies["/v0.mp4"] and media_type == "video/mp4"
+    assert items[0]["sha256"] == hashlib.sha256(data).hexdigest()
+    assert "blob" not in result["videos"][0]
+    assert mirror.stats.files == 3 and mirror.stats.failures == 1
+    assert mirror.stats.peak_in_flight <= 2
+
+
+async def test_media_endpoint_serves_ranges_to_owner_only(client):
+    """Скопированный файл отдаётся по Range только владельцу задачи."""
+    store = get_blob_store()
+    ref = await store.put_data_uri(
+        "data:video/mp4;base64," + b64encode(VIDEO_BYTES).decode()
+    )
+    digest = ref.rsplit(",", 1)[1]
+
+    keys = []
+    for _ in range(2):
+        resp = await client.post(
+            "/auth", json={"external_user_id": str(uuid4())}
+        )
+        keys.append({"X-API-Key": resp.json()["api_key"]})
+
+    async with AsyncSessionLocal() as session:
+        owner = (
+            await session.execute(
+                sa.select(UserModel).where(
+                    UserModel.api_key_fingerprint
+                    == api_key_fingerprint(keys[0]["X-API-Key"])
+                )
+            )
+        ).scalar_one()
+        job = GenerationJobModel(
+            id=uuid4(),
+            user_id=owner.id,
+            kind=GenerationKind.TEXT_TO_VIDEO,
+            model_id="fal-ai/wan-25-preview/text-to-video",
+            status=GenerationStatus.COMPLETED,
+            cost_tokens=30,
+            input_json={"prompt": "media"},
+            result_json={
+                "video": {
+                    "url": "https://fal.media/v.mp4",
+                    "blob": ref,
+                    "sha256": digest,
+                }
+            },
+        )
+        session.add(job)
+        await session.commit()
+        job_id = job.id
+
+    detail = await client.get(f"/generations/{job_id}", headers=keys[0])
+    video = detail.json()["result"]["video"]
+    assert video["url"] == f"/generations/{job_id}/media/0"
+    assert "blob" not in video
+
+    ranged = await client.get(
+        video["url"], headers={**keys[0], "Range": "bytes=4-11"}
+    )
+    assert ranged.status_code == 206
+    assert ranged.content == VIDEO_BYTES[4:12]
+    assert ranged.headers["content-range"] == (
+        f"bytes 4-11/{len(VIDEO_BYTES)}"
+    )
+    assert ranged.headers["etag"] == f'"{digest}"'
+    assert "immutable" in ranged.headers["cache-control"]
+
+    cached = await client.get(
+        video["url"], headers={**keys[0], "If-None-Match": f'"{digest}"'}
+    )
+    assert cached.status_code == 304
+
+    foreign = await client.get(video["url"], headers=keys[1])
+    assert foreign.status_code == 404
+    missing = await client.get(
+        f"/generations/{job_id}/media/1", headers=keys[0]
+    )
+    assert missing.status_code == 404
+
+
+def fake_render(source, max_side, image_format, quality):
+    """Миниатюра-заглушка: первые байты исходного файла."""
+    with open(source, "rb") as file:
+        return file.read(max_side), max_side, max_side // 2, 0.001
+
+
+async def test_thumbnails_built_for_mirrored_images_only(tmp_path):
+    """Миниатюры строятся в пуле только для изображений."""
+    store = LocalBlobStore(tmp_path)
+    refs = [
+        await store.put_data_uri(
+            f"data:image/png;base64,{b64encode(bytes([i]) * 64).decode()}"
+        )
+        for i in range(3)
+    ]
+    generator = ThumbnailGenerator(
+        store,
+        ThreadPoolExecutor(max_workers=2),
+        max_side=16,
+        image_format="WEBP",
+        quality=80,
+        render=fake_render,
+    )
+    result = {
+        "images": [
+            {"url": f"https://fal.media/{i}.png", "blob": ref}
+            for i, ref in enumerate(refs)
+        ]
+        + [{"url": "https://fal.media/x.png"}]
+    }
+
+    await generator.add_thumbnails(
+        uuid4(), GenerationKind.TEXT_TO_VIDEO, result
+    )
+    assert all("thumbnail" not in item for item in result["images"])
+
+    await generator.add_thumbnails(
+        uuid4(), GenerationKind.TEXT_TO_IMAGE, result
+    )
+    generator.shutdown()
+
+    items = result["images"]
+    assert [("thumbnail" in item) for item in items] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    data, media_type = await store.get(items[1]["thumbnail"]["blob"])
+    assert data == bytes([1]) * 16 and media_type == "image/webp"
+    assert items[1]["thumbnail"]["width"] == 16
+    assert generator.stats.snapshot()["count"] == 3
+
+    job_id = uuid4()
+    assert thumbnail_urls(job_id, result) == [
+        f"/generations/{job_id}/media/{i}/thumbnail" for i in range(3)
+    ]
+    rendered = public_result(job_id, result)["images"][0]["thumbnail"]
+    assert rendered == {
+        "url": f"/generations/{job_id}/media/0/thumbnail",
+        "width": 16,
+        "height": 8,
+    }
+
+
+def test_render_thumbnail_with_pillow(tmp_path):
+    """Настоящий рендер уменьшает изображение до max_side."""
+    image_module = pytest.importorskip("PIL.Image")
+    source = tmp_path / "source.png"
+    image_module.new("RGB", (1024, 512), "red").save(source)
+
+    data, width, height, seconds = render_thumbnail(
+        str(source), 128, "JPEG", 80
+    )
+
+    assert (width, height) == (128, 64)
+    assert data[:2] == b"\xff\xd8" and seconds >= 0
+
+
+async def test_mirror_checksum_mismatch_leaves_store_empty(tmp_path):
+    """Файл с неверным MD5 не попадает в хранилище."""
+    store = LocalBlobStore(tmp_path)
+    mirror = MediaMirror(
+        store,
+        max_concurrency=1,
+        per_job_concurrency=1,
+        max_file_bytes=1024 * 1024,
+        client=httpx.AsyncClient(
+            transport=media_transport(
+                {"/bad.mp4": VIDEO_BYTES}, bad_md5={"/bad.mp4"}
+            )
+        ),
+    )
+
+    mirrored = await mirror.mirror_result(
+        uuid4(), {"video": {"url": "https://fal.media/bad.mp4"}}
+    )
+    await mirror.aclose()
+
+    assert "blob" not in mirrored["video"]
+    assert mirror.stats.failures == 1
+    assert store.stored == 0
+    assert [path for path in tmp_path.rglob("*") if path.is_file()] == []
@@ -0,0 +1,85 @@
+import random
+from collections import Counter
+
+import pytest
+
+from app.domain.entities import GenerationKind
+from app.infrastructure.fal.routing import (
+    ModelChoice,
+    ModelRouter,
+    parse_model_registry,
+)
+
+FAST = "fal-ai/fast/text-to-image"
+SLOW = "fal-ai/slow/text-to-image"
+
+
+def make_router() -> ModelRouter:
+    """Маршрутизатор с двумя равноценными моделями."""
+    return ModelRouter(
+        {
+            GenerationKind.TEXT_TO_IMAGE: [
+                ModelChoice(FAST, 1.0),
+                ModelChoice(SLOW, 1.0),
+            ]
+        },
+        alpha=0.5,
+        max_error_rate=0.5,
+        min_samples=3,
+        rng=random.Random(7),
+    )
+
+
+def test_registry_overrides_kinds_and_keeps_defaults():
+    """Реестр из JSON заменяет только указанные типы."""
+    registry = parse_model_registry(
+        '{"TEXT_TO_IMAGE": [{"model_id": "a", "weight": 3},'
+        ' {"model_id": "b"}]}'
+    )
+
+    assert registry[GenerationKind.TEXT_TO_IMAGE] == [
+        ModelChoice("a", 3.0),
+        ModelChoice("b", 1.0),
+    ]
+    assert registry[GenerationKind.TEXT_TO_VIDEO] == [
+        ModelChoice("fal-ai/wan-25-preview/text-to-video", 1.0)
+    ]
+    with pytest.raises(RuntimeError):
+        parse_model_registry('{"TEXT_TO_AUDIO": []}')
+
+
+def test_router_prefers_faster_model_by_ewma_latency():
+    """Медленная модель получает меньше задач пропорционально задержке."""
+    router = make_router()
+    for _ in range(5):
+        router.record_completion(FAST, 2.0, ok=True)
+        router.record_completion(SLOW, 20.0, ok=True)
+
+    picks = Counter(
+        router.choose(GenerationKind.TEXT_TO_IMAGE) for _ in range(2000)
+    )
+
+    assert 0.85 < picks[FAST] / 2000 < 0.95
+    assert router.health(SLOW).latency_seconds == pytest.approx(20.0)
+
+
+def test_router_drops_failing_model_and_falls_back_when_all_fail():
+    """Модель с ошибками выходит из ротации, кроме редких проб."""
+    router = make_router()
+    for _ in range(4):
+        router.record_completion(FAST, None, ok=False)
+        router.record_completion(SLOW, 5.0, ok=True)
+
+    assert not router.is_healthy(FAST)
+    picks = Counter(
+        router.choose(GenerationKind.TEXT_TO_IMAGE) for _ in range(2000)
+    )
+    assert picks[FAST] / 2000 < 0.05
+
+    for _ in range(8):
+        router.record_completion(SLOW, None, ok=False)
+    # Деградировали обе: выбирается модель с меньшей долей ошибок.
+    assert not router.is_healthy(SLOW)
+    assert router.health(SLOW).error_rate < router.health(FAST).error_rate
+    assert router.choose(GenerationKind.TEXT_TO_IMAGE) == SLOW
+    assert router.snapshot()[SLOW]["healthy"] is False
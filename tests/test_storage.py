@@ -0,0 +1,301 @@
+from base64 import b64encode
+from uuid import UUID, uuid4
+
+import pytest
+
+from app.domain.entities import GenerationStatus
+from app.infrastructure.db.base import AsyncSessionLocal
+from app.infrastructure.db.models import GenerationJobModel
+from app.infrastructure.fal.routing import get_model_router
+from app.infrastructure.settings import get_settings
+from app.infrastructure.storage.blobs import get_blob_store
+from app.infrastructure.tasks.generations import run_generation_job
+from app.presentation.api.multipart import MultipartReader
+
+IMAGE_BYTES = b"\x89PNG\r\n\x1a\n" + b"pixels" * 100
+IMAGE_URI = "data:image/png;base64," + b64encode(IMAGE_BYTES).decode()
+
+
+async def authorized_headers(client, external_id, amount=50):
+    """Ключ API пользователя с пополненным балансом."""
+    await client.post(
+        "/webhook/topup",
+        json={"external_user_id": external_id, "amount": amount},
+        headers={"X-Webhook-Secret": "secret", "X-Event-Id": external_id},
+    )
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": external_id, "rotate": True}
+    )
+    return {"X-API-Key": auth_resp.json()["api_key"]}
+
+
+@pytest.mark.asyncio
+async def test_data_uri_inputs_are_stored_by_reference_and_inlined_on_submit(
+    client, user_external_id
+):
+    """data: URI хранится в blob store, в задаче — только ссылка."""
+    headers = await authorized_headers(client, user_external_id)
+    store = get_blob_store()
+    stored_before = store.stored
+
+    job_ids = []
+    for _ in range(2):
+        resp = await client.post(
+            "/generations/images/image-to-image",
+            json={"prompt": "recolor", "image_urls": [IMAGE_URI]},
+            headers=headers,
+        )
+        assert resp.status_code == 202
+        job_ids.append(UUID(resp.json()["job_id"]))
+
+    async with AsyncSessionLocal() as session:
+        job = await session.get(GenerationJobModel, job_ids[0])
+        (ref,) = job.input_json["image_urls"]
+    assert ref.startswith("blob:image/png;sha256,")
+    assert store.stored == stored_before + 1
+
+    submitted = []
+
+    class DummyFal:
+        async def submit(self, model_id, payload):
+            submitted.append(payload)
+            return {"request_id": "fal-blob"}
+
+        async def get_status(self, status_url):
+            return {"status": "COMPLETED"}
+
+        async def get_result(self, response_url):
+            return {"ok": True}
+
+        @property
+        def client(self):
+            class DummyClient:
+                async def aclose(self):
+                    return None
+
+            return DummyClient()
+
+    await run_generation_job(
+        job_ids[0],
+        fal_client_factory=DummyFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    assert submitted[0]["image_urls"] == [IMAGE_URI]
+    async with AsyncSessionLocal() as session:
+        job = await session.get(GenerationJobModel, job_ids[0])
+        assert job.status == GenerationStatus.COMPLETED
+        assert job.input_json["image_urls"] == [ref]
+
+
+@pytest.mark.asyncio
+async def test_missing_blob_fails_job_without_penalizing_model(
+    client, user_external_id
+):
+    """Пропавший blob проваливает задачу, но не портит здоровье модели."""
+    headers = await authorized_headers(client, user_external_id)
+    image = IMAGE_BYTES + user_external_id.encode()
+    resp = await client.post(
+        "/generations/images/image-to-image",
+        json={
+            "prompt": "recolor",
+            "image_urls": [
+                "data:image/png;base64," + b64encode(image).decode()
+            ],
+        },
+        headers=headers,
+    )
+    job_id = UUID(resp.json()["job_id"])
+    async with AsyncSessionLocal() as session:
+        job = await session.get(GenerationJobModel, job_id)
+        model_id = job.model_id
+        (ref,) = job.input_json["image_urls"]
+    get_blob_store().path_for(ref.rsplit(",", 1)[1]).unlink()
+    samples = get_model_router().health(model_id).samples
+
+    class UnusedFal:
+        async def submit(self, model_id, payload):
+            raise AssertionError("submit must not be called")
+
+        @property
+        def client(self):
+            class DummyClient:
+                async def aclose(self):
+                    return None
+
+            return DummyClient()
+
+    await run_generation_job(
+        job_id,
+        fal_client_factory=UnusedFal,
+        poll_interval_seconds=0,
+        total_timeout_seconds=1,
+    )
+
+    async with AsyncSessionLocal() as session:
+        job = await session.get(GenerationJobModel, job_id)
+        assert job.status == GenerationStatus.FAILED
+    assert get_model_router().health(model_id).samples == samples
+    balance = await client.get("/balance", headers=headers)
+    assert balance.json()["balance_tokens"] == 50
+
+
+@pytest.mark.asyncio
+async def test_invalid_base64_data_uri_is_rejected(client, user_external_id):
+    """Неверный base64 в data: URI — 422, баланс не списан."""
+    headers = await authorized_headers(client, user_external_id)
+    resp = await client.post(
+        "/generations/images/image-to-image",
+        json={"prompt": "x", "image_urls": ["data:image/png;base64,@@@"]},
+        headers=headers,
+    )
+    assert resp.status_code == 422
+
+    balance = await client.get("/balance", headers=headers)
+    assert balance.json()["balance_tokens"] == 50
+
+
+@pytest.mark.asyncio
+async def test_data_uri_media_type_is_normalized_or_rejected(
+    client, user_external_id
+):
+    """MIME-тип data: URI приводится к виду ссылки blob: или отклоняется."""
+    headers = await authorized_headers(client, user_external_id)
+    encoded = b64encode(IMAGE_BYTES).decode()
+    resp = await client.post(
+        "/generations/images/image-to-image",
+        json={
+            "prompt": "x",
+            "image_urls": [f"data:IMAGE/PNG;charset=x;base64,{encoded}"],
+        },
+        headers=headers,
+    )
+    assert resp.status_code == 202
+    async with AsyncSessionLocal() as session:
+        job = await session.get(
+            GenerationJobModel, UUID(resp.json()["job_id"])
+        )
+        (ref,) = job.input_json["image_urls"]
+    assert ref.startswith("blob:image/png;sha256,")
+
+    malformed = await client.post(
+        "/generations/images/image-to-image",
+        json={"prompt": "x", "image_urls": [f"data:image;base64,{encoded}"]},
+        headers=headers,
+    )
+    assert malformed.status_code == 422
+    assert "media type" in malformed.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_rejected_request_does_not_store_data_uri_inputs(
+    client, user_external_id
+):
+    """Запрос без средств (402) не оставляет файлов в хранилище."""
+    headers = await authorized_headers(client, user_external_id, amount=1)
+    content = b"\x89PNG\r\n\x1a\n" + user_external_id.encode()
+    uri = "data:image/png;base64," + b64encode(content).decode()
+    store = get_blob_store()
+    ref, _ = await store.hash_data_uri(uri)
+
+    resp = await client.post(
+        "/generations/images/image-to-image",
+        json={"prompt": "x", "image_urls": [uri]},
+        headers=headers,
+    )
+
+    assert resp.status_code == 402
+    assert not await store.exists(ref)
+
+
+async def one_byte_chunks(body: bytes):
+    """Тело запроса по одному байту."""
+    for index in range(len(body)):
+        yield body[index : index + 1]
+
+
+async def test_multipart_reader_handles_boundary_split_across_chunks():
+    """Граница, разрезанная между кусками, распознаётся."""
+    body = (
+        b"preamble\r\n--xyz\r\n"
+        b'Content-Disposition: form-data; name="note"\r\n\r\n'
+        b"hello\r\n--xyz\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="a.bin"\r\n'
+        b"Content-Type: image/png\r\n\r\n"
+        b"ab\r\n--xy-cd\r\n--xyz--\r\n"
+    )
+    reader = MultipartReader(one_byte_chunks(body), b"xyz")
+
+    note = await reader.next_part()
+    assert note.name == "note"
+    part = await reader.next_part()
+    assert (part.name, part.filename, part.content_type) == (
+        "file",
+        "a.bin",
+        "image/png",
+    )
+    content = b"".join([chunk async for chunk in reader.iter_body()])
+    assert content == b"ab\r\n--xy-cd"
+    assert await reader.next_part() is None
+
+
+@pytest.mark.asyncio
+async def test_uploaded_asset_is_deduplicated_and_usable_in_generation(
+    client, user_external_id
+):
+    """ID из POST /assets принимают только запросы загрузившего."""
+    headers = await authorized_headers(client, user_external_id)
+    upload = {"file": ("source.png", IMAGE_BYTES, "image/png")}
+
+    first = await client.post("/assets", files=upload, headers=headers)
+    second = await client.post("/assets", files=upload, headers=headers)
+    assert first.status_code == 201
+    asset = first.json()
+    assert asset["asset_id"] == second.json()["asset_id"]
+    assert asset["size_bytes"] == len(IMAGE_BYTES)
+    assert asset["media_type"] == "image/png"
+
+    resp = await client.post(
+        "/generations/videos/image-to-video",
+        json={"prompt": "animate", "image_url": asset["asset_id"]},
+        headers=headers,
+    )
+    assert resp.status_code == 202
+    async with AsyncSessionLocal() as session:
+        job_id = UUID(resp.json()["job_id"])
+        job = await session.get(GenerationJobModel, job_id)
+        assert job.input_json["image_url"] == asset["asset_id"]
+    data, media_type = await get_blob_store().get(asset["asset_id"])
+    assert data == IMAGE_BYTES and media_type == "image/png"
+
+    unknown = "blob:image/png;sha256," + "0" * 64
+    missing = await client.post(
+        "/generations/videos/image-to-video",
+        json={"prompt": "animate", "image_url": unknown},
+        headers=headers,
+    )
+    assert missing.status_code == 422
+
+    other_headers = await authorized_headers(client, str(uuid4()))
+    foreign = await client.post(
+        "/generations/videos/image-to-video",
+        json={"prompt": "animate", "image_url": asset["asset_id"]},
+        headers=other_headers,
+    )
+    assert foreign.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_asset_upload_over_size_cap_is_rejected(
+    client, user_external_id, monkeypatch
+):
+    """Файл больше ASSET_MAX_BYTES отклоняется с 413."""
+    headers = await authorized_headers(client, user_external_id)
+    monkeypatch.setattr(get_settings(), "asset_max_bytes", 16)
+    resp = await client.post(
+        "/assets",
+        files={"file": ("big.bin", b"x" * 17, "application/octet-stream")},
+        headers=headers,
+    )
+    assert resp.status_code == 413
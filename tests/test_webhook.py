@@ -1,6 +1,21 @@
+import json
 from uuid import uuid4
 
 import pytest
+import sqlalchemy as sa
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app.application.use_cases.webhook import WebhookTopupService
+from app.infrastructure.db.base import AsyncSessionLocal, engine
+from app.infrastructure.db.models import BalanceTransactionModel, UserModel
+from app.infrastructure.db.repositories import (
+    SQLAlchemyBalanceTransactionRepository,
+    SQLAlchemyUserRepository,
+)
+from app.presentation.api.dependencies import webhook_service_scope
+from app.presentation.api.routers import webhook as webhook_module
+from app.presentation.api.streaming import JsonArraySplitter
 
 WEBHOOK_SECRET = "secret"
 
@@ -93,3 +108,261 @@ async def test_webhook_topup_without_event_id_always_credits(client):
     api_key = auth_resp.json()["api_key"]
     balance_resp = await client.get("/balance", headers={"X-API-Key": api_key})
     assert balance_resp.json()["balance_tokens"] == amount * 2
+
+
+@pytest.mark.asyncio
+async def test_webhook_topup_batch_streams_per_event_results(client):
+    """Пачка из NDJSON зачисляется один раз на event_id."""
+    external_user_id = str(uuid4())
+    event_ids = [str(uuid4()) for _ in range(3)]
+    lines = [
+        json.dumps(
+            {
+                "external_user_id": external_user_id,
+                "amount": 10,
+                "event_id": event_id,
+            }
+        )
+        for event_id in event_ids + event_ids[:1]
+    ]
+    lines.append('{"external_user_id": "oops"}')
+    response = await client.post(
+        "/webhook/topup/batch",
+        content="\n".join(lines),
+        headers={
+            "X-Webhook-Secret": WEBHOOK_SECRET,
+            "Content-Type": "application/x-ndjson",
+        },
+    )
+    assert response.status_code == 200
+    results = sorted(
+        (json.loads(line) for line in response.text.splitlines()),
+        key=lambda item: item["index"],
+    )
+    assert [item["status"] for item in results] == [
+        "credited",
+        "credited",
+        "credited",
+        "duplicate",
+        "invalid",
+    ]
+
+    replay = await client.post(
+        "/webhook/topup/batch",
+        json=[
+            {
+                "external_user_id": external_user_id,
+                "amount": 10,
+                "event_id": event_ids[0],
+            }
+        ],
+        headers={"X-Webhook-Secret": WEBHOOK_SECRET},
+    )
+    assert json.loads(replay.text)["status"] == "duplicate"
+
+    auth_resp = await client.post(
+        "/auth", json={"external_user_id": external_user_id, "rotate": True}
+    )
+    api_key = auth_resp.json()["api_key"]
+    balance_resp = await client.get("/balance", headers={"X-API-Key": api_key})
+    assert balance_resp.json()["balance_tokens"] == 30
+
+
+@pytest.mark.asyncio
+async def test_topup_upsert_resolves_duplicates_with_on_conflict():
+    """Повтор события идёт через ON CONFLICT и оставляет одну строку."""
+    external_user_id = uuid4()
+    event_id = str(uuid4())
+    statements: list[str] = []
+
+    def capture(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        users = []
+        for _ in range(2):
+            async with AsyncSessionLocal() as session:
+                service = WebhookTopupService(
+                    SQLAlchemyUserRepository(session),
+                    SQLAlchemyBalanceTransactionRepository(session),
+                )
+                users.append(
+                    await service.handle_topup(external_user_id, 40, event_id)
+                )
+                await session.commit()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    inserts = [sql for sql in statements if sql.startswith("INSERT")]
+    assert len(inserts) == 4
+    assert all("ON CONFLICT" in sql for sql in inserts)
+    assert not any(sql.startswith("SELECT") for sql in statements)
+    assert users[0].id == users[1].id
+    assert users[1].balance_tokens == 40
+
+    async with AsyncSessionLocal() as session:
+        user_rows = await session.scalar(
+            sa.select(sa.func.count())
+            .select_from(UserModel)
+            .where(UserModel.external_user_id == external_user_id)
+        )
+        ledger_rows = await session.scalar(
+            sa.select(sa.func.count())
+            .select_from(BalanceTransactionModel)
+            .where(BalanceTransactionModel.external_ref == event_id)
+        )
+    assert user_rows == 1
+    assert ledger_rows == 1
+
+
+def test_json_array_splitter_handles_chunk_boundaries():
+    """Элементы массива выделяются при любом разрезе тела."""
+    body = b' [ {"a": "x,]\\\\"}, {"b": [1, {"c": "\\"q\\""}]} , {"d": 2} ] '
+    expected = [
+        b'{"a": "x,]\\\\"}',
+        b'{"b": [1, {"c": "\\"q\\""}]}',
+        b'{"d": 2}',
+    ]
+    for size in range(1, len(body) + 1):
+        splitter = JsonArraySplitter(1024)
+        items = []
+        for offset in range(0, len(body), size):
+            items += splitter.feed(body[offset : offset + size])
+        splitter.close()
+        assert items == expected, size
+
+    with pytest.raises(ValueError):
+        JsonArraySplitter(1024).feed(b'{"a": 1}')
+    with pytest.raises(ValueError):
+        JsonArraySplitter(1024).close()
+    for body in [b'[{"a": 1},]', b"[,]", b'[{"a": 1}, ]']:
+        with pytest.raises(ValueError):
+            JsonArraySplitter(1024).feed(body)
+    assert JsonArraySplitter(1024).feed(b"[ ]") == []
+
+
+@pytest.mark.asyncio
+async def test_webhook_topup_batch_rejects_oversized_and_non_array_bodies(
+    client,
+):
+    """Строка без переводов сверх лимита — 413, не массив — 400."""
+    headers = {"X-Webhook-Secret": WEBHOOK_SECRET}
+    huge = b"x" * (webhook_module.TOPUP_BATCH_MAX_ITEM_BYTES + 1)
+
+    async def body():
+        for offset in range(0, len(huge), 1000):
+            yield huge[offset : offset + 1000]
+
+    response = await client.post(
+        "/webhook/topup/batch",
+        content=body(),
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 413
+
+    response = await client.post(
+        "/webhook/topup/batch",
+        content=b'[{"event_id": "' + huge + b'"}]',
+        headers=headers,
+    )
+    assert response.status_code == 413
+
+    response = await client.post(
+        "/webhook/topup/batch", json={"event_id": "x"}, headers=headers
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_webhook_topup_batch_reports_errors_per_event(
+    client, monkeypatch
+):
+    """Сбой одного события не помечает ошибкой весь кусок."""
+    original = WebhookTopupService.handle_topup_batch
+
+    async def flaky(self, events):
+        if any(event.event_id == "boom" for event in events):
+            raise RuntimeError("db down")
+        return await original(self, events)
+
+    monkeypatch.setattr(WebhookTopupService, "handle_topup_batch", flaky)
+    external_user_id = str(uuid4())
+    event_ids = [str(uuid4()), "boom", str(uuid4())]
+    response = await client.post(
+        "/webhook/topup/batch",
+        json=[
+            {
+                "external_user_id": external_user_id,
+                "amount": 5,
+                "event_id": event_id,
+            }
+            for event_id in event_ids
+        ],
+        headers={"X-Webhook-Secret": WEBHOOK_SECRET},
+    )
+
+    results = sorted(
+        (json.loads(line) for line in response.text.splitlines()),
+        key=lambda item: item["index"],
+    )
+    assert [item["status"] for item in results] == [
+        "credited",
+        "error",
+        "credited",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_webhook_topup_batch_rejects_trailing_comma(client):
+    """Запятая перед закрывающей скобкой — 400, ничего не зачислено."""
+    external_user_id = uuid4()
+    item = {
+        "external_user_id": str(external_user_id),
+        "amount": 5,
+        "event_id": str(uuid4()),
+    }
+    response = await client.post(
+        "/webhook/topup/batch",
+        content=f"[{json.dumps(item)},]",
+        headers={"X-Webhook-Secret": WEBHOOK_SECRET},
+    )
+    assert response.status_code == 400
+
+    async with AsyncSessionLocal() as session:
+        user = await session.scalar(
+            sa.select(UserModel).where(
+                UserModel.external_user_id == external_user_id
+            )
+        )
+    assert user is None
+
+
+@pytest.mark.asyncio
+async def test_topup_batch_applies_pending_chunk_before_stream_error():
+    """Обрыв тела после начала ответа не теряет разобранные события."""
+    event_id = str(uuid4())
+
+    async def source():
+        yield b'{"external_user_id": "oops"}'
+        yield json.dumps(
+            {
+                "external_user_id": str(uuid4()),
+                "amount": 5,
+                "event_id": event_id,
+            }
+        ).encode()
+        raise HTTPException(status_code=400, detail="broken body")
+
+    lines = []
+    with pytest.raises(HTTPException):
+        async for line in webhook_module._stream_topup_batch(
+            source(), webhook_service_scope
+        ):
+            lines.append(json.loads(line))
+
+    assert [(item["index"], item["status"]) for item in lines] == [
+        (0, "invalid"),
+        (1, "credited"),
+    ]
+    assert lines[1]["event_id"] == event_id